@@ -0,0 +1,199 @@
+"""
+Who may use the admin, and with which role.
+
+The allowlist is compiled once into an AdminPolicy: exact emails and
+"*@domain" wildcards mapped to a role, each role to a frozen set of
+permissions. Checks are dict and set lookups, and the per-email answer is
+memoized, so a repeat check allocates nothing. PolicyStore holds the current
+policy and swaps in a freshly compiled one on reload, so a request sees
+either the old rules or the new ones, never a mix.
+
+Rules come from ADMIN_EMAILS ("a@x.com,*@shop.com=editor"; entries without
+a role are owners), or with ADMIN_POLICY_SOURCE=mongo from the `admins`
+collection ({"email": ..., "role": ...}), falling back to ADMIN_EMAILS while
+that collection is empty. Reloads happen every ADMIN_POLICY_RELOAD_INTERVAL
+seconds and on SIGUSR2 sent to a worker process.
+"""
+
+import asyncio
+import logging
+import os
+import signal
+from typing import Dict, FrozenSet, Iterable, Mapping, Optional, Tuple
+
+from pymongo.errors import PyMongoError
+
+logger = logging.getLogger(__name__)
+
+ADMINS_COLLECTION = "admins"
+
+# Products and their images, one at a time
+PRODUCTS_WRITE = "products:write"
+# NDJSON import/export of the whole catalog
+PRODUCTS_BULK = "products:bulk"
+# Storage report and image garbage collection
+STORAGE_MANAGE = "storage:manage"
+
+ROLE_PERMISSIONS: Mapping[str, FrozenSet[str]] = {
+    "owner": frozenset({PRODUCTS_WRITE, PRODUCTS_BULK, STORAGE_MANAGE}),
+    "editor": frozenset({PRODUCTS_WRITE}),
+}
+DEFAULT_ROLE = "owner"
+
+NO_PERMISSIONS: FrozenSet[str] = frozenset()
+
+# Distinct emails whose answer is memoized before the memo is reset
+MEMO_LIMIT = 1024
+
+
+class PolicyError(ValueError):
+    """A rule names an unknown role or isn't an email or *@domain pattern."""
+
+
+def normalize_email(email: str) -> str:
+    return (email or "").strip().lower()
+
+
+def parse_rules(spec: str) -> Iterable[Tuple[str, str]]:
+    """ "a@x.com, *@shop.com=editor" -> (pattern, role) pairs."""
+    for entry in spec.split(","):
+        pattern, _, role = entry.partition("=")
+        if pattern.strip():
+            yield pattern, role.strip() or DEFAULT_ROLE
+
+
+class AdminPolicy:
+    """Immutable once built; build a new one to change the rules."""
+
+    __slots__ = ("_emails", "_domains", "_memo")
+
+    def __init__(self, rules: Iterable[Tuple[str, str]]):
+        emails: Dict[str, FrozenSet[str]] = {}
+        domains: Dict[str, FrozenSet[str]] = {}
+        for pattern, role in rules:
+            pattern = normalize_email(pattern)
+            role = role.strip().lower()
+            if role not in ROLE_PERMISSIONS:
+                raise PolicyError(f"Unknown role {role!r} for {pattern!r}")
+            local, at, domain = pattern.rpartition("@")
+            if not at or not local or not domain:
+                raise PolicyError(f"Not an email or *@domain pattern: {pattern!r}")
+            target, key = (domains, domain) if local == "*" else (emails, pattern)
+            # Listed twice (or under two roles) gets the union
+            target[key] = target.get(key, NO_PERMISSIONS) | ROLE_PERMISSIONS[role]
+        self._emails = emails
+        self._domains = domains
+        # email as given -> permissions; only grows with distinct emails seen
+        self._memo: Dict[str, FrozenSet[str]] = {}
+
+    def permissions(self, email: str) -> FrozenSet[str]:
+        found = self._memo.get(email)
+        if found is not None:
+            return found
+        normalized = normalize_email(email)
+        found = self._emails.get(normalized)
+        if found is None:
+            found = self._domains.get(normalized.rpartition("@")[2], NO_PERMISSIONS)
+        if len(self._memo) >= MEMO_LIMIT:
+            self._memo.clear()
+        self._memo[email] = found
+        return found
+
+    def allows(self, email: str, permission: str) -> bool:
+        return permission in self.permissions(email)
+
+    def is_admin(self, email: str) -> bool:
+        """Has any role at all, i.e. may log in to the admin."""
+        return bool(self.permissions(email))
+
+    def role(self, email: str) -> Optional[str]:
+        granted = self.permissions(email)
+        for role, permissions in ROLE_PERMISSIONS.items():
+            if granted == permissions:
+                return role
+        return None
+
+    def __len__(self) -> int:
+        return len(self._emails) + len(self._domains)
+
+
+class PolicyStore:
+    """
+    The live AdminPolicy plus how to rebuild it. `policy` is replaced in one
+    assignment, so readers never need a lock.
+    """
+
+    def __init__(
+        self,
+        default_rules: Iterable[Tuple[str, str]],
+        env_var: str = "ADMIN_EMAILS",
+        source: str = "env",
+        reload_interval: float = 0.0,
+    ):
+        self.default_rules = tuple(default_rules)
+        self.env_var = env_var
+        self.source = source
+        self.reload_interval = reload_interval
+        self.db = None
+        self.policy = AdminPolicy(self._env_rules())
+        self._task: Optional[asyncio.Task] = None
+
+    def _env_rules(self) -> Tuple[Tuple[str, str], ...]:
+        spec = os.environ.get(self.env_var, "").strip()
+        return tuple(parse_rules(spec)) if spec else self.default_rules
+
+    async def _mongo_rules(self) -> Tuple[Tuple[str, str], ...]:
+        rules = tuple(
+            (doc["email"], doc.get("role") or DEFAULT_ROLE)
+            async for doc in self.db[ADMINS_COLLECTION].find({}, {"_id": 0, "email": 1, "role": 1})
+            if doc.get("email")
+        )
+        # An empty collection must not lock everyone out
+        return rules or self._env_rules()
+
+    async def reload(self) -> bool:
+        """Rebuild the policy from its source. On any error the current policy stays."""
+        try:
+            if self.source == "mongo" and self.db is not None:
+                rules = await self._mongo_rules()
+            else:
+                rules = self._env_rules()
+            policy = AdminPolicy(rules)
+        except (PolicyError, PyMongoError) as e:
+            logger.error("Admin policy not reloaded, keeping the current one: %r", e)
+            return False
+        self.policy = policy
+        logger.info("Admin policy loaded from %s: %d rules", self.source, len(policy))
+        return True
+
+    def start(self, db) -> None:
+        """Load from the configured source and keep reloading. Call once, inside the event loop."""
+        self.db = db
+        loop = asyncio.get_running_loop()
+        try:
+            loop.add_signal_handler(signal.SIGUSR2, lambda: asyncio.create_task(self.reload()))
+        except (NotImplementedError, RuntimeError, AttributeError):
+            # No signals on this platform, or not on the main thread
+            pass
+        self._task = asyncio.create_task(self._run())
+
+    async def _run(self) -> None:
+        await self.reload()
+        while self.reload_interval > 0:
+            await asyncio.sleep(self.reload_interval)
+            await self.reload()
+
+    async def aclose(self) -> None:
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+
+
+def create_policy_store(default_emails: Iterable[str]) -> PolicyStore:
+    source = os.environ.get("ADMIN_POLICY_SOURCE", "env").strip().lower()
+    return PolicyStore(
+        [(email, DEFAULT_ROLE) for email in default_emails],
+        source=source,
+        # Only the collection can change under a running process
+        reload_interval=float(os.environ.get("ADMIN_POLICY_RELOAD_INTERVAL", "60" if source == "mongo" else "0")),
+    )
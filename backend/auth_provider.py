@@ -0,0 +1,175 @@
+"""
+Client for the OAuth provider's session-data exchange.
+
+One pooled httpx.AsyncClient lives for the whole app, so logins reuse warm
+TLS connections. Transient failures are retried with jittered backoff, and
+a circuit breaker fails fast while the provider is down. The client (and
+httpx itself) is created on the first login rather than at startup.
+"""
+
+import asyncio
+import os
+import random
+import time
+from typing import Optional
+
+DEFAULT_SESSION_URL = "https://demobackend.emergentagent.com/auth/v1/env/oauth/session-data"
+
+
+class AuthProviderError(Exception):
+    """The provider rejected the session or could not be reached."""
+
+
+class CircuitOpenError(AuthProviderError):
+    """Too many recent failures; calls are refused until the cool-down ends."""
+
+
+class CircuitBreaker:
+    """
+    Closed: calls go through. After `failure_threshold` consecutive failures
+    it opens for `reset_timeout` seconds, then lets a single trial call through
+    (half-open); success closes it, failure re-opens it.
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self._trial_in_flight = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half-open"
+        return "open"
+
+    def allow(self) -> bool:
+        state = self.state
+        if state == "closed":
+            return True
+        if state == "half-open" and not self._trial_in_flight:
+            self._trial_in_flight = True
+            return True
+        return False
+
+    def record_success(self) -> None:
+        self.failures = 0
+        self.opened_at = None
+        self._trial_in_flight = False
+
+    def release(self) -> None:
+        """Give back a half-open trial that ended without an outcome (e.g. cancelled)."""
+        self._trial_in_flight = False
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        self._trial_in_flight = False
+        if self.opened_at is not None or self.failures >= self.failure_threshold:
+            self.opened_at = time.monotonic()
+
+
+class _Retryable(Exception):
+    pass
+
+
+class AuthProviderClient:
+    def __init__(
+        self,
+        session_url: str = DEFAULT_SESSION_URL,
+        max_retries: int = 2,
+        backoff_base: float = 0.2,
+        connect_timeout: float = 3.0,
+        read_timeout: float = 8.0,
+        breaker: Optional[CircuitBreaker] = None,
+    ):
+        self.session_url = session_url
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.breaker = breaker or CircuitBreaker()
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self._client = None
+
+    def _get_client(self):
+        if self._client is None:
+            import httpx
+
+            self._client = httpx.AsyncClient(
+                timeout=httpx.Timeout(self.read_timeout, connect=self.connect_timeout),
+                limits=httpx.Limits(max_connections=20, max_keepalive_connections=10, keepalive_expiry=60.0),
+            )
+        return self._client
+
+    async def fetch_session(self, session_id: str) -> dict:
+        if not self.breaker.allow():
+            raise CircuitOpenError("Authentication provider unavailable")
+
+        recorded = False
+        try:
+            for attempt in range(self.max_retries + 1):
+                try:
+                    data = await self._fetch_once(session_id)
+                except _Retryable as e:
+                    if attempt == self.max_retries:
+                        recorded = True
+                        self.breaker.record_failure()
+                        raise AuthProviderError(str(e)) from None
+                    # Full jitter, so concurrent logins don't retry in lockstep
+                    await asyncio.sleep(random.uniform(0, self.backoff_base * 2 ** attempt))
+                except AuthProviderError:
+                    # The provider answered; the session itself is bad
+                    recorded = True
+                    self.breaker.record_success()
+                    raise
+                else:
+                    recorded = True
+                    self.breaker.record_success()
+                    return data
+        except Exception:
+            if not recorded:
+                recorded = True
+                self.breaker.record_failure()
+            raise
+        finally:
+            # Cancelled (client went away): no verdict, but free the trial slot
+            if not recorded:
+                self.breaker.release()
+
+    async def _fetch_once(self, session_id: str) -> dict:
+        import httpx
+
+        try:
+            response = await self._get_client().get(self.session_url, headers={"X-Session-ID": session_id})
+        except httpx.HTTPError as e:
+            # Transport errors, but also bad encodings, redirect loops, ...
+            raise _Retryable(f"{type(e).__name__}: {e}")
+
+        if response.status_code == 429 or response.status_code >= 500:
+            raise _Retryable(f"Provider returned {response.status_code}")
+        if response.status_code >= 400:
+            raise AuthProviderError(f"Provider returned {response.status_code}")
+        try:
+            return response.json()
+        except ValueError:
+            raise AuthProviderError("Provider returned invalid JSON")
+
+    async def aclose(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+
+
+def create_auth_provider() -> AuthProviderClient:
+    """AUTH_SESSION_URL lets tests point the exchange at a local stub."""
+    return AuthProviderClient(
+        session_url=os.environ.get("AUTH_SESSION_URL", DEFAULT_SESSION_URL),
+        max_retries=int(os.environ.get("AUTH_MAX_RETRIES", "2")),
+        connect_timeout=float(os.environ.get("AUTH_CONNECT_TIMEOUT", "3")),
+        read_timeout=float(os.environ.get("AUTH_READ_TIMEOUT", "8")),
+        breaker=CircuitBreaker(
+            failure_threshold=int(os.environ.get("AUTH_BREAKER_THRESHOLD", "5")),
+            reset_timeout=float(os.environ.get("AUTH_BREAKER_RESET", "30")),
+        ),
+    )
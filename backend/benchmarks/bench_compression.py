@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark: bytes on the wire and CPU cost of compressing a product
+listing with gzip and Brotli at several levels.
+
+server.py compresses each cached catalog body once per encoding, so the
+compress time below is paid on a cache miss only; hits reuse the bytes.
+
+Usage (from backend/):
+    python benchmarks/bench_compression.py [--image-bytes 0] [--repeat 10]
+"""
+
+import argparse
+import gzip
+import sys
+import timeit
+import zlib
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+import orjson  # noqa: E402
+
+from bench_json_encoding import make_products  # noqa: E402
+from server import encode_products  # noqa: E402
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+def codecs() -> dict:
+    cases = {
+        f"gzip_{level}": (
+            lambda body, level=level: gzip.compress(body, level, mtime=0),
+            lambda data: zlib.decompress(data, 31),
+        )
+        for level in (1, 6, 9)
+    }
+    if brotli:
+        for quality in (1, 5, 11):
+            cases[f"br_{quality}"] = (
+                lambda body, quality=quality: brotli.compress(body, quality=quality),
+                brotli.decompress,
+            )
+    return cases
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--image-bytes", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=10)
+    args = parser.parse_args()
+
+    if not brotli:
+        print("brotli not installed, gzip only", file=sys.stderr)
+
+    results = []
+    for count in (10, 100, 1000):
+        body = encode_products(make_products(count, args.image_bytes))
+        row = {"products": count, "bytes": len(body)}
+        for name, (compress, decompress) in codecs().items():
+            data = compress(body)
+            runs = timeit.repeat(lambda: compress(body), number=1, repeat=args.repeat)
+            decode = timeit.repeat(lambda: decompress(data), number=1, repeat=args.repeat)
+            row[name] = {
+                "bytes": len(data),
+                "ratio": round(len(body) / len(data), 1),
+                "compress_ms": round(min(runs) * 1000, 3),
+                "decompress_ms": round(min(decode) * 1000, 3),
+            }
+        results.append(row)
+
+    print(orjson.dumps(results, option=orjson.OPT_INDENT_2).decode())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark: cost of encoding a product listing.
+
+Compares the old FastAPI response_model path (validate into Product, dump to
+Python objects, stdlib json.dumps) with the paths server.py uses now.
+
+Usage (from backend/):
+    python benchmarks/bench_json_encoding.py [--image-bytes 0] [--repeat 20]
+"""
+
+import argparse
+import json
+import os
+import sys
+import timeit
+from datetime import datetime, timezone
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+os.environ.setdefault("DB_NAME", "bench")
+
+import orjson  # noqa: E402
+
+from server import PRODUCT_LIST, encode_products  # noqa: E402
+
+
+def make_products(count: int, image_bytes: int) -> list:
+    now = datetime.now(timezone.utc)
+    # Inline images are what the catalog used to carry; 0 means short URLs
+    image = "data:image/jpeg;base64," + "A" * image_bytes if image_bytes else "https://example.com/i.jpg"
+    return [
+        {
+            "product_id": f"prod_{i:012x}",
+            "name": f"Bolsa de Crochê {i}",
+            "description": "Uma linda bolsa de crochê com cores vibrantes, feita com linha 100% algodão.",
+            "price": 45.9 + i,
+            "sizes": ["P", "M", "G"],
+            "colors": ["#FF6B6B", "#4ECDC4", "#45B7D1", "#FFFFFF"],
+            "images": [image, image],
+            "created_at": now,
+            "updated_at": now,
+        }
+        for i in range(count)
+    ]
+
+
+def fastapi_default(products: list) -> bytes:
+    models = PRODUCT_LIST.validate_python(products)
+    content = PRODUCT_LIST.dump_python(models, mode="json")
+    return json.dumps(content, ensure_ascii=False, separators=(",", ":")).encode()
+
+
+CASES = {
+    "fastapi_default": fastapi_default,
+    "pydantic_dump_json": lambda products: encode_products(products, validate=True),
+    "orjson_projected": lambda products: encode_products(products, validate=False),
+}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--image-bytes", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    results = []
+    for count in (10, 100, 1000):
+        products = make_products(count, args.image_bytes)
+        row = {"products": count}
+        for name, encode in CASES.items():
+            runs = timeit.repeat(lambda: encode(products), number=1, repeat=args.repeat)
+            row[f"{name}_ms"] = round(min(runs) * 1000, 3)
+        # A cache hit skips all of this and only hands over these bytes
+        row["bytes"] = len(encode_products(products))
+        row["speedup"] = round(row["fastapi_default_ms"] / row["pydantic_dump_json_ms"], 1)
+        results.append(row)
+
+    print(orjson.dumps(results, option=orjson.OPT_INDENT_2).decode())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+Runs server:app for the load test, against an in-memory mongomock database
+(--mongo mock) or a real mongod given by MONGO_URL (--mongo url), after
+seeding products plus an admin user/session.
+
+Started by load_test.py; not meant to be run by hand.
+"""
+
+import argparse
+import asyncio
+import base64
+import os
+import sys
+import tempfile
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BACKEND_DIR))
+sys.path.insert(0, str(BACKEND_DIR.parent))
+
+BENCH_ADMIN_EMAIL = "bench.admin@example.com"
+
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+os.environ.setdefault("DB_NAME", "bench")
+os.environ["ADMIN_EMAILS"] = BENCH_ADMIN_EMAIL
+os.environ.setdefault("IMAGE_STORE_DIR", tempfile.mkdtemp(prefix="bench-images-"))
+
+import uvicorn  # noqa: E402
+
+import server  # noqa: E402
+from setup_sample_products import SAMPLE_PRODUCTS  # noqa: E402
+
+
+async def seed(db, products: int, image_kb: int, session_token: str) -> None:
+    await db.products.delete_many({})
+    await db.users.delete_many({"email": BENCH_ADMIN_EMAIL})
+    await db.user_sessions.delete_many({"session_token": session_token})
+
+    inline = None
+    if image_kb:
+        inline = "data:image/jpeg;base64," + base64.b64encode(os.urandom(image_kb * 1024)).decode()
+
+    base = datetime.now(timezone.utc) - timedelta(days=1)
+    docs = []
+    for i in range(products):
+        sample = SAMPLE_PRODUCTS[i % len(SAMPLE_PRODUCTS)]
+        created = base + timedelta(seconds=i)
+        docs.append({
+            **sample,
+            "product_id": f"prod_bench{i:08d}",
+            "name": f"{sample['name']} #{i}",
+            "images": [inline] * len(sample["images"]) if inline else list(sample["images"]),
+            "created_at": created,
+            "updated_at": created,
+        })
+    if docs:
+        await db.products.insert_many(docs)
+
+    now = datetime.now(timezone.utc)
+    await db.users.insert_one({
+        "user_id": "bench-admin",
+        "email": BENCH_ADMIN_EMAIL,
+        "name": "Bench Admin",
+        "picture": None,
+        "created_at": now,
+    })
+    await db.user_sessions.insert_one({
+        "user_id": "bench-admin",
+        "session_token": session_token,
+        "expires_at": now + timedelta(days=1),
+        "created_at": now,
+    })
+
+
+async def seed_url(products: int, image_kb: int, session_token: str) -> None:
+    # server creates its client at startup inside uvicorn's loop, so seed with one of our own
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    client = AsyncIOMotorClient(os.environ["MONGO_URL"], tz_aware=True)
+    try:
+        await seed(client[os.environ["DB_NAME"]], products, image_kb, session_token)
+    finally:
+        client.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--port", type=int, required=True)
+    parser.add_argument("--mongo", choices=["mock", "url"], default="mock")
+    parser.add_argument("--products", type=int, default=100)
+    parser.add_argument("--image-kb", type=int, default=0)
+    parser.add_argument("--session-token", required=True)
+    args = parser.parse_args()
+
+    if args.mongo == "mock":
+        from mongomock_motor import AsyncMongoMockClient
+
+        server.db = AsyncMongoMockClient(tz_aware=True)[os.environ["DB_NAME"]]
+        asyncio.run(seed(server.db, args.products, args.image_kb, args.session_token))
+    else:
+        asyncio.run(seed_url(args.products, args.image_kb, args.session_token))
+    uvicorn.run(server.app, host="127.0.0.1", port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,280 @@
+#!/usr/bin/env python3
+"""
+Load test for the API: starts server:app in a subprocess against mongomock,
+an ephemeral local mongod, or an existing MONGO_URL, seeds it, drives
+concurrent requests at each scenario and prints JSON with p50/p95/p99
+latency, requests/second and the server's peak RSS.
+
+Usage (from backend/):
+    python benchmarks/load_test.py --products 500 --image-kb 0 --concurrency 20
+    python benchmarks/load_test.py --mongo mongod --output before.json
+    python benchmarks/load_test.py --compare before.json
+
+Needs httpx, Pillow and, for --mongo mock, mongomock-motor.
+"""
+
+import argparse
+import asyncio
+import io
+import os
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+import httpx
+import orjson
+
+BENCH_DIR = Path(__file__).resolve().parent
+
+# Seeded by bench_server.py for the authenticated scenarios
+BENCH_SESSION_TOKEN = "bench_session_token"
+AUTH = {"Authorization": f"Bearer {BENCH_SESSION_TOKEN}"}
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, round(pct / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def peak_rss_kb(pid: int) -> Optional[int]:
+    """High-water mark of resident memory, read from /proc (Linux only)."""
+    try:
+        with open(f"/proc/{pid}/status") as fh:
+            for line in fh:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return None
+
+
+def make_jpeg(width: int = 1600, height: int = 1200) -> bytes:
+    from PIL import Image
+
+    buf = io.BytesIO()
+    Image.effect_noise((width, height), 64).convert("RGB").save(buf, "JPEG", quality=85)
+    return buf.getvalue()
+
+
+async def run_scenario(
+    client: httpx.AsyncClient,
+    make_request: Callable,
+    total: int,
+    concurrency: int,
+) -> Dict[str, float]:
+    latencies: List[float] = []
+    errors = 0
+    remaining = total
+
+    async def worker():
+        nonlocal remaining, errors
+        while remaining > 0:
+            remaining -= 1
+            start = time.perf_counter()
+            try:
+                response = await make_request(client)
+                ok = response.status_code < 400
+            except httpx.HTTPError:
+                ok = False
+            latencies.append((time.perf_counter() - start) * 1000)
+            if not ok:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "rps": round(len(latencies) / elapsed, 1),
+        "p50_ms": round(percentile(latencies, 50), 2),
+        "p95_ms": round(percentile(latencies, 95), 2),
+        "p99_ms": round(percentile(latencies, 99), 2),
+        "max_ms": round(latencies[-1], 2) if latencies else 0.0,
+    }
+
+
+def build_scenarios(product_ids: List[str], upload_bytes: bytes) -> Dict[str, Callable]:
+    return {
+        "catalog": lambda c: c.get("/api/products"),
+        "catalog_grid": lambda c: c.get(
+            "/api/products",
+            params={"fields": "name,description,price,colors,images,image_variants", "max_images": 1},
+        ),
+        "product_detail": lambda c: c.get(f"/api/products/{random.choice(product_ids)}"),
+        "auth_me": lambda c: c.get("/api/auth/me", headers=AUTH),
+        # Random trailing bytes after the JPEG end marker make every upload a
+        # new blob, so the derivative pipeline runs each time
+        "upload": lambda c: c.post(
+            "/api/upload-image",
+            headers=AUTH,
+            files={"file": ("bench.jpg", upload_bytes + os.urandom(16), "image/jpeg")},
+        ),
+    }
+
+
+def start_mongod() -> Tuple[subprocess.Popen, str, str]:
+    binary = shutil.which("mongod")
+    if not binary:
+        raise SystemExit("--mongo mongod needs a mongod binary on PATH")
+    dbpath = tempfile.mkdtemp(prefix="bench-mongod-")
+    port = free_port()
+    proc = subprocess.Popen(
+        [binary, "--dbpath", dbpath, "--port", str(port), "--bind_ip", "127.0.0.1", "--quiet"],
+        stdout=subprocess.DEVNULL,
+    )
+    return proc, dbpath, f"mongodb://127.0.0.1:{port}"
+
+
+async def wait_ready(base_url: str, proc: subprocess.Popen, timeout: float = 60.0) -> None:
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient(base_url=base_url) as client:
+        while time.monotonic() < deadline:
+            if proc.poll() is not None:
+                raise SystemExit("Server exited during startup")
+            try:
+                if (await client.get("/api/products", params={"limit": 1})).status_code == 200:
+                    return
+            except httpx.TransportError:
+                pass
+            await asyncio.sleep(0.2)
+    raise SystemExit("Server did not become ready in time")
+
+
+async def drive(args, base_url: str) -> Dict[str, dict]:
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=60.0) as client:
+        listing = await client.get("/api/products", params={"fields": "product_id", "limit": 500})
+        product_ids = [p["product_id"] for p in listing.json()] or ["missing"]
+        scenarios = build_scenarios(product_ids, make_jpeg() if "upload" in args.scenarios else b"")
+
+        results = {}
+        for name in args.scenarios:
+            total = args.upload_requests if name == "upload" else args.requests
+            concurrency = min(args.concurrency, 4) if name == "upload" else args.concurrency
+            # Warm connections and caches so the numbers reflect steady state
+            await run_scenario(client, scenarios[name], min(total, concurrency * 2), concurrency)
+            results[name] = await run_scenario(client, scenarios[name], total, concurrency)
+            print(f"{name}: {results[name]}", file=sys.stderr)
+        return results
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=BENCH_DIR, text=True, stderr=subprocess.DEVNULL
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(current: dict, baseline: dict) -> dict:
+    """Relative change per scenario metric; positive rps / negative ms is better."""
+    deltas = {}
+    for name, metrics in current["scenarios"].items():
+        before = baseline.get("scenarios", {}).get(name)
+        if not before:
+            continue
+        deltas[name] = {
+            key: round((metrics[key] - before[key]) / before[key] * 100, 1)
+            for key in ("rps", "p50_ms", "p95_ms", "p99_ms")
+            if before.get(key)
+        }
+    return deltas
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--mongo", choices=["mock", "mongod", "url"], default="mock")
+    parser.add_argument("--products", type=int, default=200)
+    parser.add_argument("--image-kb", type=int, default=0, help="inline image size per photo, 0 for URLs")
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--requests", type=int, default=2000, help="requests per scenario")
+    parser.add_argument("--upload-requests", type=int, default=40)
+    parser.add_argument(
+        "--scenarios",
+        nargs="+",
+        default=["catalog", "catalog_grid", "product_detail", "auth_me", "upload"],
+    )
+    parser.add_argument("--output", help="also write the JSON report to this file")
+    parser.add_argument("--compare", help="baseline JSON report to diff against")
+    args = parser.parse_args()
+
+    env = dict(os.environ)
+    mongod = None
+    server_mongo = "mock"
+    if args.mongo == "mongod":
+        mongod, mongod_path, env["MONGO_URL"] = start_mongod()
+        server_mongo = "url"
+    elif args.mongo == "url":
+        if "MONGO_URL" not in env:
+            raise SystemExit("--mongo url needs MONGO_URL")
+        server_mongo = "url"
+    env.setdefault("DB_NAME", f"bench_{os.getpid()}")
+
+    port = free_port()
+    base_url = f"http://127.0.0.1:{port}"
+    server = subprocess.Popen(
+        [
+            sys.executable, str(BENCH_DIR / "bench_server.py"),
+            "--port", str(port),
+            "--mongo", server_mongo,
+            "--products", str(args.products),
+            "--image-kb", str(args.image_kb),
+            "--session-token", BENCH_SESSION_TOKEN,
+        ],
+        env=env,
+    )
+
+    try:
+        asyncio.run(wait_ready(base_url, server))
+        scenarios = asyncio.run(drive(args, base_url))
+        rss = peak_rss_kb(server.pid)
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+        if mongod:
+            mongod.terminate()
+            mongod.wait(timeout=30)
+            shutil.rmtree(mongod_path, ignore_errors=True)
+
+    report = {
+        "commit": git_commit(),
+        "config": {
+            "mongo": args.mongo,
+            "products": args.products,
+            "image_kb": args.image_kb,
+            "concurrency": args.concurrency,
+            "requests": args.requests,
+        },
+        "server_peak_rss_kb": rss,
+        "scenarios": scenarios,
+    }
+    if args.compare:
+        with open(args.compare, "rb") as fh:
+            report["vs_baseline_pct"] = compare(report, orjson.loads(fh.read()))
+
+    output = orjson.dumps(report, option=orjson.OPT_INDENT_2)
+    if args.output:
+        Path(args.output).write_bytes(output)
+    print(output.decode())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+"""
+Cold-start profile of the API: where `import server` spends its time
+(python -X importtime) and how long a fresh process takes to answer its
+health check and first catalog requests. Prints JSON.
+
+Usage (from backend/):
+    python benchmarks/startup_profile.py                 # mongomock, no data
+    python benchmarks/startup_profile.py --mongo url     # real MONGO_URL, plain uvicorn
+    python benchmarks/startup_profile.py --output before.json
+
+With --mongo mock the server runs through bench_server.py, so time to ready
+includes seeding --products documents (none by default).
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List
+
+import httpx
+import orjson
+
+BENCH_DIR = Path(__file__).resolve().parent
+BACKEND_DIR = BENCH_DIR.parent
+
+sys.path.insert(0, str(BENCH_DIR))
+from load_test import BENCH_SESSION_TOKEN, free_port  # noqa: E402
+
+FIRST_REQUESTS = (
+    "/api/products",
+    "/api/products?fields=name,description,price,colors,images,image_variants&max_images=1",
+)
+
+
+def import_profile(env: Dict[str, str], repeat: int, top: int) -> dict:
+    """Median wall time of `import server` plus the heaviest imports of one run."""
+    wall = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        subprocess.run([sys.executable, "-c", "import server"], cwd=BACKEND_DIR, env=env, check=True)
+        wall.append((time.perf_counter() - started) * 1000)
+
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import server"],
+        cwd=BACKEND_DIR, env=env, check=True, capture_output=True, text=True,
+    )
+    # Lines look like "import time:  self_us |  cumulative_us | <indent>module"
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        depth = (len(name) - len(name.lstrip())) // 2
+        rows.append((name.strip(), depth, int(self_us) / 1000, int(cumulative_us) / 1000))
+
+    def shape(selected: List[tuple]) -> List[dict]:
+        return [
+            {"module": name, "cumulative_ms": round(cum, 1), "self_ms": round(own, 1)}
+            for name, _, own, cum in sorted(selected, key=lambda r: -r[3])[:top]
+        ]
+
+    # A module's imports are printed before it; server's are the depth-1 rows
+    # since the previous top-level import
+    server_index = next(i for i, r in enumerate(rows) if r[0] == "server" and r[1] == 0)
+    first_child = max((i + 1 for i, r in enumerate(rows[:server_index]) if r[1] == 0), default=0)
+    server_row = rows[server_index]
+    return {
+        "process_ms_median": round(statistics.median(wall), 1),
+        "import_server_ms": round(server_row[3], 1),
+        "server_module_self_ms": round(server_row[2], 1),
+        # Direct imports of server.py and the heaviest modules overall
+        "server_imports": shape([r for r in rows[first_child:server_index] if r[1] == 1]),
+        "heaviest": shape(rows),
+    }
+
+
+def time_to_first_request(args, env: Dict[str, str]) -> dict:
+    port = free_port()
+    if args.mongo == "mock":
+        command = [
+            sys.executable, str(BENCH_DIR / "bench_server.py"),
+            "--port", str(port), "--mongo", "mock",
+            "--products", str(args.products),
+            "--session-token", BENCH_SESSION_TOKEN,
+        ]
+    else:
+        command = [
+            sys.executable, "-m", "uvicorn", "server:app",
+            "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning",
+        ]
+
+    started = time.perf_counter()
+    server = subprocess.Popen(command, cwd=BACKEND_DIR, env=env)
+    base_url = f"http://127.0.0.1:{port}"
+    try:
+        with httpx.Client(base_url=base_url, timeout=30.0) as client:
+            while True:
+                if server.poll() is not None:
+                    raise SystemExit("Server exited during startup")
+                try:
+                    if client.get("/api/").status_code == 200:
+                        break
+                except httpx.TransportError:
+                    time.sleep(0.01)
+            ready_ms = (time.perf_counter() - started) * 1000
+
+            requests = {}
+            for path in FIRST_REQUESTS:
+                timings = []
+                for _ in range(2):
+                    request_started = time.perf_counter()
+                    client.get(path).raise_for_status()
+                    timings.append(round((time.perf_counter() - request_started) * 1000, 2))
+                requests[path] = {"first_ms": timings[0], "second_ms": timings[1]}
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+
+    return {"time_to_ready_ms": round(ready_ms, 1), "requests": requests}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--mongo", choices=["mock", "url"], default="mock")
+    parser.add_argument("--products", type=int, default=0, help="seeded with --mongo mock")
+    parser.add_argument("--repeat", type=int, default=5, help="runs of the import timing")
+    parser.add_argument("--top", type=int, default=15)
+    parser.add_argument("--output", help="also write the JSON report to this file")
+    args = parser.parse_args()
+
+    env = dict(os.environ)
+    if args.mongo == "url" and "MONGO_URL" not in env:
+        raise SystemExit("--mongo url needs MONGO_URL")
+    # Importing server never connects, so a placeholder is enough for the import profile
+    env.setdefault("MONGO_URL", "mongodb://127.0.0.1:27017")
+    env.setdefault("DB_NAME", f"startup_{os.getpid()}")
+
+    report = {
+        "python": sys.version.split()[0],
+        "mongo": args.mongo,
+        "import": import_profile(env, args.repeat, args.top),
+        "startup": time_to_first_request(args, env),
+    }
+    output = orjson.dumps(report, option=orjson.OPT_INDENT_2)
+    if args.output:
+        Path(args.output).write_bytes(output)
+    print(output.decode())
+
+
+if __name__ == "__main__":
+    main()
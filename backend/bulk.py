@@ -0,0 +1,70 @@
+"""
+Helpers for the NDJSON bulk import/export endpoints.
+"""
+
+import os
+from typing import AsyncIterator, Tuple
+
+from pydantic import ValidationError
+
+BULK_BATCH_SIZE = int(os.environ.get("BULK_BATCH_SIZE", "500"))
+# A line may carry inline data: URI images, so allow more than one upload's worth
+MAX_BULK_LINE_BYTES = int(os.environ.get("MAX_BULK_LINE_BYTES", str(32 * 1024 * 1024)))
+# Per-line errors echoed back in the import summary
+MAX_REPORTED_ERRORS = 1000
+
+
+class LineTooLong(ValueError):
+    def __init__(self, line_no: int, limit: int):
+        super().__init__(f"Line exceeds {limit} bytes")
+        self.line_no = line_no
+
+
+async def iter_ndjson_lines(
+    chunks: AsyncIterator[bytes],
+    max_line_bytes: int = MAX_BULK_LINE_BYTES,
+) -> AsyncIterator[Tuple[int, bytes]]:
+    """
+    Split a byte stream into (1-based line number, line) pairs, skipping blank
+    lines. Only the current partial line is buffered, in a bytearray that is
+    appended to and searched only past what was already scanned, so a long
+    line costs linear time.
+    """
+    buffer = bytearray()
+    line_no = 0
+    async for chunk in chunks:
+        # Bytes before `scan` are known not to contain a newline
+        scan = len(buffer)
+        buffer += chunk
+        start = 0
+        while True:
+            end = buffer.find(b"\n", scan)
+            if end < 0:
+                break
+            line = bytes(buffer[start:end])
+            start = scan = end + 1
+            line_no += 1
+            if line.strip():
+                yield line_no, line
+        if start:
+            del buffer[:start]
+        if len(buffer) > max_line_bytes:
+            raise LineTooLong(line_no + 1, max_line_bytes)
+    if buffer.strip():
+        yield line_no + 1, bytes(buffer)
+
+
+def describe_error(exc: Exception) -> str:
+    """One-line message for a rejected line."""
+    if isinstance(exc, ValidationError):
+        return "; ".join(
+            f"{'.'.join(str(part) for part in err['loc']) or 'line'}: {err['msg']}"
+            for err in exc.errors()
+        )
+    return str(exc)
+
+
+def record_error(summary: dict, line_no: int, message: str) -> None:
+    summary["failed"] += 1
+    if len(summary["errors"]) < MAX_REPORTED_ERRORS:
+        summary["errors"].append({"line": line_no, "error": message})
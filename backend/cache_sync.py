@@ -0,0 +1,197 @@
+"""
+Keeps every worker's in-process caches in step with MongoDB.
+
+Each worker process has its own catalog and session cache, and a write only
+invalidates the caches of the worker that handled it. CacheSync watches a
+change stream on products, users and user_sessions and drops the matching
+cache in every worker, whichever process (or mongosh session) made the
+write. While the stream is live, the cache TTLs are raised to
+CACHE_SYNC_TTL: they only have to cover events we might have missed.
+Catalog changes also schedule a static snapshot rebuild, so edits made
+straight in Mongo reach the CDN copy too.
+
+Change streams need a replica set. Against a standalone mongod, CacheSync
+polls the cache_versions collection instead, which the API bumps after its
+own writes; writes made outside the API then fall back to the normal TTLs.
+"""
+
+import asyncio
+import logging
+import os
+from typing import Awaitable, Callable, Dict, Optional
+
+from pymongo.errors import OperationFailure, PyMongoError
+
+from metrics import cache_invalidations
+
+logger = logging.getLogger(__name__)
+
+VERSIONS_COLLECTION = "cache_versions"
+
+# Collection -> the cache it feeds
+TOPICS = {"products": "catalog", "users": "sessions", "user_sessions": "sessions"}
+
+# "$changeStream is only supported on replica sets"
+CHANGE_STREAM_UNSUPPORTED = 40573
+CHANGE_STREAM_HISTORY_LOST = 286
+
+# Only the fields we dispatch on; _id is the resume token and must be kept
+WATCH_PIPELINE = [
+    {"$match": {"$or": [
+        {"ns.coll": "products"},
+        # New sessions and users can't be in anyone's cache yet
+        {
+            "ns.coll": {"$in": ["users", "user_sessions"]},
+            "operationType": {"$in": ["update", "replace", "delete", "drop", "rename"]},
+        },
+        {"operationType": "dropDatabase"},
+    ]}},
+    {"$project": {"ns": 1, "operationType": 1}},
+]
+
+
+class CacheSync:
+    """
+    mode is "auto" (change stream, else polling), "poll" or "off". Start it
+    once the database is connected; bump() after writes the API makes.
+    on_catalog_change is awaited after each catalog invalidation it applies;
+    every worker gets every event, so it has to be safe to call N times.
+    """
+
+    def __init__(
+        self,
+        db,
+        catalog_cache,
+        session_cache,
+        mode: str = "auto",
+        poll_interval: float = 2.0,
+        synced_ttl: float = 3600.0,
+        on_catalog_change: Optional[Callable[[], Awaitable[None]]] = None,
+    ):
+        self.db = db
+        self.catalog_cache = catalog_cache
+        self.session_cache = session_cache
+        self.mode = mode if db is not None else "off"
+        self.poll_interval = poll_interval
+        self.synced_ttl = synced_ttl
+        self.on_catalog_change = on_catalog_change
+        # What the stream currently delivers: "changestream", "poll" or None
+        self.source: Optional[str] = None
+        self._base_ttls = (catalog_cache.ttl, session_cache.ttl)
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        if self.mode != "off" and self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def bump(self, topic: str) -> None:
+        """Record a write to "catalog" or "sessions" for workers that are polling. Best effort."""
+        if self.mode == "off":
+            return
+        try:
+            await self.db[VERSIONS_COLLECTION].update_one({"_id": topic}, {"$inc": {"version": 1}}, upsert=True)
+        except PyMongoError as e:
+            logger.warning("Cache sync: could not bump %s: %r", topic, e)
+
+    async def invalidate(self, topic: Optional[str], source: str) -> None:
+        """Drop the cache fed by topic; None drops both."""
+        if topic in (None, "catalog"):
+            self.catalog_cache.invalidate()
+            cache_invalidations.inc(cache="catalog", source=source)
+            if self.on_catalog_change:
+                await self.on_catalog_change()
+        if topic in (None, "sessions"):
+            self.session_cache.clear()
+            cache_invalidations.inc(cache="sessions", source=source)
+
+    async def _run(self) -> None:
+        if self.mode == "auto":
+            await self._watch()
+        await self._poll()
+
+    def _set_source(self, source: Optional[str]) -> None:
+        if source == self.source:
+            return
+        self.source = source
+        catalog_ttl, session_ttl = self._base_ttls
+        if source == "changestream":
+            catalog_ttl = max(catalog_ttl, self.synced_ttl)
+            session_ttl = max(session_ttl, self.synced_ttl)
+        self.catalog_cache.ttl = catalog_ttl
+        self.session_cache.ttl = session_ttl
+
+    async def _watch(self) -> None:
+        """Follow the change stream; returns only if it can't be opened at all."""
+        resume_token = None
+        opened = False
+        delay = 1.0
+        while True:
+            try:
+                async with self.db.watch(WATCH_PIPELINE, resume_after=resume_token) as stream:
+                    if not opened:
+                        logger.info("Cache sync: following the change stream")
+                    elif resume_token is None:
+                        # Couldn't resume, so anything may have changed meanwhile
+                        await self.invalidate(None, "changestream")
+                    opened = True
+                    delay = 1.0
+                    self._set_source("changestream")
+                    async for change in stream:
+                        if change["operationType"] == "invalidate":
+                            resume_token = None
+                            break
+                        resume_token = stream.resume_token
+                        await self.invalidate(TOPICS.get(change.get("ns", {}).get("coll")), "changestream")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                if not opened:
+                    if isinstance(e, OperationFailure) and e.code == CHANGE_STREAM_UNSUPPORTED:
+                        logger.info("Cache sync: no change streams on this deployment, polling")
+                    else:
+                        logger.warning("Cache sync: change stream unavailable (%r), polling", e)
+                    return
+                if isinstance(e, OperationFailure) and e.code == CHANGE_STREAM_HISTORY_LOST:
+                    resume_token = None
+                logger.warning("Cache sync: change stream lost (%r), reopening in %.0fs", e, delay)
+                # Until it's back, the caches are only as fresh as their normal TTLs
+                self._set_source(None)
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, 60.0)
+
+    async def _poll(self) -> None:
+        logger.info("Cache sync: polling %s every %.1fs", VERSIONS_COLLECTION, self.poll_interval)
+        self._set_source("poll")
+        seen: Optional[Dict[str, int]] = None
+        while True:
+            try:
+                current = {
+                    doc["_id"]: doc.get("version", 0)
+                    async for doc in self.db[VERSIONS_COLLECTION].find({})
+                }
+            except PyMongoError as e:
+                logger.warning("Cache sync: poll failed: %r", e)
+            else:
+                if seen is not None:
+                    for topic in set(current) | set(seen):
+                        if current.get(topic) != seen.get(topic):
+                            await self.invalidate(topic, "poll")
+                seen = current
+            await asyncio.sleep(self.poll_interval)
+
+    async def aclose(self) -> None:
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+
+
+def create_cache_sync(db, catalog_cache, session_cache, on_catalog_change=None) -> CacheSync:
+    return CacheSync(
+        db,
+        catalog_cache,
+        session_cache,
+        mode=os.environ.get("CACHE_SYNC", "auto").strip().lower(),
+        poll_interval=float(os.environ.get("CACHE_SYNC_POLL_INTERVAL", "2")),
+        synced_ttl=float(os.environ.get("CACHE_SYNC_TTL", "3600")),
+        on_catalog_change=on_catalog_change,
+    )
@@ -0,0 +1,114 @@
+"""
+In-process cache of serialized catalog responses.
+
+Entries hold the already-encoded JSON body, so a hit costs neither a Mongo
+round-trip nor Pydantic validation. Admin writes bump the catalog version,
+which drops every entry; the TTL only matters for writes made outside the API.
+"""
+
+import hashlib
+import os
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Dict, Hashable, Optional
+
+from compression import compress
+
+
+def make_etag(body: bytes) -> str:
+    """Strong validator: a hash of the exact bytes we send."""
+    return '"' + hashlib.blake2b(body, digest_size=16).hexdigest() + '"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    # Weak comparison is what If-None-Match uses, so ignore W/ prefixes
+    candidates = (tag.strip().removeprefix("W/") for tag in if_none_match.split(","))
+    return etag in candidates
+
+
+@dataclass
+class CachedBody:
+    body: bytes
+    headers: Dict[str, str] = field(default_factory=dict)
+    etag: str = ""
+    expires_at: float = 0.0
+    # Compressed copies of body by Content-Encoding, made on first request.
+    # Not counted against max_bytes; they're a fraction of the body.
+    compressed: Dict[str, bytes] = field(default_factory=dict)
+
+    def __post_init__(self):
+        if not self.etag:
+            self.etag = make_etag(self.body)
+
+    def encoded(self, encoding: str) -> bytes:
+        data = self.compressed.get(encoding)
+        if data is None:
+            data = self.compressed[encoding] = compress(self.body, encoding)
+        return data
+
+
+class CatalogCache:
+    """Bounded LRU (by entry count and total body bytes) with a version counter."""
+
+    def __init__(self, max_entries: int = 256, max_bytes: int = 32 * 1024 * 1024, ttl: float = 60.0):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.version = 0
+        self._entries: "OrderedDict[Hashable, CachedBody]" = OrderedDict()
+        self._bytes = 0
+
+    def get(self, key: Hashable) -> Optional[CachedBody]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry.expires_at <= time.monotonic():
+            self._drop(key)
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    def put(self, key: Hashable, entry: CachedBody, version: Optional[int] = None) -> None:
+        """
+        Store an entry. Pass the version read before querying Mongo: if a write
+        bumped it in the meantime the result may be stale and is not cached.
+        """
+        if version is not None and version != self.version:
+            return
+        if len(entry.body) > self.max_bytes:
+            return
+
+        self._drop(key)
+        entry.expires_at = time.monotonic() + self.ttl
+        self._entries[key] = entry
+        self._bytes += len(entry.body)
+
+        while self._entries and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+            oldest = next(iter(self._entries))
+            self._drop(oldest)
+
+    def invalidate(self) -> None:
+        self.version += 1
+        self._entries.clear()
+        self._bytes = 0
+
+    def _drop(self, key: Hashable) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._bytes -= len(entry.body)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+def create_catalog_cache() -> CatalogCache:
+    return CatalogCache(
+        max_entries=int(os.environ.get("CATALOG_CACHE_MAX_ENTRIES", "256")),
+        max_bytes=int(os.environ.get("CATALOG_CACHE_MAX_BYTES", str(32 * 1024 * 1024))),
+        ttl=float(os.environ.get("CATALOG_CACHE_TTL", "60")),
+    )
@@ -0,0 +1,157 @@
+"""
+Query building for the product listing: keyset pagination on
+(created_at, product_id), field projection and filters pushed down to Mongo,
+plus the text-search/facet pipeline behind GET /api/products/search.
+"""
+
+import base64
+import json
+from datetime import datetime, timezone
+from typing import Iterable, List, Optional, Tuple
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 500
+
+# Always returned, whatever fields= asks for: identity plus the pagination key
+ALWAYS_PROJECTED = ("product_id", "created_at")
+
+SORT_ORDER = [("created_at", 1), ("product_id", 1)]
+
+DEFAULT_SEARCH_LIMIT = 20
+MAX_SEARCH_LIMIT = 100
+
+# Lower bounds of the price facet buckets; the last bucket is open-ended
+PRICE_BUCKETS = (0, 25, 50, 100, 200)
+
+
+def encode_cursor(product: dict) -> str:
+    raw = json.dumps(
+        [product["created_at"].isoformat(), product["product_id"]],
+        separators=(",", ":"),
+    )
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, str]:
+    """Raises ValueError for anything that isn't a cursor we issued."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        created_at, product_id = json.loads(base64.urlsafe_b64decode(padded))
+        created_at = datetime.fromisoformat(created_at)
+    except Exception as e:
+        raise ValueError("Invalid cursor") from e
+    if not isinstance(product_id, str):
+        raise ValueError("Invalid cursor")
+    if created_at.tzinfo is None:
+        created_at = created_at.replace(tzinfo=timezone.utc)
+    return created_at, product_id
+
+
+def parse_fields(fields: Optional[str], allowed: Iterable[str]) -> Optional[List[str]]:
+    """Parse fields=name,price,... into a list; None means the full document."""
+    if not fields:
+        return None
+    allowed = set(allowed)
+    requested = [f.strip() for f in fields.split(",") if f.strip()]
+    unknown = [f for f in requested if f not in allowed]
+    if unknown:
+        raise ValueError(f"Unknown field(s): {', '.join(unknown)}")
+    return list(dict.fromkeys([*ALWAYS_PROJECTED, *requested]))
+
+
+def build_projection(fields: Optional[List[str]], max_images: Optional[int]) -> dict:
+    projection = {"_id": 0}
+    if fields is not None:
+        projection.update({f: 1 for f in fields})
+    if max_images is not None and (fields is None or "images" in fields):
+        projection["images"] = {"$slice": max_images}
+    return projection
+
+
+def build_filter(
+    cursor: Optional[Tuple[datetime, str]] = None,
+    min_price: Optional[float] = None,
+    max_price: Optional[float] = None,
+    sizes: Optional[List[str]] = None,
+    colors: Optional[List[str]] = None,
+) -> dict:
+    clauses = []
+
+    if cursor is not None:
+        created_at, product_id = cursor
+        clauses.append({"$or": [
+            {"created_at": {"$gt": created_at}},
+            {"created_at": created_at, "product_id": {"$gt": product_id}},
+        ]})
+
+    price = {}
+    if min_price is not None:
+        price["$gte"] = min_price
+    if max_price is not None:
+        price["$lte"] = max_price
+    if price:
+        clauses.append({"price": price})
+
+    if sizes:
+        clauses.append({"sizes": {"$in": sizes}})
+    if colors:
+        clauses.append({"colors": {"$in": colors}})
+
+    if not clauses:
+        return {}
+    if len(clauses) == 1:
+        return clauses[0]
+    return {"$and": clauses}
+
+
+def build_search_pipeline(
+    q: str,
+    filters: dict,
+    limit: int = DEFAULT_SEARCH_LIMIT,
+    offset: int = 0,
+) -> list:
+    """
+    One aggregation returning a page of results ranked by text score, the
+    total match count and facet counts, all served by the product_text index.
+    """
+    match = {"$text": {"$search": q}}
+    if filters:
+        match = {"$and": [match, filters]}
+
+    return [
+        {"$match": match},
+        # Materialize the score before $facet, whose sub-pipelines can't read text metadata
+        {"$addFields": {"score": {"$meta": "textScore"}}},
+        {"$facet": {
+            "results": [
+                {"$sort": {"score": -1, "product_id": 1}},
+                {"$skip": offset},
+                {"$limit": limit},
+                {"$project": {"_id": 0}},
+            ],
+            "total": [{"$count": "count"}],
+            "sizes": [{"$unwind": "$sizes"}, {"$sortByCount": "$sizes"}],
+            "colors": [{"$unwind": "$colors"}, {"$sortByCount": "$colors"}],
+            "price": [{"$bucket": {
+                "groupBy": "$price",
+                "boundaries": [*PRICE_BUCKETS, float("inf")],
+                "default": "other",
+            }}],
+            # Last-Modified: any matching product's edit can move the facets
+            "updated": [{"$group": {"_id": None, "at": {"$max": "$updated_at"}}}],
+        }},
+    ]
+
+
+def shape_facets(raw: dict) -> dict:
+    """Turn the $facet output into {"sizes": [...], "colors": [...], "price": [...]}."""
+    counts = {b["_id"]: b["count"] for b in raw.get("price", []) if b["_id"] != "other"}
+    bounds = [*PRICE_BUCKETS, None]
+    return {
+        "sizes": [{"value": f["_id"], "count": f["count"]} for f in raw.get("sizes", [])],
+        "colors": [{"value": f["_id"], "count": f["count"]} for f in raw.get("colors", [])],
+        "price": [
+            {"min": low, "max": high, "count": counts.get(low, 0)}
+            for low, high in zip(bounds, bounds[1:])
+        ],
+    }
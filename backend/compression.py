@@ -0,0 +1,167 @@
+"""
+Response compression: gzip, plus Brotli when the `brotli` package is installed.
+
+CompressionMiddleware compresses eligible responses on the fly. Catalog
+responses come from the catalog cache and arrive already compressed: the
+compressed copy is kept on the cache entry, so a hit never recompresses.
+"""
+
+import gzip
+import os
+import zlib
+from typing import Optional, Sequence
+
+from starlette.datastructures import Headers, MutableHeaders
+
+try:
+    import brotli
+except ImportError:  # gzip only
+    brotli = None
+
+MIN_SIZE = int(os.environ.get("COMPRESSION_MIN_SIZE", "1024"))
+GZIP_LEVEL = int(os.environ.get("COMPRESSION_GZIP_LEVEL", "6"))
+BROTLI_QUALITY = int(os.environ.get("COMPRESSION_BROTLI_QUALITY", "5"))
+
+# Prefixes of the content types worth compressing; images are already compressed
+COMPRESSIBLE_TYPES = ("application/json", "application/x-ndjson", "text/", "image/svg+xml")
+
+
+def supported_encodings() -> Sequence[str]:
+    """In order of preference."""
+    return ("br", "gzip") if brotli else ("gzip",)
+
+
+def choose_encoding(accept_encoding: Optional[str]) -> Optional[str]:
+    """Best encoding the client accepts (highest q, then our preference), or None."""
+    if not accept_encoding:
+        return None
+    weights = {}
+    for part in accept_encoding.split(","):
+        name, _, params = part.strip().partition(";")
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        weights[name.strip().lower()] = q
+
+    best, best_q = None, 0.0
+    for encoding in supported_encodings():
+        q = weights.get(encoding, weights.get("*", 0.0))
+        if q > best_q:
+            best, best_q = encoding, q
+    return best
+
+
+def compress(body: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    # mtime=0 keeps the output deterministic for identical bodies
+    return gzip.compress(body, GZIP_LEVEL, mtime=0)
+
+
+class _StreamCompressor:
+    def __init__(self, encoding: str):
+        if encoding == "br":
+            self._compressor = brotli.Compressor(quality=BROTLI_QUALITY)
+            self._finish = self._compressor.finish
+            self._compress = self._compressor.process
+        else:
+            # wbits=31 writes a gzip header and trailer
+            self._compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)
+            self._finish = self._compressor.flush
+            self._compress = self._compressor.compress
+
+    def compress(self, data: bytes, final: bool) -> bytes:
+        out = self._compress(data) if data else b""
+        return out + self._finish() if final else out
+
+
+def coded_etag(etag: str, encoding: Optional[str]) -> str:
+    """
+    The validator for one content-coding of a body: a strong ETag must differ
+    between the identity, gzip and br bytes, so '"abc"' becomes '"abc-br"'.
+    Weak ETags are left alone.
+    """
+    if not encoding or not etag.endswith('"') or etag.startswith("W/"):
+        return etag
+    return f'{etag[:-1]}-{encoding}"'
+
+
+class CompressionMiddleware:
+    """
+    Pure ASGI, so streamed bodies (e.g. the NDJSON export) are compressed
+    chunk by chunk. Single-chunk bodies under `minimum_size` bytes, other
+    content types, and responses that already carry a Content-Encoding are
+    passed through untouched.
+    """
+
+    def __init__(self, app, minimum_size: int = MIN_SIZE, content_types: Sequence[str] = COMPRESSIBLE_TYPES):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.content_types = tuple(content_types)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        encoding = choose_encoding(Headers(scope=scope).get("accept-encoding"))
+        if not encoding:
+            await self.app(scope, receive, send)
+            return
+
+        start = None
+        compressor: Optional[_StreamCompressor] = None
+        passthrough = False
+
+        async def send_wrapper(message):
+            nonlocal start, compressor, passthrough
+            if message["type"] == "http.response.start":
+                # Held back until the first body chunk shows whether to compress
+                start = message
+                return
+            if message["type"] != "http.response.body" or passthrough:
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+            if compressor is None:
+                headers = MutableHeaders(scope=start)
+                if not self._eligible(start["status"], headers, len(body), more_body):
+                    passthrough = True
+                    await send(start)
+                    await send(message)
+                    return
+
+                headers["Content-Encoding"] = encoding
+                headers.add_vary_header("Accept-Encoding")
+                if "etag" in headers:
+                    headers["ETag"] = coded_etag(headers["etag"], encoding)
+                if not more_body:
+                    compressed = compress(body, encoding)
+                    headers["Content-Length"] = str(len(compressed))
+                    await send(start)
+                    await send({"type": "http.response.body", "body": compressed})
+                    return
+                del headers["Content-Length"]
+                compressor = _StreamCompressor(encoding)
+                await send(start)
+
+            await send({
+                "type": "http.response.body",
+                "body": compressor.compress(body, final=not more_body),
+                "more_body": more_body,
+            })
+
+        await self.app(scope, receive, send_wrapper)
+
+    def _eligible(self, status: int, headers: MutableHeaders, size: int, more_body: bool) -> bool:
+        if status < 200 or status in (204, 304) or "content-encoding" in headers:
+            return False
+        if not headers.get("content-type", "").lower().startswith(self.content_types):
+            return False
+        # A streamed body's total size is unknown up front
+        return more_body or size >= self.minimum_size
@@ -0,0 +1,116 @@
+"""
+Startup schema work: index declarations and small idempotent data migrations.
+Safe to run on every boot; existing indexes and migrated documents are no-ops.
+"""
+
+import logging
+from datetime import datetime, timezone
+
+from pymongo import ASCENDING, TEXT, IndexModel
+from pymongo.errors import OperationFailure
+
+logger = logging.getLogger(__name__)
+
+INDEXES = {
+    "products": [
+        IndexModel([("product_id", ASCENDING)], unique=True, name="product_id_unique"),
+        # Keyset pagination order of GET /api/products
+        IndexModel([("created_at", ASCENDING), ("product_id", ASCENDING)], name="created_at_product_id"),
+        # GET /api/products/search. Mongo keeps it current on every write; v3
+        # text indexes are diacritic-insensitive and stem Portuguese words.
+        IndexModel(
+            [("name", TEXT), ("description", TEXT)],
+            weights={"name": 3, "description": 1},
+            default_language="portuguese",
+            language_override="text_language",
+            name="product_text",
+        ),
+    ],
+    "users": [
+        IndexModel([("user_id", ASCENDING)], unique=True, name="user_id_unique"),
+        IndexModel([("email", ASCENDING)], unique=True, name="email_unique"),
+    ],
+    "user_sessions": [
+        IndexModel([("session_token", ASCENDING)], unique=True, name="session_token_unique"),
+        # Mongo deletes a session as soon as its (BSON date) expires_at passes
+        IndexModel([("expires_at", ASCENDING)], expireAfterSeconds=0, name="expires_at_ttl"),
+    ],
+    # Read by admin_policy.py when ADMIN_POLICY_SOURCE=mongo
+    "admins": [
+        IndexModel([("email", ASCENDING)], unique=True, name="email_unique"),
+    ],
+    "jobs": [
+        IndexModel([("job_id", ASCENDING)], unique=True, name="job_id_unique"),
+        # What workers claim: due queued jobs and expired leases
+        IndexModel([("status", ASCENDING), ("run_at", ASCENDING)], name="status_run_at"),
+        IndexModel(
+            [("idempotency_key", ASCENDING)],
+            unique=True,
+            partialFilterExpression={"idempotency_key": {"$exists": True}},
+            name="idempotency_key_unique",
+        ),
+        # Finished jobs are kept a week for GET /api/jobs/{id}
+        IndexModel([("finished_at", ASCENDING)], expireAfterSeconds=7 * 24 * 3600, name="finished_at_ttl"),
+    ],
+    "image_variants": [
+        IndexModel([("hash", ASCENDING)], unique=True, name="hash_unique"),
+    ],
+}
+
+
+async def ensure_indexes(db) -> None:
+    """
+    Create each declared index on its own, so one failure (e.g. existing
+    duplicate emails blocking a unique index) doesn't stop the others or the boot.
+    """
+    for collection, indexes in INDEXES.items():
+        for index in indexes:
+            try:
+                await db[collection].create_indexes([index])
+            except OperationFailure as e:
+                logger.error("Could not create index %s.%s: %s", collection, index.document["name"], e)
+
+
+def _parse_iso(value: str) -> datetime:
+    parsed = datetime.fromisoformat(value)
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed
+
+
+async def migrate_string_dates(db, collection: str, fields) -> int:
+    """Convert ISO-string timestamps to BSON dates. Returns documents updated."""
+    updated = 0
+    for field in fields:
+        cursor = db[collection].find({field: {"$type": "string"}}, {"_id": 1, field: 1})
+        async for doc in cursor:
+            try:
+                value = _parse_iso(doc[field])
+            except ValueError:
+                logger.warning("Unparseable %s.%s on %s: %r", collection, field, doc["_id"], doc[field])
+                continue
+            await db[collection].update_one({"_id": doc["_id"]}, {"$set": {field: value}})
+            updated += 1
+    return updated
+
+
+# Timestamps that older code wrote as ISO strings
+DATE_FIELDS = {
+    "products": ("created_at", "updated_at"),
+    "users": ("created_at",),
+    "user_sessions": ("expires_at", "created_at"),
+}
+
+
+async def migrate_dates(db) -> None:
+    for collection, fields in DATE_FIELDS.items():
+        updated = await migrate_string_dates(db, collection, fields)
+        if updated:
+            logger.info("Converted %d %s timestamp(s) to BSON dates", updated, collection)
+
+
+async def migrate_versions(db) -> None:
+    """Products written before optimistic concurrency start at version 1."""
+    result = await db.products.update_many({"version": {"$exists": False}}, {"$set": {"version": 1}})
+    if result.modified_count:
+        logger.info("Set version on %d product(s)", result.modified_count)
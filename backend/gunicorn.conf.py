@@ -0,0 +1,44 @@
+"""
+Gunicorn settings for running the API as several uvicorn worker processes.
+
+    gunicorn -c gunicorn.conf.py server:app      (from backend/)
+
+The app is imported in each worker, not in the master (no preload), and
+server.py opens its Mongo client, caches and HTTP clients in the startup
+event, so nothing is shared across the fork. Workers keep their caches in
+step through cache_sync.py.
+
+WEB_CONCURRENCY sets the number of workers ("auto": one per available core).
+It is exported to the workers, which size their Mongo pools from it.
+
+On deploy, SIGTERM (or SIGHUP for an in-place reload) lets each worker finish
+its in-flight requests for up to GRACEFUL_TIMEOUT seconds before it exits.
+"""
+
+import os
+
+
+def _worker_count() -> int:
+    raw = os.environ.get("WEB_CONCURRENCY", "1").strip().lower()
+    if raw == "auto":
+        # Respects CPU affinity/cgroup pinning, unlike os.cpu_count()
+        return max(1, len(os.sched_getaffinity(0)))
+    return max(1, int(raw))
+
+
+workers = _worker_count()
+os.environ["WEB_CONCURRENCY"] = str(workers)
+
+worker_class = "uvicorn.workers.UvicornWorker"
+bind = f"0.0.0.0:{os.environ.get('PORT', '8001')}"
+preload_app = False
+
+graceful_timeout = int(os.environ.get("GRACEFUL_TIMEOUT", "30"))
+timeout = int(os.environ.get("WORKER_TIMEOUT", "60"))
+keepalive = int(os.environ.get("KEEPALIVE_TIMEOUT", "5"))
+
+# Same as uvicorn's --proxy-headers --forwarded-allow-ips="*" behind Render's proxy
+forwarded_allow_ips = "*"
+
+accesslog = "-"
+errorlog = "-"
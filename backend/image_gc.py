@@ -0,0 +1,174 @@
+"""
+Mark-and-sweep collection of images no product uses any more, and storage
+accounting for the blob store.
+
+Mark: the originals referenced by products' `images`, plus the derivatives
+listed in their image_variants manifests. Sweep: every stored blob outside
+that set whose last store is older than the grace period is deleted. The
+grace period protects uploads whose product hasn't been saved yet; storing
+an existing blob again restarts its clock. Candidates are re-marked right
+before deletion, so a product saved during the sweep keeps its images, and
+each delete re-checks the age in the store itself, so a blob uploaded again
+mid-sweep survives too.
+
+Both passes read in batches and yield to the event loop between them, so a
+run (normally as a background job) never holds up requests.
+"""
+
+import asyncio
+import logging
+import os
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Set
+
+from image_store import digest_from_url
+from metrics import image_gc_reclaimed
+
+logger = logging.getLogger(__name__)
+
+GRACE_PERIOD = float(os.environ.get("IMAGE_GC_GRACE", str(24 * 3600)))
+BATCH_SIZE = int(os.environ.get("IMAGE_GC_BATCH", "200"))
+
+
+@dataclass
+class LiveSet:
+    # product_id -> originals it references
+    products: Dict[str, Set[str]] = field(default_factory=dict)
+    # original -> its derivatives
+    derivatives: Dict[str, List[str]] = field(default_factory=dict)
+
+    @property
+    def digests(self) -> Set[str]:
+        live = set(self.derivatives)
+        for originals in self.products.values():
+            live |= originals
+        for variants in self.derivatives.values():
+            live.update(variants)
+        return live
+
+
+async def mark(db, batch_size: int = BATCH_SIZE) -> LiveSet:
+    live = LiveSet()
+    async for product in db.products.find({}, {"_id": 0, "product_id": 1, "images": 1}).batch_size(batch_size):
+        digests = {digest_from_url(url) for url in product.get("images") or []}
+        digests.discard(None)
+        live.products[product["product_id"]] = digests
+
+    originals = list(set().union(*live.products.values()))
+    for start in range(0, len(originals), batch_size):
+        batch = originals[start:start + batch_size]
+        async for manifest in db.image_variants.find({"hash": {"$in": batch}}, {"_id": 0, "hash": 1, "variants": 1}):
+            live.derivatives[manifest["hash"]] = [v["hash"] for v in manifest.get("variants", [])]
+        await asyncio.sleep(0)
+    return live
+
+
+@dataclass
+class SweepResult:
+    scanned: int = 0
+    deleted: int = 0
+    reclaimed_bytes: int = 0
+    manifests_deleted: int = 0
+
+    def as_dict(self) -> dict:
+        return {
+            "scanned": self.scanned,
+            "deleted": self.deleted,
+            "reclaimed_bytes": self.reclaimed_bytes,
+            "manifests_deleted": self.manifests_deleted,
+        }
+
+
+async def sweep(
+    db,
+    store,
+    grace: float = GRACE_PERIOD,
+    batch_size: int = BATCH_SIZE,
+    dry_run: bool = False,
+    progress=None,
+) -> SweepResult:
+    """Delete unreferenced blobs stored more than `grace` seconds ago. progress(scanned) is awaited per batch."""
+    result = SweepResult()
+    cutoff = datetime.now(timezone.utc) - timedelta(seconds=grace)
+    live = (await mark(db, batch_size)).digests
+
+    candidates: Dict[str, int] = {}
+    async for blob in store.iter_blobs():
+        result.scanned += 1
+        if blob.digest not in live and blob.stored_at < cutoff:
+            candidates[blob.digest] = blob.size
+        if result.scanned % batch_size == 0:
+            if progress:
+                await progress(result.scanned)
+            await asyncio.sleep(0)
+
+    if candidates:
+        # Anything referenced since the first mark stays
+        live = (await mark(db, batch_size)).digests
+    doomed = [digest for digest in candidates if digest not in live]
+    if dry_run:
+        result.deleted = len(doomed)
+        result.reclaimed_bytes = sum(candidates[d] for d in doomed)
+        return result
+
+    for start in range(0, len(doomed), batch_size):
+        removed = []
+        for digest in doomed[start:start + batch_size]:
+            # Stored again since the scan (and maybe saved on a product
+            # already): the store keeps it
+            if await store.delete(digest, older_than=cutoff):
+                removed.append(digest)
+                result.reclaimed_bytes += candidates[digest]
+        result.deleted += len(removed)
+        if removed:
+            # A manifest is only useful while its original exists
+            deleted = await db.image_variants.delete_many({"hash": {"$in": removed}})
+            result.manifests_deleted += deleted.deleted_count
+        await asyncio.sleep(0)
+
+    image_gc_reclaimed.inc(result.reclaimed_bytes)
+    logger.info("Image GC: %s", result.as_dict())
+    return result
+
+
+async def storage_report(db, store, grace: float = GRACE_PERIOD, limit: Optional[int] = 50) -> dict:
+    """
+    Bytes stored, bytes per product (its originals plus their derivatives;
+    an image shared by two products counts for both) and what a sweep would
+    reclaim now or once the grace period has passed.
+    """
+    cutoff = datetime.now(timezone.utc) - timedelta(seconds=grace)
+    live = await mark(db)
+    live_digests = live.digests
+
+    sizes: Dict[str, int] = {}
+    totals = {"blobs": 0, "bytes": 0, "referenced_bytes": 0, "reclaimable_bytes": 0, "in_grace_bytes": 0}
+    async for blob in store.iter_blobs():
+        sizes[blob.digest] = blob.size
+        totals["blobs"] += 1
+        totals["bytes"] += blob.size
+        if blob.digest in live_digests:
+            totals["referenced_bytes"] += blob.size
+        elif blob.stored_at < cutoff:
+            totals["reclaimable_bytes"] += blob.size
+        else:
+            totals["in_grace_bytes"] += blob.size
+        if totals["blobs"] % BATCH_SIZE == 0:
+            await asyncio.sleep(0)
+
+    products = []
+    for product_id, originals in live.products.items():
+        digests = set(originals)
+        for original in originals:
+            digests.update(live.derivatives.get(original, ()))
+        products.append({
+            "product_id": product_id,
+            "images": len(originals),
+            "bytes": sum(sizes.get(d, 0) for d in digests),
+            # Referenced but not in the store
+            "missing": sorted(d for d in originals if d not in sizes),
+        })
+    products.sort(key=lambda p: p["bytes"], reverse=True)
+
+    return {**totals, "grace_seconds": grace, "products": products[:limit] if limit else products}
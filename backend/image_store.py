@@ -0,0 +1,350 @@
+"""
+Content-addressed storage for uploaded product images.
+
+Blobs are keyed by the SHA-256 hex digest of their bytes, so the same photo
+uploaded twice is stored once and a digest never points at different content.
+"""
+
+import asyncio
+import base64
+import binascii
+import hashlib
+import os
+import re
+import tempfile
+import uuid
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import AsyncIterator, Optional, Tuple
+
+CHUNK_SIZE = 64 * 1024
+
+_DIGEST_RE = re.compile(r"^[0-9a-f]{64}$")
+_IMAGE_URL_RE = re.compile(r"/api/images/([0-9a-f]{64})$")
+
+# Magic-byte signatures of the image formats we accept/serve
+_IMAGE_SIGNATURES = (
+    (b"\xff\xd8\xff", "image/jpeg"),
+    (b"\x89PNG\r\n\x1a\n", "image/png"),
+    (b"GIF87a", "image/gif"),
+    (b"GIF89a", "image/gif"),
+)
+
+
+def is_valid_digest(digest: str) -> bool:
+    return bool(_DIGEST_RE.match(digest or ""))
+
+
+def digest_from_url(url: str) -> Optional[str]:
+    """Extract the digest from an /api/images/<digest> URL, None for foreign URLs."""
+    match = _IMAGE_URL_RE.search(url or "")
+    return match.group(1) if match else None
+
+
+def sniff_image_type(head: bytes) -> Optional[str]:
+    """Return the image MIME type for the leading bytes of a file, if known."""
+    for signature, content_type in _IMAGE_SIGNATURES:
+        if head.startswith(signature):
+            return content_type
+    if len(head) >= 12 and head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "image/webp"
+    return None
+
+
+def decode_data_uri(uri: str) -> Optional[bytes]:
+    """
+    Decode a base64 data: URI. Returns None for anything that isn't one,
+    raises ValueError when the payload is malformed.
+    """
+    header, sep, payload = uri.partition(",")
+    if not sep or not header.startswith("data:") or not header.endswith(";base64"):
+        return None
+    try:
+        return base64.b64decode(payload, validate=True)
+    except binascii.Error as e:
+        raise ValueError(f"Invalid base64 image data: {e}") from e
+
+
+@dataclass
+class StoredBlob:
+    digest: str
+    size: int
+    content_type: str
+    chunks: AsyncIterator[bytes]
+
+
+@dataclass
+class BlobInfo:
+    digest: str
+    size: int
+    # Last time these bytes were stored; putting an existing blob refreshes it
+    stored_at: datetime
+
+
+class BlobStore:
+    """Interface shared by the storage backends."""
+
+    # Where uploads are spooled before put_file(); None means the system temp dir
+    spool_dir: Optional[Path] = None
+
+    async def put(self, data: bytes) -> str:
+        raise NotImplementedError
+
+    async def put_file(self, path: Path, digest: str) -> str:
+        """Take ownership of an already-hashed file; it is moved or deleted."""
+        raise NotImplementedError
+
+    async def open(self, digest: str) -> Optional[StoredBlob]:
+        raise NotImplementedError
+
+    async def exists(self, digest: str) -> bool:
+        raise NotImplementedError
+
+    async def delete(self, digest: str, older_than: Optional[datetime] = None) -> bool:
+        """
+        Remove a blob; True if it was removed. With older_than, only a blob
+        last stored before then is, decided atomically with the removal, so
+        a concurrent put of the same bytes always wins.
+        """
+        raise NotImplementedError
+
+    def iter_blobs(self) -> AsyncIterator[BlobInfo]:
+        """Every stored blob, in no particular order."""
+        raise NotImplementedError
+
+
+class LocalBlobStore(BlobStore):
+    """Stores blobs on local disk as <root>/<aa>/<bb>/<digest>."""
+
+    def __init__(self, root: Path):
+        self.root = Path(root)
+        # Same filesystem as the blobs so put_file() is a rename
+        self.spool_dir = self.root / ".incoming"
+
+    def _path(self, digest: str) -> Path:
+        return self.root / digest[:2] / digest[2:4] / digest
+
+    def _refresh(self, path: Path) -> bool:
+        """Mark an existing blob as just stored; False if there is none (any more)."""
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            return False
+        return True
+
+    def _write(self, digest: str, data: bytes) -> None:
+        path = self._path(digest)
+        if self._refresh(path):
+            return
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # Write to a unique temp name first so readers never see a partial
+        # blob and concurrent puts of the same digest don't collide
+        fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=f".{digest}.", suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as out:
+                out.write(data)
+            os.replace(tmp, path)
+        except BaseException:
+            Path(tmp).unlink(missing_ok=True)
+            raise
+
+    async def put(self, data: bytes) -> str:
+        digest = hashlib.sha256(data).hexdigest()
+        await asyncio.to_thread(self._write, digest, data)
+        return digest
+
+    def _move(self, source: Path, digest: str) -> None:
+        path = self._path(digest)
+        if self._refresh(path):
+            source.unlink(missing_ok=True)
+            return
+        path.parent.mkdir(parents=True, exist_ok=True)
+        os.replace(source, path)
+
+    async def put_file(self, path: Path, digest: str) -> str:
+        await asyncio.to_thread(self._move, Path(path), digest)
+        return digest
+
+    def _head(self, path: Path) -> Tuple[int, bytes]:
+        with path.open("rb") as fh:
+            return os.fstat(fh.fileno()).st_size, fh.read(16)
+
+    async def open(self, digest: str) -> Optional[StoredBlob]:
+        path = self._path(digest)
+        try:
+            size, head = await asyncio.to_thread(self._head, path)
+        except FileNotFoundError:
+            return None
+
+        async def chunks() -> AsyncIterator[bytes]:
+            fh = await asyncio.to_thread(path.open, "rb")
+            try:
+                while True:
+                    chunk = await asyncio.to_thread(fh.read, CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    yield chunk
+            finally:
+                fh.close()
+
+        return StoredBlob(
+            digest=digest,
+            size=size,
+            content_type=sniff_image_type(head) or "application/octet-stream",
+            chunks=chunks(),
+        )
+
+    async def exists(self, digest: str) -> bool:
+        return await asyncio.to_thread(self._path(digest).exists)
+
+    def _delete(self, digest: str, older_than: Optional[datetime]) -> bool:
+        path = self._path(digest)
+        if older_than is None:
+            try:
+                path.unlink()
+            except FileNotFoundError:
+                return False
+            return True
+        # Move it aside before looking at its age: a put that refreshed it
+        # first shows in the mtime, one that comes later finds no blob and
+        # writes a new one
+        doomed = path.with_name(f".{digest}.{os.getpid()}.{uuid.uuid4().hex[:8]}.gc")
+        try:
+            os.rename(path, doomed)
+        except FileNotFoundError:
+            return False
+        if datetime.fromtimestamp(doomed.stat().st_mtime, timezone.utc) >= older_than:
+            # Same digest, same bytes: fine to land on a copy put just wrote
+            os.replace(doomed, path)
+            return False
+        doomed.unlink()
+        return True
+
+    async def delete(self, digest: str, older_than: Optional[datetime] = None) -> bool:
+        return await asyncio.to_thread(self._delete, digest, older_than)
+
+    def _scan(self, shard: Path) -> list:
+        found = []
+        for path in shard.glob("*/*"):
+            if is_valid_digest(path.name):
+                try:
+                    stat = path.stat()
+                except FileNotFoundError:
+                    continue
+                found.append(BlobInfo(path.name, stat.st_size, datetime.fromtimestamp(stat.st_mtime, timezone.utc)))
+        return found
+
+    async def iter_blobs(self) -> AsyncIterator[BlobInfo]:
+        if not self.root.is_dir():
+            return
+        # One <aa> shard per thread hop, so a big store never stalls the loop
+        for shard in sorted(self.root.iterdir()):
+            if len(shard.name) == 2 and shard.is_dir():
+                for blob in await asyncio.to_thread(self._scan, shard):
+                    yield blob
+
+
+class GridFSBlobStore(BlobStore):
+    """Stores blobs in a GridFS bucket, using the digest as the filename."""
+
+    def __init__(self, database, bucket_name: str = "images"):
+        from motor.motor_asyncio import AsyncIOMotorGridFSBucket
+
+        self.bucket = AsyncIOMotorGridFSBucket(database, bucket_name=bucket_name)
+        self.files = database[f"{bucket_name}.files"]
+        self.chunks = database[f"{bucket_name}.chunks"]
+
+    async def put(self, data: bytes) -> str:
+        digest = hashlib.sha256(data).hexdigest()
+        if await self._touch(digest):
+            return digest
+        await self.bucket.upload_from_stream(
+            digest,
+            data,
+            chunk_size_bytes=255 * 1024,
+            metadata={"content_type": sniff_image_type(data[:16])},
+        )
+        return digest
+
+    async def put_file(self, path: Path, digest: str) -> str:
+        path = Path(path)
+        try:
+            if not await self._touch(digest):
+                with path.open("rb") as fh:
+                    head = fh.read(16)
+                    fh.seek(0)
+                    await self.bucket.upload_from_stream(
+                        digest,
+                        fh,
+                        chunk_size_bytes=255 * 1024,
+                        metadata={"content_type": sniff_image_type(head)},
+                    )
+        finally:
+            path.unlink(missing_ok=True)
+        return digest
+
+    async def open(self, digest: str) -> Optional[StoredBlob]:
+        from gridfs.errors import NoFile
+
+        try:
+            stream = await self.bucket.open_download_stream_by_name(digest)
+        except NoFile:
+            return None
+
+        async def chunks() -> AsyncIterator[bytes]:
+            while True:
+                chunk = await stream.readchunk()
+                if not chunk:
+                    break
+                yield chunk
+
+        metadata = stream.metadata or {}
+        return StoredBlob(
+            digest=digest,
+            size=stream.length,
+            content_type=metadata.get("content_type") or "application/octet-stream",
+            chunks=chunks(),
+        )
+
+    async def exists(self, digest: str) -> bool:
+        return await self.files.find_one({"filename": digest}, {"_id": 1}) is not None
+
+    async def _touch(self, digest: str) -> bool:
+        """Refresh an existing blob's uploadDate; False if there is none."""
+        result = await self.files.update_many(
+            {"filename": digest}, {"$set": {"uploadDate": datetime.now(timezone.utc)}}
+        )
+        return result.matched_count > 0
+
+    async def delete(self, digest: str, older_than: Optional[datetime] = None) -> bool:
+        query = {"filename": digest}
+        if older_than is not None:
+            # Checked in the same write that removes the file document, so a
+            # _touch() that lands first keeps the blob
+            query["uploadDate"] = {"$lt": older_than}
+        deleted = False
+        while True:
+            doc = await self.files.find_one_and_delete(query, {"_id": 1})
+            if doc is None:
+                return deleted
+            await self.chunks.delete_many({"files_id": doc["_id"]})
+            deleted = True
+
+    async def iter_blobs(self) -> AsyncIterator[BlobInfo]:
+        async for doc in self.files.find({}, {"_id": 0, "filename": 1, "length": 1, "uploadDate": 1}):
+            if is_valid_digest(doc.get("filename", "")):
+                yield BlobInfo(doc["filename"], doc["length"], doc["uploadDate"].replace(tzinfo=timezone.utc))
+
+
+def create_blob_store(database, root_dir: Path) -> BlobStore:
+    """
+    Pick the backend from env IMAGE_STORE ("local" or "gridfs").
+    Local blobs live under IMAGE_STORE_DIR (default: backend/uploads).
+    """
+    backend = os.environ.get("IMAGE_STORE", "local").strip().lower()
+    if backend == "gridfs":
+        return GridFSBlobStore(database)
+    if backend != "local":
+        raise ValueError(f"Unknown IMAGE_STORE backend: {backend}")
+    return LocalBlobStore(Path(os.environ.get("IMAGE_STORE_DIR", root_dir / "uploads")))
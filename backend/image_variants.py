@@ -0,0 +1,147 @@
+"""
+Responsive derivatives for uploaded images.
+
+Every upload is resized to a fixed set of widths, each encoded as WebP with a
+JPEG fallback. Encoding is CPU-bound, so it runs in a process pool and never
+on the event loop. Pillow is only imported there, keeping it out of the
+API process's startup.
+"""
+
+import asyncio
+import io
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, List, Optional, Tuple, Union
+
+# Job kind that renders them for an already stored original (handler in server.py)
+IMAGE_VARIANTS_JOB = "image_variants"
+
+VARIANT_WIDTHS: Tuple[int, ...] = (320, 640, 1280)
+VARIANT_FORMATS: Tuple[str, ...] = ("webp", "jpeg")
+
+_ENCODE_OPTIONS = {
+    "webp": {"format": "WEBP", "quality": 80, "method": 4},
+    "jpeg": {"format": "JPEG", "quality": 82, "optimize": True, "progressive": True},
+}
+
+# Largest source we decode. 24 MP is ~96 MB as RGBA, which a 512 MB
+# instance can afford; Pillow's own bomb check only trips at ~179 MP.
+MAX_SOURCE_PIXELS = int(os.environ.get("IMAGE_MAX_PIXELS", str(24_000_000)))
+
+_EXIF_ORIENTATION = 0x0112
+
+_pool: Optional[ProcessPoolExecutor] = None
+
+
+def _target_widths(width: int) -> List[int]:
+    # Never upscale; tiny originals still get one re-encoded variant
+    widths = [w for w in VARIANT_WIDTHS if w <= width]
+    return widths or [width]
+
+
+def render_variants(source: Union[bytes, str]) -> dict:
+    """
+    Decode an image (raw bytes or a file path) and encode every width/format
+    combination. Runs inside a worker process, so it only takes and returns
+    plain data. Raises ValueError when the input is not a decodable image.
+    """
+    from PIL import Image
+
+    # Over this Pillow warns, over twice this it raises DecompressionBombError
+    Image.MAX_IMAGE_PIXELS = MAX_SOURCE_PIXELS
+    try:
+        return _render_variants(source)
+    except (OSError, Image.DecompressionBombError) as e:
+        raise ValueError(f"Invalid image file: {e}") from None
+
+
+def _render_variants(source: Union[bytes, str]) -> dict:
+    from PIL import Image, ImageOps
+
+    fp = io.BytesIO(source) if isinstance(source, bytes) else source
+    with Image.open(fp) as original:
+        # Only the header has been read so far
+        if original.width * original.height > MAX_SOURCE_PIXELS:
+            raise ValueError(f"Image exceeds {MAX_SOURCE_PIXELS} pixels")
+        full_size = original.size
+        if original.getexif().get(_EXIF_ORIENTATION, 1) in (5, 6, 7, 8):
+            full_size = full_size[::-1]
+        # JPEGs can decode at 1/2, 1/4 or 1/8 scale. Keep both sides at least
+        # the largest variant width, whichever way EXIF rotates the image.
+        largest = max(VARIANT_WIDTHS)
+        original.draft("RGB", (largest, largest))
+        image = ImageOps.exif_transpose(original)
+        if image.mode not in ("RGB", "RGBA"):
+            image = image.convert("RGBA" if "A" in image.getbands() else "RGB")
+        width, height = full_size
+
+        # JPEG has no alpha channel, flatten onto white once
+        if image.mode == "RGBA":
+            flat = Image.new("RGB", image.size, (255, 255, 255))
+            flat.paste(image, mask=image.getchannel("A"))
+        else:
+            flat = image
+
+        variants = []
+        for target in _target_widths(width):
+            size = (target, max(1, round(height * target / width)))
+            for fmt in VARIANT_FORMATS:
+                source = image if fmt == "webp" else flat
+                resized = source if size == source.size else source.resize(size, Image.LANCZOS)
+                buf = io.BytesIO()
+                resized.save(buf, **_ENCODE_OPTIONS[fmt])
+                variants.append({"width": target, "format": fmt, "data": buf.getvalue()})
+
+    return {"width": width, "height": height, "variants": variants}
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        # Not fork: by now this process has Motor's threads, the event loop
+        # and open sockets, which a forked child would inherit mid-use
+        method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+        _pool = ProcessPoolExecutor(
+            max_workers=int(os.environ.get("IMAGE_WORKERS", "1")),
+            mp_context=multiprocessing.get_context(method),
+        )
+    return _pool
+
+
+async def generate_variants(source: Union[bytes, str]) -> dict:
+    """Pass a path for large inputs so the bytes aren't pickled to the worker."""
+    loop = asyncio.get_running_loop()
+    pool = _get_pool()
+    try:
+        return await loop.run_in_executor(pool, render_variants, source)
+    except BrokenProcessPool:
+        # A worker died (e.g. killed for memory); the pool is unusable from
+        # now on, so replace it and give this image one more try
+        _discard_pool(pool)
+        return await loop.run_in_executor(_get_pool(), render_variants, source)
+
+
+def _discard_pool(pool: ProcessPoolExecutor) -> None:
+    global _pool
+    if _pool is pool:
+        _pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def shutdown_pool() -> None:
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+
+def build_srcsets(variants: List[dict], url_for_digest) -> Dict[str, str]:
+    """Turn stored variant records into {"webp": "<url> 320w, ...", "jpeg": ...}."""
+    srcsets: Dict[str, List[str]] = {}
+    for variant in sorted(variants, key=lambda v: v["width"]):
+        srcsets.setdefault(variant["format"], []).append(
+            f"{url_for_digest(variant['hash'])} {variant['width']}w"
+        )
+    return {fmt: ", ".join(entries) for fmt, entries in srcsets.items()}
@@ -0,0 +1,319 @@
+"""
+Background jobs for slow admin work, kept in the Mongo `jobs` collection.
+
+enqueue() stores a job and returns at once; worker coroutines in every API
+process claim due jobs with an atomic findAndModify, so each job runs once
+whichever worker or instance picks it up. A claim is a lease: a job whose
+worker died is picked up again once the lease runs out. Failed attempts are
+retried with jittered exponential backoff, up to max_attempts; raise JobFailed
+for errors a retry can't fix. CPU-heavy handlers still hand their work to a
+process pool (image_variants.py), so the event loop stays free for the
+catalog.
+
+An idempotency key makes enqueue() return the existing job for that key
+instead of adding another. every() uses that for periodic jobs: each worker
+tries to enqueue one per interval, and only the first attempt sticks. A job
+that fails for good gives its key up, so enqueueing it again starts afresh.
+"""
+
+import asyncio
+import logging
+import os
+import random
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError, PyMongoError
+
+logger = logging.getLogger(__name__)
+
+JOBS_COLLECTION = "jobs"
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+
+# Frees the key of a job that failed for good, so the work can be requested again
+_RELEASE_KEY = {"idempotency_key": ""}
+
+# What GET /api/jobs/{id} shows
+PUBLIC_FIELDS = {
+    "_id": 0,
+    "job_id": 1,
+    "kind": 1,
+    "status": 1,
+    "progress": 1,
+    "result": 1,
+    "error": 1,
+    "attempts": 1,
+    "max_attempts": 1,
+    "created_at": 1,
+    "started_at": 1,
+    "finished_at": 1,
+}
+
+
+class JobFailed(Exception):
+    """Permanent failure: the job is marked failed without further attempts."""
+
+
+class UnknownJobKind(ValueError):
+    pass
+
+
+class Job:
+    """What a handler gets: its params, and a way to report progress."""
+
+    def __init__(self, queue: "JobQueue", doc: dict):
+        self.queue = queue
+        self.job_id: str = doc["job_id"]
+        self.kind: str = doc["kind"]
+        self.params: Dict[str, Any] = doc.get("params") or {}
+        self.attempt: int = doc["attempts"]
+
+    async def progress(self, done: int, total: Optional[int] = None) -> None:
+        """Record progress; also renews the lease, so long jobs that report aren't claimed twice."""
+        now = _now()
+        await self.queue.db[JOBS_COLLECTION].update_one(
+            {"job_id": self.job_id, "status": RUNNING},
+            {"$set": {
+                "progress": {"done": done, "total": total},
+                "updated_at": now,
+                "lease_until": now + timedelta(seconds=self.queue.lease),
+            }},
+        )
+
+
+Handler = Callable[[Job], Awaitable[Optional[dict]]]
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+class JobQueue:
+    def __init__(
+        self,
+        db,
+        concurrency: int = 1,
+        poll_interval: float = 5.0,
+        lease: float = 300.0,
+        max_attempts: int = 3,
+        backoff_base: float = 5.0,
+    ):
+        self.db = db
+        self.concurrency = concurrency
+        self.poll_interval = poll_interval
+        self.lease = lease
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self.handlers: Dict[str, Optional[Handler]] = {}
+        self._wakeup = asyncio.Event()
+        self._tasks = []
+        self._schedules = []
+
+    def register(self, kind: str, handler: Optional[Handler] = None) -> None:
+        """Without a handler, `kind` may be enqueued here but only runs in processes that have one."""
+        self.handlers[kind] = handler
+
+    def every(self, kind: str, interval: float, params: Optional[dict] = None) -> None:
+        """Enqueue `kind` once per `interval` seconds across all workers. Call before start()."""
+        if interval > 0:
+            self._schedules.append((kind, interval, params))
+
+    async def _schedule(self, kind: str, interval: float, params: Optional[dict]) -> None:
+        while True:
+            slot = int(time.time() // interval)
+            try:
+                await self.enqueue(kind, params, idempotency_key=f"{kind}:every:{slot}")
+            except PyMongoError as e:
+                logger.warning("Could not schedule %s: %r", kind, e)
+            await asyncio.sleep((slot + 1) * interval - time.time())
+
+    async def enqueue(
+        self,
+        kind: str,
+        params: Optional[dict] = None,
+        idempotency_key: Optional[str] = None,
+        max_attempts: Optional[int] = None,
+        created_by: Optional[str] = None,
+        run_at: Optional[datetime] = None,
+    ) -> dict:
+        """
+        Store a job and return its public document (the existing one for a
+        known idempotency_key). It runs as soon as a worker is free, or not
+        before run_at.
+        """
+        if kind not in self.handlers:
+            raise UnknownJobKind(kind)
+        now = _now()
+        doc = {
+            "job_id": f"job_{uuid.uuid4().hex[:16]}",
+            "kind": kind,
+            "params": params or {},
+            "status": QUEUED,
+            "progress": None,
+            "attempts": 0,
+            "max_attempts": max_attempts or self.max_attempts,
+            "run_at": run_at or now,
+            "created_by": created_by,
+            "created_at": now,
+            "updated_at": now,
+        }
+        if idempotency_key:
+            doc["idempotency_key"] = idempotency_key
+            try:
+                existing = await self.db[JOBS_COLLECTION].find_one_and_update(
+                    {"idempotency_key": idempotency_key},
+                    {"$setOnInsert": doc},
+                    projection=PUBLIC_FIELDS,
+                    upsert=True,
+                    return_document=ReturnDocument.AFTER,
+                )
+            except DuplicateKeyError:
+                # Lost an upsert race on the unique key; the winner's job is the one
+                existing = await self.db[JOBS_COLLECTION].find_one(
+                    {"idempotency_key": idempotency_key}, PUBLIC_FIELDS
+                )
+            if existing["job_id"] == doc["job_id"]:
+                self._wakeup.set()
+            return existing
+
+        await self.db[JOBS_COLLECTION].insert_one(doc)
+        self._wakeup.set()
+        return {key: doc.get(key) for key in PUBLIC_FIELDS if key != "_id"}
+
+    async def get(self, job_id: str) -> Optional[dict]:
+        return await self.db[JOBS_COLLECTION].find_one({"job_id": job_id}, PUBLIC_FIELDS)
+
+    def start(self) -> None:
+        if self.db is None or self._tasks:
+            return
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.concurrency)]
+        self._tasks += [asyncio.create_task(self._schedule(*schedule)) for schedule in self._schedules]
+
+    async def aclose(self) -> None:
+        """Stop the workers and wait until they have; a job cut short is retried once its lease runs out."""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def _claim(self) -> Optional[dict]:
+        now = _now()
+        return await self.db[JOBS_COLLECTION].find_one_and_update(
+            {
+                "kind": {"$in": [kind for kind, handler in self.handlers.items() if handler]},
+                "$or": [
+                    {"status": QUEUED, "run_at": {"$lte": now}},
+                    # A worker that claimed it died or hung, with attempts left
+                    {
+                        "status": RUNNING,
+                        "lease_until": {"$lte": now},
+                        "$expr": {"$lt": ["$attempts", "$max_attempts"]},
+                    },
+                ],
+            },
+            {
+                "$set": {
+                    "status": RUNNING,
+                    "started_at": now,
+                    "updated_at": now,
+                    "lease_until": now + timedelta(seconds=self.lease),
+                },
+                "$inc": {"attempts": 1},
+            },
+            sort=[("run_at", 1)],
+            return_document=ReturnDocument.AFTER,
+        )
+
+    async def _reap(self) -> None:
+        """Fail jobs whose lease ran out on their last attempt, e.g. ones that keep killing their worker."""
+        now = _now()
+        result = await self.db[JOBS_COLLECTION].update_many(
+            {
+                "status": RUNNING,
+                "lease_until": {"$lte": now},
+                "$expr": {"$gte": ["$attempts", "$max_attempts"]},
+            },
+            {
+                "$set": {
+                    "status": FAILED,
+                    "error": "Lease expired on the last attempt (worker died or hung)",
+                    "finished_at": now,
+                    "updated_at": now,
+                },
+                "$unset": _RELEASE_KEY,
+            },
+        )
+        if result.modified_count:
+            logger.warning("Failed %d job(s) whose last attempt never finished", result.modified_count)
+
+    async def _worker(self) -> None:
+        while True:
+            try:
+                doc = await self._claim()
+                if doc is not None:
+                    await self._run(Job(self, doc), doc)
+                    continue
+                await self._reap()
+            except PyMongoError as e:
+                # Mongo unreachable: keep the worker alive and try again later
+                logger.warning("Job worker: %r", e)
+            except Exception:
+                logger.exception("Job worker error")
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _run(self, job: Job, doc: dict) -> None:
+        jobs = self.db[JOBS_COLLECTION]
+        try:
+            result = await self.handlers[job.kind](job)
+        except asyncio.CancelledError:
+            # Shutting down: let the lease expire and another worker retry it
+            raise
+        except Exception as e:
+            permanent = isinstance(e, JobFailed)
+            if permanent:
+                logger.warning("Job %s (%s) failed: %s", job.job_id, job.kind, e)
+            else:
+                logger.exception("Job %s (%s) attempt %d failed", job.job_id, job.kind, job.attempt)
+            update = {"error": str(e) or type(e).__name__, "updated_at": _now()}
+            if permanent or job.attempt >= doc["max_attempts"]:
+                update.update(status=FAILED, finished_at=_now())
+                await jobs.update_one({"job_id": job.job_id}, {"$set": update, "$unset": _RELEASE_KEY})
+            else:
+                # Full jitter, like the OAuth client's retries
+                delay = random.uniform(0, self.backoff_base * 2 ** job.attempt)
+                update.update(status=QUEUED, run_at=_now() + timedelta(seconds=delay))
+                await jobs.update_one({"job_id": job.job_id}, {"$set": update})
+            return
+
+        await jobs.update_one(
+            {"job_id": job.job_id},
+            {"$set": {
+                "status": SUCCEEDED,
+                "result": result,
+                "error": None,
+                "finished_at": _now(),
+                "updated_at": _now(),
+            }},
+        )
+
+
+def create_job_queue(db) -> JobQueue:
+    return JobQueue(
+        db,
+        concurrency=int(os.environ.get("JOB_WORKERS", "1")),
+        poll_interval=float(os.environ.get("JOB_POLL_INTERVAL", "5")),
+        lease=float(os.environ.get("JOB_LEASE", "300")),
+        max_attempts=int(os.environ.get("JOB_MAX_ATTEMPTS", "3")),
+        backoff_base=float(os.environ.get("JOB_BACKOFF", "5")),
+    )
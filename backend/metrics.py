@@ -0,0 +1,245 @@
+"""
+Request and MongoDB instrumentation, exposed in Prometheus text format.
+
+MetricsMiddleware times every request per route template, and
+MongoCommandListener (a pymongo command monitor) attributes Mongo round-trip
+time and returned documents to the request that issued them. Motor runs
+commands on executor threads with the caller's contextvars copied, so the
+current request's stats are reachable from the listener.
+"""
+
+import bisect
+import contextvars
+import os
+import threading
+import time
+from dataclasses import dataclass
+from typing import Dict, Optional, Sequence, Tuple
+
+from pymongo import monitoring
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+def _labels(**labels: str) -> Labels:
+    return tuple(sorted(labels.items()))
+
+
+def _format_labels(labels: Labels, extra: str = "") -> str:
+    parts = [f'{key}="{value}"' for key, value in labels]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class Counter:
+    def __init__(self, name: str, help_text: str):
+        self.name = name
+        self.help_text = help_text
+        self._values: Dict[Labels, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        key = _labels(**labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def render(self, const: Labels = ()) -> str:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        for labels, value in sorted(self._values.items()):
+            labels = tuple(sorted(labels + const))
+            lines.append(f"{self.name}{_format_labels(labels)} {value:g}")
+        return "\n".join(lines)
+
+
+class Histogram:
+    def __init__(self, name: str, help_text: str, buckets: Sequence[float]):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = tuple(buckets)
+        # labels -> [per-bucket counts..., +Inf count, sum]
+        self._values: Dict[Labels, list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = _labels(**labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._values.get(key)
+            if series is None:
+                series = self._values[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[index] += 1
+            series[-1] += value
+
+    def render(self, const: Labels = ()) -> str:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        for labels, series in sorted(self._values.items()):
+            labels = tuple(sorted(labels + const))
+            cumulative = 0
+            for bound, count in zip(self.buckets, series):
+                cumulative += count
+                bucket_labels = _format_labels(labels, 'le="%g"' % bound)
+                lines.append(f"{self.name}_bucket{bucket_labels} {cumulative}")
+            cumulative += series[len(self.buckets)]
+            bucket_labels = _format_labels(labels, 'le="+Inf"')
+            lines.append(f"{self.name}_bucket{bucket_labels} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(labels)} {series[-1]:g}")
+            lines.append(f"{self.name}_count{_format_labels(labels)} {cumulative}")
+        return "\n".join(lines)
+
+
+class Registry:
+    """const_labels are added to every series, e.g. which worker process it came from."""
+
+    def __init__(self, **const_labels: str):
+        self.const_labels = _labels(**const_labels)
+        self._metrics = []
+
+    def counter(self, name: str, help_text: str) -> Counter:
+        metric = Counter(name, help_text)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name: str, help_text: str, buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+        metric = Histogram(name, help_text, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        return "\n".join(metric.render(self.const_labels) for metric in self._metrics) + "\n"
+
+
+# Each worker process keeps its own counts and a scrape reaches one of them,
+# so with several workers series carry the worker's pid; sum them by the
+# other labels (e.g. sum without (worker)) to see the whole service.
+registry = Registry(**({"worker": str(os.getpid())} if int(os.environ.get("WEB_CONCURRENCY", "1")) > 1 else {}))
+
+http_requests = registry.counter("http_requests_total", "HTTP requests by route and status.")
+http_latency = registry.histogram("http_request_duration_seconds", "HTTP request latency.")
+http_response_size = registry.histogram(
+    "http_response_size_bytes", "HTTP response body size.", SIZE_BUCKETS
+)
+http_mongo_time = registry.histogram(
+    "http_request_mongo_seconds", "Time spent in MongoDB round-trips per request."
+)
+mongo_commands = registry.counter("mongo_commands_total", "MongoDB commands by name and outcome.")
+mongo_latency = registry.histogram("mongo_command_duration_seconds", "MongoDB command round-trip time.")
+mongo_documents = registry.counter("mongo_documents_returned_total", "Documents returned by MongoDB.")
+rate_limited = registry.counter(
+    "http_rate_limited_total", "Requests rejected with 429, by rule and reason."
+)
+image_gc_reclaimed = registry.counter(
+    "image_gc_reclaimed_bytes_total", "Bytes of unreferenced images deleted by the image collector."
+)
+cache_invalidations = registry.counter(
+    "cache_invalidations_total", "In-process cache invalidations from other writers, by cache and source."
+)
+
+
+@dataclass
+class RequestStats:
+    mongo_seconds: float = 0.0
+    mongo_commands: int = 0
+    mongo_documents: int = 0
+
+
+_current: contextvars.ContextVar[Optional[RequestStats]] = contextvars.ContextVar(
+    "request_stats", default=None
+)
+
+
+def _returned_documents(reply) -> int:
+    cursor = reply.get("cursor") if hasattr(reply, "get") else None
+    if isinstance(cursor, dict):
+        return len(cursor.get("firstBatch") or cursor.get("nextBatch") or ())
+    return 0
+
+
+class MongoCommandListener(monitoring.CommandListener):
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        seconds = event.duration_micros / 1e6
+        documents = _returned_documents(event.reply)
+        mongo_commands.inc(command=event.command_name, outcome="ok")
+        mongo_latency.observe(seconds, command=event.command_name)
+        if documents:
+            mongo_documents.inc(documents, command=event.command_name)
+        self._attribute(seconds, documents)
+
+    def failed(self, event):
+        seconds = event.duration_micros / 1e6
+        mongo_commands.inc(command=event.command_name, outcome="error")
+        mongo_latency.observe(seconds, command=event.command_name)
+        self._attribute(seconds, 0)
+
+    @staticmethod
+    def _attribute(seconds: float, documents: int) -> None:
+        stats = _current.get()
+        if stats is not None:
+            stats.mongo_seconds += seconds
+            stats.mongo_commands += 1
+            stats.mongo_documents += documents
+
+
+class MetricsMiddleware:
+    """
+    Pure ASGI middleware (so streamed bodies are measured too). With
+    server_timing=True it adds a Server-Timing header splitting each
+    request into its MongoDB share and the rest.
+    """
+
+    def __init__(self, app, server_timing: bool = False, skip_paths: Sequence[str] = ("/metrics",)):
+        self.app = app
+        self.server_timing = server_timing
+        self.skip_paths = frozenset(skip_paths)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] in self.skip_paths:
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestStats()
+        token = _current.set(stats)
+        start = time.perf_counter()
+        status = 500
+        size = 0
+
+        async def send_wrapper(message):
+            nonlocal status, size
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                if self.server_timing:
+                    total_ms = (time.perf_counter() - start) * 1000
+                    db_ms = stats.mongo_seconds * 1000
+                    timing = (
+                        f'db;dur={db_ms:.1f};desc="{stats.mongo_commands} queries", '
+                        f"app;dur={max(total_ms - db_ms, 0):.1f}"
+                    )
+                    # Timing-Allow-Origin lets devtools show it for the cross-origin frontend
+                    message = {**message, "headers": [
+                        *message.get("headers", []),
+                        (b"server-timing", timing.encode()),
+                        (b"timing-allow-origin", b"*"),
+                    ]}
+            elif message["type"] == "http.response.body":
+                size += len(message.get("body", b""))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _current.reset(token)
+            route = scope.get("route")
+            # Templates, not raw paths, keep label cardinality bounded
+            template = getattr(route, "path", None) or "<unmatched>"
+            method = scope["method"]
+            elapsed = time.perf_counter() - start
+            http_requests.inc(method=method, route=template, status=str(status))
+            http_latency.observe(elapsed, method=method, route=template)
+            http_response_size.observe(size, method=method, route=template)
+            http_mongo_time.observe(stats.mongo_seconds, method=method, route=template)
@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+One-off migration: move inline base64 images out of product documents
+and into the blob store, replacing them with /api/images/<hash> URLs.
+Each migrated product gets a new version (so cached copies and ETags
+move on), and each image a variants job that the API's job workers pick
+up to render its derivatives and add them to the products using it.
+
+Usage:
+    PUBLIC_BASE_URL=https://giovanna-depollo-api.onrender.com python migrate_images.py
+"""
+
+import asyncio
+import os
+from datetime import datetime, timezone
+from pathlib import Path
+
+from dotenv import load_dotenv
+from motor.motor_asyncio import AsyncIOMotorClient
+
+from cache_sync import VERSIONS_COLLECTION
+from image_store import create_blob_store, decode_data_uri
+from image_variants import IMAGE_VARIANTS_JOB
+from jobs import JobQueue
+
+ROOT_DIR = Path(__file__).parent
+load_dotenv(ROOT_DIR / ".env")
+
+
+async def migrate() -> None:
+    base_url = os.environ.get("PUBLIC_BASE_URL", "").strip().rstrip("/")
+    if not base_url:
+        raise SystemExit("PUBLIC_BASE_URL must be set to the public API origin")
+
+    client = AsyncIOMotorClient(os.environ["MONGO_URL"], tz_aware=True, tzinfo=timezone.utc)
+    db = client[os.environ["DB_NAME"]]
+    store = create_blob_store(db, ROOT_DIR)
+    queue = JobQueue(db)
+    # Rendered by the API's workers, not here
+    queue.register(IMAGE_VARIANTS_JOB)
+
+    migrated = 0
+    digests = set()
+    cursor = db.products.find(
+        {"images": {"$regex": "^data:"}},
+        {"_id": 0, "product_id": 1, "images": 1},
+    )
+    async for product in cursor:
+        images = []
+        for image in product["images"]:
+            try:
+                data = decode_data_uri(image)
+            except ValueError:
+                print(f"⚠️  {product['product_id']}: skipping undecodable image")
+                data = None
+            if data is None:
+                images.append(image)
+                continue
+            digest = await store.put(data)
+            digests.add(digest)
+            images.append(f"{base_url}/api/images/{digest}")
+
+        # Like update_product: a new version, so ETags and caches move on
+        await db.products.update_one(
+            {"product_id": product["product_id"]},
+            {"$set": {"images": images, "updated_at": datetime.now(timezone.utc)}, "$inc": {"version": 1}},
+        )
+        migrated += 1
+        print(f"✅ {product['product_id']}")
+
+    for digest in digests:
+        # Same key as a deferred upload, so an image already queued isn't rendered twice
+        await queue.enqueue(IMAGE_VARIANTS_JOB, {"hash": digest}, idempotency_key=f"{IMAGE_VARIANTS_JOB}:{digest}")
+    if migrated:
+        # Workers without a change stream only notice writes through this
+        await db[VERSIONS_COLLECTION].update_one({"_id": "catalog"}, {"$inc": {"version": 1}}, upsert=True)
+
+    client.close()
+    print(f"Migrated {migrated} product(s), queued variants for {len(digests)} image(s)")
+
+
+if __name__ == "__main__":
+    asyncio.run(migrate())
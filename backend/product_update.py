@@ -0,0 +1,74 @@
+"""
+Optimistic concurrency and array patch operations for product updates.
+
+Every product carries a `version` that each write increments. The detail
+endpoint folds it into the ETag, so a client echoes that ETag (or just
+"v<version>") in If-Match and a stale edit fails instead of overwriting.
+"""
+
+import re
+from typing import Dict, Iterable, List, Optional, Set
+
+from catalog_cache import make_etag
+
+ARRAY_FIELDS = ("images", "sizes", "colors")
+
+# Optionally suffixed with the content-coding it was sent with (e.g. -gzip)
+_VERSION_TAG = re.compile(r'^"v(\d+)(?:\.[0-9a-f]+)?(?:-[a-z]+)?"$')
+
+
+class ArrayOpError(ValueError):
+    pass
+
+
+def version_etag(version: int, body: bytes) -> str:
+    """`"v<version>.<content hash>"`: If-Match reads the version, If-None-Match the whole tag."""
+    content_hash = make_etag(body)[1:-1]
+    return f'"v{version}.{content_hash}"'
+
+
+def parse_if_match(if_match: Optional[str]) -> Optional[Set[int]]:
+    """
+    Versions an If-Match header accepts; None when any version will do
+    (no header, or "*"). Tags we didn't issue yield an empty set, which
+    no product matches.
+    """
+    if if_match is None or if_match.strip() == "*":
+        return None
+    versions = set()
+    for tag in if_match.split(","):
+        match = _VERSION_TAG.match(tag.strip().removeprefix("W/"))
+        if match:
+            versions.add(int(match.group(1)))
+    return versions
+
+
+def apply_array_ops(current: dict, ops: Iterable[dict]) -> Dict[str, List[str]]:
+    """
+    Apply add/remove/move operations to the product's array fields and
+    return the new value of each field touched.
+
+    add    inserts `value` at `index` (default: the end), unless already present
+    remove drops `value`; removing an absent value is a no-op
+    move   moves an existing `value` to `index`
+    """
+    result: Dict[str, List[str]] = {}
+    for op in ops:
+        field = op["field"]
+        values = result.setdefault(field, list(current.get(field) or []))
+        value = op["value"]
+        index = op.get("index")
+
+        if op["op"] == "add":
+            if value not in values:
+                values.insert(len(values) if index is None else index, value)
+        elif op["op"] == "remove":
+            values[:] = [v for v in values if v != value]
+        elif op["op"] == "move":
+            if value not in values:
+                raise ArrayOpError(f"{value!r} is not in {field}")
+            values.remove(value)
+            values.insert(len(values) if index is None else index, value)
+        else:
+            raise ArrayOpError(f"Unknown operation {op['op']!r}")
+    return result
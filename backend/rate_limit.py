@@ -0,0 +1,194 @@
+"""
+Per-client rate limits and concurrency caps for the expensive routes.
+
+Uploads, bulk imports and the OAuth exchange share one small worker with
+the public catalog. Each Rule gives a group of routes a token bucket per
+client (a known session token, else IP) and optionally a cap on requests in flight,
+so a burst on those routes can't starve catalog reads. Checks run in ASGI
+middleware, before the request body is read. Rejections are 429 with
+Retry-After.
+"""
+
+import asyncio
+import fnmatch
+import json
+import math
+import os
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Callable, Iterable, Optional, Sequence, Tuple
+
+from starlette.requests import HTTPConnection
+
+from metrics import rate_limited
+
+
+class TokenBucket:
+    """Holds up to `burst` tokens, refilled at `rate` tokens per second."""
+
+    __slots__ = ("rate", "burst", "tokens", "updated_at")
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated_at = time.monotonic()
+
+    def take(self) -> float:
+        """Spend a token. Returns 0 on success, else seconds until one is available."""
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+
+class RateLimiter:
+    """A token bucket per key, forgetting the least recently seen keys beyond max_keys."""
+
+    def __init__(self, requests: int, per_seconds: float, max_keys: int = 10000):
+        self.rate = requests / per_seconds
+        self.burst = requests
+        self.max_keys = max_keys
+        self._buckets: "OrderedDict[str, TokenBucket]" = OrderedDict()
+
+    def check(self, key: str) -> float:
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = TokenBucket(self.rate, self.burst)
+            if len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(key)
+        return bucket.take()
+
+
+@dataclass
+class Rule:
+    name: str
+    methods: Tuple[str, ...]
+    # Exact paths, or fnmatch patterns such as /api/products/*
+    paths: Tuple[str, ...]
+    limiter: Optional[RateLimiter] = None
+    concurrency: Optional[asyncio.Semaphore] = None
+    # How long a request may wait for a concurrency slot before a 429
+    queue_timeout: float = 10.0
+    # Key buckets by IP even when a token is sent; for routes callers
+    # aren't authenticated on yet, where made-up tokens would dodge the limit
+    by_ip: bool = False
+
+    def matches(self, method: str, path: str) -> bool:
+        return method in self.methods and any(fnmatch.fnmatchcase(path, p) for p in self.paths)
+
+
+def parse_rate(spec: str, workers: int = 1) -> Optional[RateLimiter]:
+    """
+    Parse "<requests>/<seconds>" (per client); an empty spec or "0" disables
+    the limit. The allowance is split across `workers` processes.
+    """
+    spec = spec.strip()
+    if not spec or spec == "0":
+        return None
+    requests, _, seconds = spec.partition("/")
+    return RateLimiter(math.ceil(int(requests) / workers), float(seconds or 1))
+
+
+def create_rule(
+    name: str,
+    methods: Sequence[str],
+    paths: Sequence[str],
+    rate: str = "",
+    concurrency: int = 0,
+    by_ip: bool = False,
+) -> Rule:
+    """
+    Defaults can be overridden with RATE_LIMIT_<NAME> and CONCURRENCY_<NAME>.
+    Both are for the whole service: each of the WEB_CONCURRENCY worker
+    processes enforces its share, rounded up.
+    """
+    env_name = name.upper()
+    workers = max(1, int(os.environ.get("WEB_CONCURRENCY", "1")))
+    limit = math.ceil(int(os.environ.get(f"CONCURRENCY_{env_name}", str(concurrency))) / workers)
+    return Rule(
+        name=name,
+        methods=tuple(methods),
+        paths=tuple(paths),
+        limiter=parse_rate(os.environ.get(f"RATE_LIMIT_{env_name}", rate), workers),
+        concurrency=asyncio.Semaphore(limit) if limit > 0 else None,
+        queue_timeout=float(os.environ.get("CONCURRENCY_QUEUE_TIMEOUT", "10")),
+        by_ip=by_ip,
+    )
+
+
+def client_key(scope, by_ip: bool = False, is_known_token: Optional[Callable[[str], bool]] = None) -> str:
+    """
+    The session token when there is one (unless by_ip), else the client
+    address. The middleware runs before authentication, so with
+    is_known_token only tokens it accepts get their own bucket: made-up
+    tokens share their IP's.
+    """
+    conn = HTTPConnection(scope)
+    token = None if by_ip else conn.cookies.get("session_token")
+    if not token and not by_ip:
+        auth_header = conn.headers.get("authorization", "")
+        if auth_header.startswith("Bearer "):
+            token = auth_header[len("Bearer "):]
+    if token and (is_known_token is None or is_known_token(token)):
+        return f"token:{token}"
+    return f"ip:{conn.client.host if conn.client else 'unknown'}"
+
+
+class RateLimitMiddleware:
+    """Applies the first matching Rule to each request; unmatched routes pass straight through."""
+
+    def __init__(self, app, rules: Iterable[Rule], is_known_token: Optional[Callable[[str], bool]] = None):
+        self.app = app
+        self.rules = list(rules)
+        self.is_known_token = is_known_token
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        rule = next((r for r in self.rules if r.matches(scope["method"], scope["path"])), None)
+        if rule is None:
+            await self.app(scope, receive, send)
+            return
+
+        if rule.limiter:
+            retry_after = rule.limiter.check(client_key(scope, rule.by_ip, self.is_known_token))
+            if retry_after:
+                rate_limited.inc(rule=rule.name, reason="rate")
+                await _reject(send, "Too many requests, slow down", retry_after)
+                return
+
+        if rule.concurrency is None:
+            await self.app(scope, receive, send)
+            return
+        try:
+            await asyncio.wait_for(rule.concurrency.acquire(), rule.queue_timeout)
+        except asyncio.TimeoutError:
+            rate_limited.inc(rule=rule.name, reason="concurrency")
+            await _reject(send, "Server busy, try again shortly", 1)
+            return
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            rule.concurrency.release()
+
+
+async def _reject(send, detail: str, retry_after: float) -> None:
+    body = json.dumps({"detail": detail}).encode()
+    await send({
+        "type": "http.response.start",
+        "status": 429,
+        "headers": [
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(body)).encode()),
+            (b"retry-after", str(max(1, math.ceil(retry_after))).encode()),
+        ],
+    })
+    await send({"type": "http.response.body", "body": body})
@@ -1,20 +1,72 @@
-from fastapi import FastAPI, APIRouter, HTTPException, UploadFile, File, Request, Response, Depends
+from fastapi import FastAPI, APIRouter, HTTPException, UploadFile, File, Request, Response, Depends, Query
+from fastapi.responses import ORJSONResponse, PlainTextResponse, StreamingResponse
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import InsertOne, ReturnDocument, UpdateOne
+from pymongo.errors import BulkWriteError, PyMongoError
 import os
+import asyncio
 import logging
+import time
 from pathlib import Path
-from pydantic import BaseModel, ConfigDict
-from typing import List, Optional, Set
+from pydantic import BaseModel, ConfigDict, Field, TypeAdapter
+from typing import Dict, List, Literal, Optional, Set
 import uuid
+import hashlib
+import orjson
 from datetime import datetime, timezone, timedelta
-import base64
-import httpx
+from email.utils import format_datetime, parsedate_to_datetime
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / ".env")
 
+# Local modules may read settings at import time, so load .env first
+from admin_policy import PRODUCTS_BULK, PRODUCTS_WRITE, STORAGE_MANAGE, create_policy_store
+from auth_provider import AuthProviderError, CircuitOpenError, create_auth_provider
+from bulk import BULK_BATCH_SIZE, LineTooLong, describe_error, iter_ndjson_lines, record_error
+from cache_sync import CacheSync, create_cache_sync
+from catalog_cache import CachedBody, create_catalog_cache, etag_matches
+from compression import MIN_SIZE as COMPRESSION_MIN_SIZE, CompressionMiddleware, choose_encoding, coded_etag
+from db_setup import ensure_indexes, migrate_dates, migrate_versions
+from session_cache import create_session_cache
+from snapshot import SnapshotTrigger, create_snapshot_trigger
+from catalog_query import (
+    DEFAULT_PAGE_SIZE,
+    DEFAULT_SEARCH_LIMIT,
+    MAX_PAGE_SIZE,
+    MAX_SEARCH_LIMIT,
+    SORT_ORDER,
+    build_filter,
+    build_projection,
+    build_search_pipeline,
+    decode_cursor,
+    encode_cursor,
+    parse_fields,
+    shape_facets,
+)
+from image_store import (
+    create_blob_store,
+    decode_data_uri,
+    digest_from_url,
+    is_valid_digest,
+    sniff_image_type,
+)
+from rate_limit import RateLimitMiddleware, create_rule
+from product_update import ArrayOpError, apply_array_ops, parse_if_match, version_etag
+from metrics import MetricsMiddleware, MongoCommandListener, registry as metrics_registry
+from jobs import JobFailed, JobQueue, create_job_queue
+from image_gc import storage_report, sweep
+from image_variants import IMAGE_VARIANTS_JOB, build_srcsets, generate_variants, shutdown_pool
+from uploads import (
+    MAX_UPLOAD_BYTES,
+    UnsupportedImageType,
+    UploadGuardMiddleware,
+    UploadTooLarge,
+    spool_chunks,
+    spool_upload,
+)
+
 # ----------------------------
 # Admin whitelist (ONLY THESE EMAILS CAN LOGIN)
 # ----------------------------
@@ -23,30 +75,81 @@ HARDCODED_ADMIN_EMAILS: Set[str] = {
     "gigidepollo123@gmail.com",
 }
 
-def _normalize_email(email: str) -> str:
-    return (email or "").strip().lower()
+# Compiled allowlist with roles. ADMIN_EMAILS="a@a.com,*@shop.com=editor"
+# overrides the hardcoded owners; see admin_policy.py for the Mongo source.
+admin_policy = create_policy_store(HARDCODED_ADMIN_EMAILS)
+
+# ----------------------------
+# MongoDB connection
+# ----------------------------
+# Created by connect_db() at startup, not at import, so importing this module
+# stays cheap and every worker process gets its own client
+client: Optional[AsyncIOMotorClient] = None
+db = None
+
+# Uploaded images live in a content-addressed blob store, products only keep URLs
+image_store = None
+IMAGE_CACHE_CONTROL = "public, max-age=31536000, immutable"
 
-def get_admin_emails() -> Set[str]:
+def mongo_pool_size() -> int:
     """
-    You can optionally override via env ADMIN_EMAILS="a@a.com,b@b.com"
-    If not set, uses the hardcoded list above.
+    MONGO_MAX_POOL_SIZE if set, else MONGO_POOL_BUDGET (connections for the
+    whole service) split across the WEB_CONCURRENCY worker processes.
     """
-    raw = os.environ.get("ADMIN_EMAILS", "").strip()
-    if raw:
-        return { _normalize_email(e) for e in raw.split(",") if _normalize_email(e) }
-    return { _normalize_email(e) for e in HARDCODED_ADMIN_EMAILS }
+    explicit = os.environ.get("MONGO_MAX_POOL_SIZE", "").strip()
+    if explicit:
+        return int(explicit)
+    workers = max(1, int(os.environ.get("WEB_CONCURRENCY", "1")))
+    budget = int(os.environ.get("MONGO_POOL_BUDGET", "100"))
+    return max(WARMUP_CONNECTIONS, budget // workers)
 
-def is_admin_email(email: str) -> bool:
-    return _normalize_email(email) in get_admin_emails()
+def connect_db() -> None:
+    """Create the Mongo client and what hangs off it, unless db was preset (tests, benchmarks)."""
+    global client, db, image_store, snapshot_trigger, cache_sync, job_queue
+    if db is None:
+        # Timestamps are stored as BSON dates and decoded as tz-aware UTC datetimes
+        client = AsyncIOMotorClient(
+            os.environ["MONGO_URL"],
+            tz_aware=True,
+            tzinfo=timezone.utc,
+            maxPoolSize=mongo_pool_size(),
+            event_listeners=[MongoCommandListener()],
+        )
+        db = client[os.environ["DB_NAME"]]
+    image_store = create_blob_store(db, ROOT_DIR)
+    snapshot_trigger = create_snapshot_trigger(db, image_store)
+    cache_sync = create_cache_sync(db, catalog_cache, session_cache, schedule_snapshot)
+    job_queue = create_job_queue(db)
+    job_queue.register(IMAGE_VARIANTS_JOB, run_image_variants_job)
+    job_queue.register(IMAGE_GC_JOB, run_image_gc_job)
+    job_queue.register(SNAPSHOT_JOB, run_snapshot_job)
+    job_queue.every(IMAGE_GC_JOB, IMAGE_GC_INTERVAL)
 
-# ----------------------------
-# MongoDB connection
-# ----------------------------
-mongo_url = os.environ["MONGO_URL"]
-client = AsyncIOMotorClient(mongo_url)
-db = client[os.environ["DB_NAME"]]
+# Shared, pooled client for the OAuth session exchange (opened on first login)
+auth_provider = create_auth_provider()
+
+# Resolved sessions, so authenticated requests usually skip Mongo
+session_cache = create_session_cache()
+
+# Serialized catalog responses; admin product writes invalidate it
+catalog_cache = create_catalog_cache()
+
+# Static catalog copy for the CDN, rebuilt after admin writes when configured
+snapshot_trigger = SnapshotTrigger(None)
+
+# Carries cache invalidations between workers (and from writes made outside the API)
+cache_sync = CacheSync(None, catalog_cache, session_cache)
+
+# Slow admin work (image derivatives) that can run after the response
+job_queue = JobQueue(None)
 
-app = FastAPI()
+# Browser/CDN caching of catalog responses. The default makes clients
+# revalidate every time (cheap with ETags); e.g. "public, s-maxage=60" lets
+# a CDN absorb anonymous traffic.
+PRODUCTS_CACHE_CONTROL = os.environ.get("PRODUCTS_CACHE_CONTROL", "public, no-cache")
+PRODUCT_CACHE_CONTROL = os.environ.get("PRODUCT_CACHE_CONTROL", "public, no-cache")
+
+app = FastAPI(default_response_class=ORJSONResponse)
 api_router = APIRouter(prefix="/api")
 
 # ----------------------------
@@ -76,8 +179,46 @@ class Product(BaseModel):
     sizes: List[str]
     colors: List[str]
     images: List[str]
+    # image URL -> {"webp": srcset, "jpeg": srcset} for images we host
+    image_variants: Dict[str, Dict[str, str]] = {}
     created_at: datetime
     updated_at: datetime
+    # Bumped by every write; see product_update.py
+    version: int = 1
+
+PRODUCT_LIST = TypeAdapter(List[Product])
+
+def encode_products(products: List[dict], validate: bool = True) -> bytes:
+    """
+    Encode product documents to JSON bytes in one pass. Full documents are
+    validated and dumped by pydantic-core; partial (projected) ones can't be
+    validated as Product and go straight to orjson.
+    """
+    if validate:
+        return PRODUCT_LIST.dump_json(PRODUCT_LIST.validate_python(products))
+    return orjson.dumps(products, option=orjson.OPT_UTC_Z)
+
+class FacetCount(BaseModel):
+    value: str
+    count: int
+
+class PriceBucket(BaseModel):
+    min: float
+    max: Optional[float] = None
+    count: int
+
+class SearchFacets(BaseModel):
+    sizes: List[FacetCount]
+    colors: List[FacetCount]
+    price: List[PriceBucket]
+
+class ProductSearchResult(Product):
+    score: float
+
+class ProductSearchResponse(BaseModel):
+    results: List[ProductSearchResult]
+    total: int
+    facets: SearchFacets
 
 class ProductCreate(BaseModel):
     name: str
@@ -87,6 +228,16 @@ class ProductCreate(BaseModel):
     colors: List[str]
     images: List[str]
 
+class ProductImport(ProductCreate):
+    # Lines carrying a product_id upsert that product; the rest are created
+    product_id: Optional[str] = None
+
+class ArrayOp(BaseModel):
+    op: Literal["add", "remove", "move"]
+    field: Literal["images", "sizes", "colors"]
+    value: str
+    index: Optional[int] = Field(None, ge=0)
+
 class ProductUpdate(BaseModel):
     name: Optional[str] = None
     description: Optional[str] = None
@@ -94,6 +245,8 @@ class ProductUpdate(BaseModel):
     sizes: Optional[List[str]] = None
     colors: Optional[List[str]] = None
     images: Optional[List[str]] = None
+    # Edit single array elements instead of resending the whole array
+    ops: Optional[List[ArrayOp]] = None
 
 class SessionCreate(BaseModel):
     session_id: str
@@ -101,7 +254,7 @@ class SessionCreate(BaseModel):
 # ----------------------------
 # Auth helpers
 # ----------------------------
-async def get_current_user(request: Request) -> Optional[User]:
+def get_session_token(request: Request) -> Optional[str]:
     # Check cookie first, then Authorization header
     session_token = request.cookies.get("session_token")
 
@@ -110,40 +263,46 @@ async def get_current_user(request: Request) -> Optional[User]:
         if auth_header and auth_header.startswith("Bearer "):
             session_token = auth_header.replace("Bearer ", "")
 
+    return session_token or None
+
+async def get_current_user(request: Request) -> Optional[User]:
+    session_token = get_session_token(request)
     if not session_token:
         return None
 
-    # Find session
-    session_doc = await db.user_sessions.find_one(
-        {"session_token": session_token},
-        {"_id": 0}
-    )
-    if not session_doc:
+    cached = session_cache.get(session_token)
+    if cached:
+        return cached
+
+    # Session and its user in one round-trip
+    docs = await db.user_sessions.aggregate([
+        {"$match": {"session_token": session_token}},
+        {"$limit": 1},
+        {"$lookup": {
+            "from": "users",
+            "localField": "user_id",
+            "foreignField": "user_id",
+            "as": "user",
+        }},
+        {"$project": {"_id": 0, "expires_at": 1, "user": {"$arrayElemAt": ["$user", 0]}}},
+    ]).to_list(1)
+    if not docs:
         return None
+    session_doc = docs[0]
 
-    # Check expiry
+    # Check expiry (the TTL index may not have reaped it yet)
     expires_at = session_doc.get("expires_at")
-    if isinstance(expires_at, str):
-        expires_at = datetime.fromisoformat(expires_at)
-    if expires_at and expires_at.tzinfo is None:
-        expires_at = expires_at.replace(tzinfo=timezone.utc)
-
     if not expires_at or expires_at < datetime.now(timezone.utc):
         await db.user_sessions.delete_one({"session_token": session_token})
         return None
 
-    # Get user
-    user_doc = await db.users.find_one(
-        {"user_id": session_doc["user_id"]},
-        {"_id": 0}
-    )
+    user_doc = session_doc.get("user")
     if not user_doc:
         return None
 
-    if isinstance(user_doc.get("created_at"), str):
-        user_doc["created_at"] = datetime.fromisoformat(user_doc["created_at"])
-
-    return User(**user_doc)
+    user = User(**user_doc)
+    session_cache.put(session_token, user, expires_at)
+    return user
 
 async def require_auth(request: Request) -> User:
     user = await get_current_user(request)
@@ -151,11 +310,250 @@ async def require_auth(request: Request) -> User:
         raise HTTPException(status_code=401, detail="Not authenticated")
     return user
 
-async def require_admin(request: Request) -> User:
-    user = await require_auth(request)
-    if not is_admin_email(user.email):
-        raise HTTPException(status_code=403, detail="Not authorized")
-    return user
+def require_permission(permission: str):
+    async def dependency(request: Request) -> User:
+        user = await require_auth(request)
+        if not admin_policy.policy.allows(user.email, permission):
+            raise HTTPException(status_code=403, detail="Not authorized")
+        return user
+    return dependency
+
+# Any admin role may edit products; bulk routes name their own permission
+require_admin = require_permission(PRODUCTS_WRITE)
+
+# ----------------------------
+# Image helpers
+# ----------------------------
+def image_url(request: Request, digest: str) -> str:
+    """
+    Public URL for a stored image. Set PUBLIC_BASE_URL when the API sits
+    behind a proxy that rewrites the host.
+    """
+    base = os.environ.get("PUBLIC_BASE_URL", "").strip().rstrip("/")
+    if base:
+        return f"{base}/api/images/{digest}"
+    return str(request.url_for("get_image", digest=digest))
+
+async def save_variants(digest: str, source) -> None:
+    """
+    Render and store the responsive derivatives of an original, unless its
+    manifest already exists. Uploads run it before the original is stored,
+    so an undecodable file never lands in the blob store (except through
+    the deferred upload path, which renders from the stored original).
+    """
+    if await db.image_variants.find_one({"hash": digest}, {"_id": 1}):
+        return
+
+    try:
+        rendered = await generate_variants(source)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid image file")
+
+    variants = []
+    for variant in rendered["variants"]:
+        variants.append({
+            "width": variant["width"],
+            "format": variant["format"],
+            "hash": await image_store.put(variant["data"]),
+        })
+
+    await db.image_variants.update_one(
+        {"hash": digest},
+        {"$setOnInsert": {
+            "hash": digest,
+            "width": rendered["width"],
+            "height": rendered["height"],
+            "variants": variants,
+        }},
+        upsert=True,
+    )
+
+async def store_image(data: bytes) -> str:
+    """Store an in-memory image (e.g. a decoded data: URI) plus its derivatives."""
+    if len(data) > MAX_UPLOAD_BYTES:
+        raise HTTPException(status_code=413, detail="Image too large")
+    if not sniff_image_type(data[:16]):
+        raise HTTPException(status_code=415, detail="Unsupported image type")
+
+    digest = hashlib.sha256(data).hexdigest()
+    await save_variants(digest, data)
+    return await image_store.put(data)
+
+async def store_upload(file: UploadFile, variants: bool = True) -> str:
+    """
+    Stream an upload to the blob store in constant memory, plus its
+    derivatives unless variants=False (a job renders them later).
+    """
+    try:
+        spooled = await spool_upload(file, image_store.spool_dir)
+    except UploadTooLarge:
+        raise HTTPException(status_code=413, detail="Image too large")
+    except UnsupportedImageType:
+        raise HTTPException(status_code=415, detail="Unsupported image type")
+
+    try:
+        if variants:
+            # The worker process reads the spool file itself
+            await save_variants(spooled.digest, str(spooled.path))
+        await image_store.put_file(spooled.path, spooled.digest)
+    finally:
+        spooled.discard()
+    return spooled.digest
+
+async def run_image_variants_job(job) -> dict:
+    """Render the derivatives of a stored original, then add them to products already using it."""
+    digest = job.params["hash"]
+    blob = await image_store.open(digest)
+    if blob is None:
+        raise JobFailed("Image not found")
+
+    path = await spool_chunks(blob.chunks, image_store.spool_dir)
+    try:
+        await save_variants(digest, str(path))
+    except HTTPException as e:
+        raise JobFailed(e.detail)
+    finally:
+        path.unlink(missing_ok=True)
+    await job.progress(1, 2)
+
+    manifest = await db.image_variants.find_one({"hash": digest}, {"_id": 0})
+    updated = 0
+    # An admin may have saved a product with this image while the job ran.
+    # No version bump: the product's editable fields haven't changed.
+    async for product in db.products.find(
+        {"images": {"$regex": f"/api/images/{digest}$"}},
+        {"_id": 0, "product_id": 1, "images": 1, "image_variants": 1},
+    ):
+        image_variants = dict(product.get("image_variants") or {})
+        for url in product["images"]:
+            if digest_from_url(url) == digest:
+                image_variants[url] = build_srcsets(manifest["variants"], lambda d, url=url: url.replace(digest, d))
+        await db.products.update_one(
+            {"product_id": product["product_id"]},
+            {"$set": {"image_variants": image_variants, "updated_at": datetime.now(timezone.utc)}},
+        )
+        updated += 1
+    if updated:
+        await catalog_changed()
+    return {"hash": digest, "variants": len(manifest["variants"]), "products_updated": updated}
+
+async def build_variant_map(images: List[str], request: Request) -> Dict[str, Dict[str, str]]:
+    digests = {url: digest_from_url(url) for url in images}
+    wanted = [d for d in digests.values() if d]
+    if not wanted:
+        return {}
+
+    manifests = {
+        doc["hash"]: doc["variants"]
+        async for doc in db.image_variants.find({"hash": {"$in": wanted}}, {"_id": 0})
+    }
+    return {
+        url: build_srcsets(manifests[digest], lambda d: image_url(request, d))
+        for url, digest in digests.items()
+        if digest in manifests
+    }
+
+async def externalize_images(images: List[str], request: Request) -> List[str]:
+    """Move inline data: URIs into the blob store, keeping plain URLs as-is."""
+    result = []
+    for image in images:
+        try:
+            data = decode_data_uri(image)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid image data")
+        if data is None:
+            result.append(image)
+            continue
+        digest = await store_image(data)
+        result.append(image_url(request, digest))
+    return result
+
+async def catalog_changed() -> None:
+    """Call after any product write."""
+    catalog_cache.invalidate()
+    await schedule_snapshot()
+    await cache_sync.bump("catalog")
+
+SNAPSHOT_JOB = "snapshot"
+
+async def schedule_snapshot() -> None:
+    """
+    Republish at the end of the current SNAPSHOT_DELAY window. Runs in every
+    worker that sees a write (its own, or via cache_sync): each rebuilds its
+    instance's local SNAPSHOT_DIR (see snapshot.py), and all ask for the same
+    build hook job, so the window calls the hook once.
+    """
+    snapshot_trigger.schedule_local()
+    if not snapshot_trigger.build_hook:
+        return
+    slot = int(time.time() // snapshot_trigger.delay)
+    try:
+        await job_queue.enqueue(
+            SNAPSHOT_JOB,
+            idempotency_key=f"{SNAPSHOT_JOB}:{slot}",
+            run_at=datetime.fromtimestamp((slot + 1) * snapshot_trigger.delay, timezone.utc),
+        )
+    except PyMongoError as e:
+        logger.warning("Could not schedule a snapshot rebuild: %r", e)
+
+async def run_snapshot_job(job) -> dict:
+    await snapshot_trigger.call_hook()
+    return {}
+
+def catalog_response(request: Request, entry: CachedBody, cache_control: str) -> Response:
+    """
+    Send a cached body, compressed once per entry and encoding, or 304 when
+    the client's validators still match. Lists carry the newest updated_at
+    of what they show as Last-Modified; a product dropping out of a list
+    doesn't move it, which is one more reason If-None-Match wins when both
+    are sent.
+    """
+    encoding = None
+    if len(entry.body) >= COMPRESSION_MIN_SIZE:
+        encoding = choose_encoding(request.headers.get("accept-encoding"))
+    etag = coded_etag(entry.etag, encoding)
+    headers = {
+        **entry.headers,
+        "ETag": etag,
+        "Cache-Control": cache_control,
+        "Vary": "Accept-Encoding",
+    }
+
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        not_modified = etag_matches(if_none_match, etag)
+    else:
+        not_modified = _not_modified_since(
+            request.headers.get("if-modified-since"), entry.headers.get("Last-Modified")
+        )
+
+    if not_modified:
+        return Response(status_code=304, headers=headers)
+
+    if encoding:
+        headers["Content-Encoding"] = encoding
+        return Response(entry.encoded(encoding), media_type="application/json", headers=headers)
+    return Response(entry.body, media_type="application/json", headers=headers)
+
+def product_entry(model: Product) -> CachedBody:
+    """Detail body whose ETag carries the version, for If-Match on updates."""
+    body = model.model_dump_json().encode()
+    return CachedBody(
+        body,
+        {"Last-Modified": http_date(model.updated_at)},
+        etag=version_etag(model.version, body),
+    )
+
+def http_date(value: datetime) -> str:
+    return format_datetime(value.astimezone(timezone.utc), usegmt=True)
+
+def _not_modified_since(if_modified_since: Optional[str], last_modified: Optional[str]) -> bool:
+    if not if_modified_since or not last_modified:
+        return False
+    try:
+        return parsedate_to_datetime(last_modified) <= parsedate_to_datetime(if_modified_since)
+    except (TypeError, ValueError):
+        return False
 
 # ----------------------------
 # Auth endpoints
@@ -169,17 +567,12 @@ async def create_session(data: SessionCreate, response: Response):
     session_id = data.session_id
 
     # Call Emergent Auth API
-    async with httpx.AsyncClient() as http_client:
-        try:
-            auth_response = await http_client.get(
-                "https://demobackend.emergentagent.com/auth/v1/env/oauth/session-data",
-                headers={"X-Session-ID": session_id},
-                timeout=10.0
-            )
-            auth_response.raise_for_status()
-            user_data = auth_response.json()
-        except Exception as e:
-            raise HTTPException(status_code=400, detail=f"Failed to validate session: {str(e)}")
+    try:
+        user_data = await auth_provider.fetch_session(session_id)
+    except CircuitOpenError:
+        raise HTTPException(status_code=503, detail="Authentication service unavailable, try again shortly")
+    except AuthProviderError as e:
+        raise HTTPException(status_code=400, detail=f"Failed to validate session: {str(e)}")
 
     # Extract user info
     email = user_data.get("email")
@@ -191,7 +584,7 @@ async def create_session(data: SessionCreate, response: Response):
         raise HTTPException(status_code=400, detail="Invalid session data")
 
     # Block non-admin emails from logging in
-    if not is_admin_email(email):
+    if not admin_policy.policy.is_admin(email):
         raise HTTPException(
             status_code=403,
             detail="This Google account is not allowed to access admin."
@@ -213,17 +606,18 @@ async def create_session(data: SessionCreate, response: Response):
             "email": email,
             "name": name,
             "picture": picture,
-            "created_at": datetime.now(timezone.utc).isoformat(),
+            "created_at": datetime.now(timezone.utc),
         }
         await db.users.insert_one(user_doc)
 
     # Create session (7 days)
     expires_at = datetime.now(timezone.utc) + timedelta(days=7)
+    # BSON dates, so the TTL index on expires_at reaps expired sessions
     session_doc = {
         "user_id": user_id,
         "session_token": session_token,
-        "expires_at": expires_at.isoformat(),
-        "created_at": datetime.now(timezone.utc).isoformat(),
+        "expires_at": expires_at,
+        "created_at": datetime.now(timezone.utc),
     }
     await db.user_sessions.insert_one(session_doc)
 
@@ -240,12 +634,11 @@ async def create_session(data: SessionCreate, response: Response):
 
     # Return user + is_admin
     user_doc = await db.users.find_one({"user_id": user_id}, {"_id": 0})
-    if isinstance(user_doc.get("created_at"), str):
-        user_doc["created_at"] = datetime.fromisoformat(user_doc["created_at"])
 
     return {
         **User(**user_doc).model_dump(),
         "is_admin": True,
+        "role": admin_policy.policy.role(email),
     }
 
 @api_router.get("/auth/me")
@@ -253,16 +646,20 @@ async def get_current_user_endpoint(request: Request):
     user = await get_current_user(request)
     if not user:
         raise HTTPException(status_code=401, detail="Not authenticated")
+    policy = admin_policy.policy
     return {
         **user.model_dump(),
-        "is_admin": is_admin_email(user.email),
+        "is_admin": policy.is_admin(user.email),
+        "role": policy.role(user.email),
     }
 
 @api_router.post("/auth/logout")
 async def logout(request: Request, response: Response):
-    session_token = request.cookies.get("session_token")
+    session_token = get_session_token(request)
     if session_token:
+        session_cache.invalidate(session_token)
         await db.user_sessions.delete_one({"session_token": session_token})
+        await cache_sync.bump("sessions")
     response.delete_cookie(key="session_token", path="/")
     return {"message": "Logged out successfully"}
 
@@ -270,27 +667,244 @@ async def logout(request: Request, response: Response):
 # Product endpoints (public)
 # ----------------------------
 @api_router.get("/products", response_model=List[Product])
-async def get_products():
-    products = await db.products.find({}, {"_id": 0}).to_list(1000)
-    for product in products:
-        if isinstance(product.get("created_at"), str):
-            product["created_at"] = datetime.fromisoformat(product["created_at"])
-        if isinstance(product.get("updated_at"), str):
-            product["updated_at"] = datetime.fromisoformat(product["updated_at"])
-    return products
+async def get_products(
+    request: Request,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None,
+    max_images: Optional[int] = Query(None, ge=1),
+    min_price: Optional[float] = Query(None, ge=0),
+    max_price: Optional[float] = Query(None, ge=0),
+    size: Optional[List[str]] = Query(None),
+    color: Optional[List[str]] = Query(None),
+):
+    """
+    Keyset-paginated listing ordered by (created_at, product_id).
+    The body stays a plain array; the next page's cursor is sent in the
+    X-Next-Cursor header and is absent on the last page.
+    """
+    entry = await load_product_page(limit, cursor, fields, max_images, min_price, max_price, size, color)
+    return catalog_response(request, entry, PRODUCTS_CACHE_CONTROL)
+
+async def load_product_page(
+    limit: int = DEFAULT_PAGE_SIZE,
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None,
+    max_images: Optional[int] = None,
+    min_price: Optional[float] = None,
+    max_price: Optional[float] = None,
+    size: Optional[List[str]] = None,
+    color: Optional[List[str]] = None,
+) -> CachedBody:
+    """One listing page, from the catalog cache or Mongo (filling the cache)."""
+    cache_key = (
+        "list", limit, cursor, fields, max_images, min_price, max_price,
+        tuple(size or ()), tuple(color or ()),
+    )
+    cached = catalog_cache.get(cache_key)
+    if cached:
+        return cached
+
+    try:
+        projected = parse_fields(fields, Product.model_fields)
+        after = decode_cursor(cursor) if cursor else None
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    # Last-Modified needs updated_at even when fields= leaves it out
+    strip_updated_at = projected is not None and "updated_at" not in projected
+    version = catalog_cache.version
+    query = build_filter(after, min_price, max_price, size, color)
+    # Fetch one extra document to learn whether another page exists
+    products = await (
+        db.products.find(query, build_projection(
+            [*projected, "updated_at"] if strip_updated_at else projected, max_images
+        ))
+        .sort(SORT_ORDER)
+        .limit(limit + 1)
+        .to_list(limit + 1)
+    )
+
+    has_more = len(products) > limit
+    products = products[:limit]
+    headers = {"X-Next-Cursor": encode_cursor(products[-1])} if has_more else {}
+    last_modified = max((p["updated_at"] for p in products if p.get("updated_at")), default=None)
+    if last_modified:
+        headers["Last-Modified"] = http_date(last_modified)
+    if strip_updated_at:
+        for product in products:
+            product.pop("updated_at", None)
+
+    if max_images is not None:
+        for product in products:
+            if "image_variants" in product:
+                shown = set(product.get("images", []))
+                product["image_variants"] = {
+                    url: srcsets for url, srcsets in product["image_variants"].items() if url in shown
+                }
+
+    body = encode_products(products, validate=projected is None)
+
+    entry = CachedBody(body, headers)
+    catalog_cache.put(cache_key, entry, version)
+    return entry
+
+@api_router.get("/products/search", response_model=ProductSearchResponse)
+async def search_products(
+    request: Request,
+    q: str = Query(..., min_length=1, max_length=200),
+    limit: int = Query(DEFAULT_SEARCH_LIMIT, ge=1, le=MAX_SEARCH_LIMIT),
+    offset: int = Query(0, ge=0, le=10000),
+    min_price: Optional[float] = Query(None, ge=0),
+    max_price: Optional[float] = Query(None, ge=0),
+    size: Optional[List[str]] = Query(None),
+    color: Optional[List[str]] = Query(None),
+):
+    """
+    Relevance-ranked text search over name/description (Portuguese stemming,
+    accent-insensitive) with facet counts for sizes, colors and price ranges.
+    """
+    cache_key = (
+        "search", q, limit, offset, min_price, max_price,
+        tuple(size or ()), tuple(color or ()),
+    )
+    cached = catalog_cache.get(cache_key)
+    if cached:
+        return catalog_response(request, cached, PRODUCTS_CACHE_CONTROL)
+
+    version = catalog_cache.version
+    filters = build_filter(None, min_price, max_price, size, color)
+    docs = await db.products.aggregate(
+        build_search_pipeline(q, filters, limit, offset)
+    ).to_list(1)
+    raw = docs[0] if docs else {}
+
+    total = raw.get("total") or [{"count": 0}]
+    response = ProductSearchResponse(
+        results=raw.get("results", []),
+        total=total[0]["count"],
+        facets=shape_facets(raw),
+    )
+    updated = raw.get("updated") or [{}]
+    headers = {"Last-Modified": http_date(updated[0]["at"])} if updated[0].get("at") else {}
+    entry = CachedBody(response.model_dump_json().encode(), headers)
+    catalog_cache.put(cache_key, entry, version)
+    return catalog_response(request, entry, PRODUCTS_CACHE_CONTROL)
+
+# ----------------------------
+# Bulk import/export (admin only)
+# Declared before /products/{product_id} so "export" isn't taken for an id
+# ----------------------------
+@api_router.get("/products/export")
+async def export_products(user: User = Depends(require_permission(PRODUCTS_BULK))):
+    """Every product as NDJSON, streamed straight from the cursor."""
+    async def lines():
+        cursor = db.products.find({}, {"_id": 0}).sort(SORT_ORDER).batch_size(BULK_BATCH_SIZE)
+        async for product in cursor:
+            yield orjson.dumps(product, option=orjson.OPT_APPEND_NEWLINE | orjson.OPT_UTC_Z)
+
+    return StreamingResponse(
+        lines(),
+        media_type="application/x-ndjson",
+        headers={"Content-Disposition": 'attachment; filename="products.ndjson"'},
+    )
+
+@api_router.post("/products/bulk")
+async def import_products(request: Request, user: User = Depends(require_permission(PRODUCTS_BULK))):
+    """
+    Create or upsert products from an NDJSON body, one ProductCreate per line
+    (plus an optional product_id to upsert). The body is read as a stream and
+    written in unordered batches; bad lines are reported and skipped.
+    """
+    summary = {"created": 0, "updated": 0, "failed": 0, "errors": []}
+    batch = []
+
+    try:
+        async for line_no, line in iter_ndjson_lines(request.stream()):
+            try:
+                data = ProductImport.model_validate_json(line)
+                images = await externalize_images(data.images, request)
+            except ValueError as e:
+                record_error(summary, line_no, describe_error(e))
+                continue
+            except HTTPException as e:
+                record_error(summary, line_no, e.detail)
+                continue
+
+            batch.append((line_no, data, images))
+            if len(batch) >= BULK_BATCH_SIZE:
+                await write_import_batch(batch, request, summary)
+                batch = []
+    except LineTooLong as e:
+        # Lines after this one can't be located reliably; stop here
+        record_error(summary, e.line_no, str(e))
+
+    if batch:
+        await write_import_batch(batch, request, summary)
+    if summary["created"] or summary["updated"]:
+        await catalog_changed()
+    return summary
+
+async def write_import_batch(batch: list, request: Request, summary: dict) -> None:
+    now = datetime.now(timezone.utc)
+    all_images = [url for _, _, images in batch for url in images]
+    variant_map = await build_variant_map(all_images, request)
+
+    operations = []
+    for _, data, images in batch:
+        fields = {
+            "name": data.name,
+            "description": data.description,
+            "price": data.price,
+            "sizes": data.sizes,
+            "colors": data.colors,
+            "images": images,
+            "image_variants": {url: variant_map[url] for url in images if url in variant_map},
+            "updated_at": now,
+        }
+        if data.product_id:
+            operations.append(UpdateOne(
+                {"product_id": data.product_id},
+                {
+                    "$set": fields,
+                    "$setOnInsert": {"product_id": data.product_id, "created_at": now},
+                    "$inc": {"version": 1},
+                },
+                upsert=True,
+            ))
+        else:
+            operations.append(InsertOne({
+                **fields,
+                "product_id": f"prod_{uuid.uuid4().hex[:12]}",
+                "created_at": now,
+                "version": 1,
+            }))
+
+    try:
+        result = (await db.products.bulk_write(operations, ordered=False)).bulk_api_result
+    except BulkWriteError as e:
+        result = e.details
+        for error in result.get("writeErrors", []):
+            record_error(summary, batch[error["index"]][0], error.get("errmsg", "Write failed"))
+
+    summary["created"] += result.get("nInserted", 0) + result.get("nUpserted", 0)
+    summary["updated"] += result.get("nMatched", 0)
 
 @api_router.get("/products/{product_id}", response_model=Product)
-async def get_product(product_id: str):
+async def get_product(product_id: str, request: Request):
+    cache_key = ("product", product_id)
+    cached = catalog_cache.get(cache_key)
+    if cached:
+        return catalog_response(request, cached, PRODUCT_CACHE_CONTROL)
+
+    version = catalog_cache.version
     product = await db.products.find_one({"product_id": product_id}, {"_id": 0})
     if not product:
         raise HTTPException(status_code=404, detail="Product not found")
 
-    if isinstance(product.get("created_at"), str):
-        product["created_at"] = datetime.fromisoformat(product["created_at"])
-    if isinstance(product.get("updated_at"), str):
-        product["updated_at"] = datetime.fromisoformat(product["updated_at"])
-
-    return Product(**product)
+    entry = product_entry(Product(**product))
+    catalog_cache.put(cache_key, entry, version)
+    return catalog_response(request, entry, PRODUCT_CACHE_CONTROL)
 
 # ----------------------------
 # Product endpoints (admin only)
@@ -298,10 +912,12 @@ async def get_product(product_id: str):
 @api_router.post("/products", response_model=Product)
 async def create_product(
     data: ProductCreate,
+    request: Request,
     user: User = Depends(require_admin),
 ):
     product_id = f"prod_{uuid.uuid4().hex[:12]}"
     now = datetime.now(timezone.utc)
+    images = await externalize_images(data.images, request)
 
     product_doc = {
         "product_id": product_id,
@@ -310,39 +926,113 @@ async def create_product(
         "price": data.price,
         "sizes": data.sizes,
         "colors": data.colors,
-        "images": data.images,
-        "created_at": now.isoformat(),
-        "updated_at": now.isoformat(),
+        "images": images,
+        "image_variants": await build_variant_map(images, request),
+        "created_at": now,
+        "updated_at": now,
+        "version": 1,
     }
 
     await db.products.insert_one(product_doc)
+    await catalog_changed()
 
-    product_doc["created_at"] = now
-    product_doc["updated_at"] = now
     return Product(**product_doc)
 
 @api_router.put("/products/{product_id}", response_model=Product)
 async def update_product(
     product_id: str,
     data: ProductUpdate,
+    request: Request,
     user: User = Depends(require_admin),
 ):
-    existing = await db.products.find_one({"product_id": product_id}, {"_id": 0})
-    if not existing:
-        raise HTTPException(status_code=404, detail="Product not found")
+    """
+    Set fields and/or apply array ops, bumping the version. With If-Match
+    (the detail ETag, or "v<version>") a stale edit gets 412 instead of
+    overwriting someone else's.
+    """
+    expected = parse_if_match(request.headers.get("if-match"))
+    update_data = data.model_dump(exclude_none=True, exclude={"ops"})
+    ops = [op.model_dump() for op in data.ops or []]
+    if any(op["field"] in update_data for op in ops):
+        raise HTTPException(status_code=400, detail="Can't both replace and patch the same field")
+
+    if "images" in update_data:
+        update_data["images"] = await externalize_images(update_data["images"], request)
+        update_data["image_variants"] = await build_variant_map(update_data["images"], request)
+    for op in ops:
+        if op["field"] == "images" and op["op"] != "remove":
+            op["value"] = (await externalize_images([op["value"]], request))[0]
+
+    if ops:
+        updated = await patch_product(product_id, update_data, ops, expected, request)
+    else:
+        query = {"product_id": product_id}
+        if expected is not None:
+            query["version"] = {"$in": sorted(expected)}
+        # One round-trip: the filter checks the version, the reply is the new document
+        updated = await db.products.find_one_and_update(
+            query,
+            {"$set": {**update_data, "updated_at": datetime.now(timezone.utc)}, "$inc": {"version": 1}},
+            projection={"_id": 0},
+            return_document=ReturnDocument.AFTER,
+        )
+        if not updated:
+            await raise_update_conflict(product_id)
 
-    update_data = {k: v for k, v in data.model_dump().items() if v is not None}
-    update_data["updated_at"] = datetime.now(timezone.utc).isoformat()
+    await catalog_changed()
+    entry = product_entry(Product(**updated))
+    return Response(entry.body, media_type="application/json", headers={"ETag": entry.etag})
+
+# Without If-Match, array ops retry this often when racing another write
+PATCH_ATTEMPTS = 3
+
+async def patch_product(
+    product_id: str,
+    update_data: dict,
+    ops: List[dict],
+    expected: Optional[Set[int]],
+    request: Request,
+) -> dict:
+    """
+    Array ops are applied to the arrays as read, then written only if the
+    version is still the one read (compare-and-set), so concurrent ops on
+    the same array never drop each other's changes.
+    """
+    for _ in range(PATCH_ATTEMPTS):
+        current = await db.products.find_one(
+            {"product_id": product_id},
+            {"_id": 0, "version": 1, **{op["field"]: 1 for op in ops}},
+        )
+        if not current:
+            raise HTTPException(status_code=404, detail="Product not found")
+        if expected is not None and current.get("version") not in expected:
+            raise HTTPException(status_code=412, detail="Product was modified by someone else")
 
-    await db.products.update_one({"product_id": product_id}, {"$set": update_data})
+        try:
+            fields = {**update_data, **apply_array_ops(current, ops)}
+        except ArrayOpError as e:
+            raise HTTPException(status_code=409, detail=str(e))
+        if "images" in fields and "image_variants" not in fields:
+            fields["image_variants"] = await build_variant_map(fields["images"], request)
+        fields["updated_at"] = datetime.now(timezone.utc)
 
-    updated_product = await db.products.find_one({"product_id": product_id}, {"_id": 0})
-    if isinstance(updated_product.get("created_at"), str):
-        updated_product["created_at"] = datetime.fromisoformat(updated_product["created_at"])
-    if isinstance(updated_product.get("updated_at"), str):
-        updated_product["updated_at"] = datetime.fromisoformat(updated_product["updated_at"])
+        updated = await db.products.find_one_and_update(
+            {"product_id": product_id, "version": current.get("version")},
+            {"$set": fields, "$inc": {"version": 1}},
+            projection={"_id": 0},
+            return_document=ReturnDocument.AFTER,
+        )
+        if updated:
+            return updated
+        if expected is not None:
+            await raise_update_conflict(product_id)
+    raise HTTPException(status_code=409, detail="Product is being edited concurrently, try again")
 
-    return Product(**updated_product)
+async def raise_update_conflict(product_id: str) -> None:
+    """A conditional update matched nothing: tell a missing product from a stale version."""
+    if await db.products.find_one({"product_id": product_id}, {"_id": 1}):
+        raise HTTPException(status_code=412, detail="Product was modified by someone else")
+    raise HTTPException(status_code=404, detail="Product not found")
 
 @api_router.delete("/products/{product_id}")
 async def delete_product(
@@ -352,23 +1042,143 @@ async def delete_product(
     result = await db.products.delete_one({"product_id": product_id})
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Product not found")
+    await catalog_changed()
     return {"message": "Product deleted successfully"}
 
 @api_router.post("/upload-image")
 async def upload_image(
+    request: Request,
     file: UploadFile = File(...),
     user: User = Depends(require_admin),
 ):
-    contents = await file.read()
-    base64_image = base64.b64encode(contents).decode("utf-8")
-    ext = file.content_type.split("/")[-1] if file.content_type else "png"
-    return {"image": f"data:image/{ext};base64,{base64_image}"}
+    """
+    Store an image and its derivatives. With "Prefer: respond-async" the
+    derivatives are left to a background job: the response is 202 with the
+    job (poll GET /api/jobs/{job_id}), and variants fill in when it's done.
+    """
+    respond_async = "respond-async" in request.headers.get("prefer", "").lower()
+    digest = await store_upload(file, variants=not respond_async)
+    url = image_url(request, digest)
+    variants = await build_variant_map([url], request)
+    if not respond_async or url in variants:
+        return {"image": url, "hash": digest, "variants": variants.get(url, {})}
+
+    # Keyed by image, so re-uploading the same file doesn't render it twice
+    job = await job_queue.enqueue(
+        IMAGE_VARIANTS_JOB,
+        {"hash": digest},
+        idempotency_key=f"{IMAGE_VARIANTS_JOB}:{digest}",
+        created_by=user.user_id,
+    )
+    return ORJSONResponse(
+        status_code=202,
+        content={"image": url, "hash": digest, "variants": {}, "job": job},
+        headers={"Preference-Applied": "respond-async"},
+    )
+
+# ----------------------------
+# Storage (admin)
+# ----------------------------
+IMAGE_GC_JOB = "image_gc"
+# Seconds between scheduled collections; 0 leaves it to POST /api/admin/images/gc
+IMAGE_GC_INTERVAL = float(os.environ.get("IMAGE_GC_INTERVAL", str(24 * 3600)))
+
+async def run_image_gc_job(job) -> dict:
+    """Delete blobs no product references any more (see image_gc.py)."""
+    result = await sweep(db, image_store, dry_run=bool(job.params.get("dry_run")), progress=job.progress)
+    return result.as_dict()
+
+@api_router.get("/admin/storage")
+async def get_storage(
+    limit: int = Query(50, ge=0, le=1000),
+    user: User = Depends(require_permission(STORAGE_MANAGE)),
+):
+    """Bytes stored, per product (largest first; limit=0 for all) and reclaimable."""
+    return await storage_report(db, image_store, limit=limit)
+
+@api_router.post("/admin/images/gc", status_code=202)
+async def collect_images(
+    dry_run: bool = False,
+    user: User = Depends(require_permission(STORAGE_MANAGE)),
+):
+    """Start a collection in the background; dry_run only reports what it would delete."""
+    return await job_queue.enqueue(IMAGE_GC_JOB, {"dry_run": dry_run}, created_by=user.user_id)
+
+# ----------------------------
+# Jobs
+# ----------------------------
+@api_router.get("/jobs/{job_id}")
+async def get_job(job_id: str, user: User = Depends(require_admin)):
+    job = await job_queue.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+# ----------------------------
+# Image endpoints (public)
+# ----------------------------
+@api_router.get("/images/{digest}", name="get_image")
+async def get_image(digest: str):
+    if not is_valid_digest(digest):
+        raise HTTPException(status_code=404, detail="Image not found")
+    blob = await image_store.open(digest)
+    if not blob:
+        raise HTTPException(status_code=404, detail="Image not found")
+
+    # Content-addressed: the bytes behind a digest never change
+    return StreamingResponse(
+        blob.chunks,
+        media_type=blob.content_type,
+        headers={
+            "Cache-Control": IMAGE_CACHE_CONTROL,
+            "ETag": f'"{digest}"',
+            "Content-Length": str(blob.size),
+        },
+    )
+
+# ----------------------------
+# Health
+# ----------------------------
+@api_router.get("/")
+async def health():
+    """Render's health check. Startup, warm-up included, finishes before this answers."""
+    return {"status": "ok"}
+
+# ----------------------------
+# Metrics
+# ----------------------------
+@app.get("/metrics", include_in_schema=False)
+async def metrics(request: Request):
+    """Prometheus text format. Set METRICS_TOKEN to require a Bearer token."""
+    token = os.environ.get("METRICS_TOKEN", "")
+    if token and request.headers.get("Authorization") != f"Bearer {token}":
+        raise HTTPException(status_code=401, detail="Not authenticated")
+    return PlainTextResponse(metrics_registry.render(), media_type="text/plain; version=0.0.4")
 
 # ----------------------------
 # App setup
 # ----------------------------
 app.include_router(api_router)
 
+app.add_middleware(UploadGuardMiddleware, paths=["/api/upload-image"])
+
+# Caps on the routes that are expensive or call out, so bursts there can't
+# starve catalog reads. Keyed by session token, else IP; first match applies.
+# Only tokens of sessions we've already resolved count, so random bearer
+# tokens can't each get a fresh bucket.
+# Override with RATE_LIMIT_<NAME>="<requests>/<seconds>" and CONCURRENCY_<NAME>.
+app.add_middleware(RateLimitMiddleware, is_known_token=lambda token: session_cache.get(token) is not None, rules=[
+    create_rule("auth", ["POST"], ["/api/auth/session"], rate="10/60", concurrency=4, by_ip=True),
+    create_rule("upload", ["POST"], ["/api/upload-image"], rate="60/60", concurrency=2),
+    create_rule("bulk", ["POST"], ["/api/products/bulk"], rate="6/60", concurrency=1),
+    create_rule(
+        "admin_write", ["POST", "PUT", "DELETE"], ["/api/products", "/api/products/*"], rate="120/60",
+    ),
+])
+
+# Inside MetricsMiddleware, so response sizes are measured as sent
+app.add_middleware(CompressionMiddleware)
+
 cors_origins = os.environ.get("CORS_ORIGINS", "*").split(",")
 app.add_middleware(
     CORSMiddleware,
@@ -376,6 +1186,13 @@ app.add_middleware(
     allow_origins=[o.strip() for o in cors_origins if o.strip()],
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "ETag", "Retry-After", "Preference-Applied"],
+)
+
+# Outermost, so it times the whole stack. SERVER_TIMING=1 adds the header.
+app.add_middleware(
+    MetricsMiddleware,
+    server_timing=os.environ.get("SERVER_TIMING", "").lower() in ("1", "true", "yes"),
 )
 
 logging.basicConfig(
@@ -384,6 +1201,73 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Listing pages the storefront asks for first: the default and the grid
+WARMUP_PAGES = (
+    {},
+    {"fields": "name,description,price,colors,images,image_variants", "max_images": 1},
+)
+WARMUP_CONNECTIONS = int(os.environ.get("WARMUP_CONNECTIONS", "4"))
+WARMUP_TIMEOUT = float(os.environ.get("WARMUP_TIMEOUT", "10"))
+
+async def warm_up() -> None:
+    """
+    Open pooled Mongo connections and render the first catalog pages, so the
+    request that woke the service doesn't pay for them. Best effort: a slow
+    or failing warm-up is logged and startup carries on.
+    """
+    async def run():
+        # Concurrent commands each check out their own pooled connection
+        await asyncio.gather(*(db.command("ping") for _ in range(WARMUP_CONNECTIONS)))
+        for params in WARMUP_PAGES:
+            await load_product_page(**params)
+
+    started = time.perf_counter()
+    try:
+        await asyncio.wait_for(run(), WARMUP_TIMEOUT)
+    except Exception as e:
+        logger.warning("Warm-up incomplete: %r", e)
+    else:
+        logger.info("Warm-up done in %.0f ms", (time.perf_counter() - started) * 1000)
+
+async def migrate_db():
+    """
+    Data migrations the read path relies on (BSON dates, product versions).
+    Awaited before serving; a no-op once applied. A failure aborts startup
+    rather than leaving requests to fail on unmigrated documents.
+    """
+    await migrate_dates(db)
+    await migrate_versions(db)
+
+async def build_indexes():
+    """Idempotent index checks; they don't need to hold up the first request."""
+    try:
+        await ensure_indexes(db)
+    except Exception:
+        logger.exception("Index creation failed")
+
+@app.on_event("startup")
+async def startup():
+    connect_db()
+    await migrate_db()
+    admin_policy.start(db)
+    cache_sync.start()
+    job_queue.start()
+    await warm_up()
+    # Keep a reference so the task isn't garbage-collected while it runs
+    app.state.build_indexes = asyncio.create_task(build_indexes())
+
 @app.on_event("shutdown")
 async def shutdown_db_client():
-    client.close()
+    # Background tasks first and waited for: they use the Mongo client
+    await job_queue.aclose()
+    await cache_sync.aclose()
+    await admin_policy.aclose()
+    await snapshot_trigger.aclose()
+    build_indexes_task = getattr(app.state, "build_indexes", None)
+    if build_indexes_task is not None:
+        build_indexes_task.cancel()
+        await asyncio.gather(build_indexes_task, return_exceptions=True)
+    shutdown_pool()
+    await auth_provider.aclose()
+    if client is not None:
+        client.close()
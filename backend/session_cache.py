@@ -0,0 +1,53 @@
+"""
+Bounded TTL cache of resolved sessions, keyed by session token.
+
+A cached entry never outlives the session itself, and is kept at most
+SESSION_CACHE_TTL seconds so user changes made elsewhere are picked up.
+"""
+
+import os
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Any, Optional, Tuple
+
+
+class SessionCache:
+    def __init__(self, max_entries: int = 1024, ttl: float = 300.0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        # token -> (user, session expires_at, monotonic deadline)
+        self._entries: "OrderedDict[str, Tuple[Any, datetime, float]]" = OrderedDict()
+
+    def get(self, token: str) -> Optional[Any]:
+        entry = self._entries.get(token)
+        if entry is None:
+            return None
+        user, expires_at, deadline = entry
+        if deadline <= time.monotonic() or expires_at <= datetime.now(timezone.utc):
+            del self._entries[token]
+            return None
+        self._entries.move_to_end(token)
+        return user
+
+    def put(self, token: str, user: Any, expires_at: datetime) -> None:
+        self._entries[token] = (user, expires_at, time.monotonic() + self.ttl)
+        self._entries.move_to_end(token)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, token: str) -> None:
+        self._entries.pop(token, None)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+def create_session_cache() -> SessionCache:
+    return SessionCache(
+        max_entries=int(os.environ.get("SESSION_CACHE_MAX_ENTRIES", "1024")),
+        ttl=float(os.environ.get("SESSION_CACHE_TTL", "300")),
+    )
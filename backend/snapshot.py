@@ -0,0 +1,257 @@
+#!/usr/bin/env python3
+"""
+Static catalog snapshot: the product list, one file per product and the
+hosted images (originals and derivatives) they reference, written as plain
+files a CDN can serve without touching the API.
+
+    <out>/products.json              same body as GET /api/products, all pages
+    <out>/products/<product_id>.json same body as GET /api/products/<id>
+    <out>/images/<digest>.<ext>      hosted images, URLs rewritten to point here
+
+Rebuilds are incremental: manifest.json in the output directory records each
+product's updated_at and the images already copied, so only changed products
+are rewritten and each image is copied once. Builds into the same directory
+take turns on a lock file there.
+
+Republishing from the API (SnapshotTrigger) comes in two kinds. A build hook
+(SNAPSHOT_BUILD_HOOK, e.g. Netlify's) rebuilds one shared copy, so it is
+fired once per window for the whole deployment. SNAPSHOT_DIR is local disk,
+which other instances can't see (and Render's is wiped on deploy), so every
+instance rebuilds its own copy; that relies on cache_sync telling every
+worker about catalog writes. Behind a CDN with several instances, prefer the
+build hook.
+
+Usage (from backend/):
+    python snapshot.py --out ../frontend/build/catalog --public-path /catalog
+"""
+
+import argparse
+import asyncio
+import fcntl
+import logging
+import os
+import re
+import time
+from datetime import timezone
+from pathlib import Path
+from typing import Dict, Optional, Set
+
+import orjson
+
+from catalog_query import SORT_ORDER
+
+logger = logging.getLogger(__name__)
+
+MANIFEST = "manifest.json"
+LOCK_FILE = ".lock"
+EXTENSIONS = {"image/jpeg": "jpg", "image/png": "png", "image/gif": "gif", "image/webp": "webp"}
+
+# A hosted image URL, whether alone (images) or inside a srcset (image_variants)
+_HOSTED_URL = re.compile(r"[^\s,]*/api/images/([0-9a-f]{64})")
+
+
+def _write_atomic(path: Path, data: bytes) -> None:
+    tmp = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    tmp.write_bytes(data)
+    os.replace(tmp, path)
+
+
+def _load_manifest(out_dir: Path) -> dict:
+    try:
+        manifest = orjson.loads((out_dir / MANIFEST).read_bytes())
+    except (OSError, orjson.JSONDecodeError):
+        manifest = {}
+    return {"products": manifest.get("products", {}), "images": manifest.get("images", {})}
+
+
+class SnapshotBuilder:
+    def __init__(self, db, store, out_dir: Path, public_path: str = "/catalog"):
+        self.db = db
+        self.store = store
+        self.out_dir = Path(out_dir)
+        self.public_path = public_path.rstrip("/")
+
+    def _lock(self):
+        self.out_dir.mkdir(parents=True, exist_ok=True)
+        lock = open(self.out_dir / LOCK_FILE, "ab")
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        return lock
+
+    async def build(self, full: bool = False) -> Dict[str, int]:
+        # Another process building here (a sibling worker, the CLI) goes first
+        lock = await asyncio.to_thread(self._lock)
+        try:
+            return await self._build(full)
+        finally:
+            lock.close()
+
+    async def _build(self, full: bool) -> Dict[str, int]:
+        products_dir = self.out_dir / "products"
+        await asyncio.to_thread(products_dir.mkdir, parents=True, exist_ok=True)
+        await asyncio.to_thread((self.out_dir / "images").mkdir, exist_ok=True)
+
+        manifest = {"products": {}, "images": {}} if full else _load_manifest(self.out_dir)
+        stamps: Dict[str, str] = manifest["products"]
+        self._images: Dict[str, str] = manifest["images"]
+
+        listing = []
+        seen: Set[str] = set()
+        written = 0
+        copied_before = len(self._images)
+
+        async for product in self.db.products.find({}, {"_id": 0}).sort(SORT_ORDER):
+            product_id = product["product_id"]
+            product = await self._localize(product)
+            listing.append(product)
+            seen.add(product_id)
+
+            stamp = product["updated_at"].isoformat()
+            path = products_dir / f"{product_id}.json"
+            if stamps.get(product_id) != stamp or not path.exists():
+                await asyncio.to_thread(_write_atomic, path, orjson.dumps(product))
+                stamps[product_id] = stamp
+                written += 1
+
+        removed = set(stamps) - seen
+        for product_id in removed:
+            (products_dir / f"{product_id}.json").unlink(missing_ok=True)
+            del stamps[product_id]
+
+        list_path = self.out_dir / "products.json"
+        if written or removed or not list_path.exists():
+            await asyncio.to_thread(_write_atomic, list_path, orjson.dumps(listing))
+        await asyncio.to_thread(_write_atomic, self.out_dir / MANIFEST, orjson.dumps(manifest))
+
+        return {
+            "products": len(listing),
+            "written": written,
+            "removed": len(removed),
+            "images_copied": len(self._images) - copied_before,
+        }
+
+    async def _localize(self, product: dict) -> dict:
+        """Copy the product's hosted images and point its URLs at the copies."""
+        texts = list(product.get("images", []))
+        for srcsets in product.get("image_variants", {}).values():
+            texts.extend(srcsets.values())
+
+        for digest in {d for text in texts for d in _HOSTED_URL.findall(text)}:
+            if digest not in self._images:
+                filename = await self._copy_image(digest)
+                if filename:
+                    self._images[digest] = filename
+
+        def local(text: str) -> str:
+            # Images missing from the store keep their API URL
+            return _HOSTED_URL.sub(
+                lambda m: f"{self.public_path}/images/{self._images[m.group(1)]}"
+                if m.group(1) in self._images else m.group(0),
+                text,
+            )
+
+        product["images"] = [local(url) for url in product.get("images", [])]
+        if "image_variants" in product:
+            product["image_variants"] = {
+                local(url): {fmt: local(srcset) for fmt, srcset in srcsets.items()}
+                for url, srcsets in product["image_variants"].items()
+            }
+        return product
+
+    async def _copy_image(self, digest: str) -> Optional[str]:
+        blob = await self.store.open(digest)
+        if blob is None:
+            logger.warning("Snapshot: image %s is not in the blob store", digest)
+            return None
+        filename = f"{digest}.{EXTENSIONS.get(blob.content_type, 'bin')}"
+        data = b"".join([chunk async for chunk in blob.chunks])
+        await asyncio.to_thread(_write_atomic, self.out_dir / "images" / filename, data)
+        return filename
+
+
+class SnapshotTrigger:
+    """
+    How to republish after catalog writes, at most once per `delay`
+    seconds so a burst of edits produces one rebuild. schedule_local()
+    rebuilds this instance's `builder` directory at the end of the window;
+    call it in every worker. call_hook() POSTs `build_hook`; the API runs it
+    as one shared job per window.
+    """
+
+    def __init__(self, builder: Optional[SnapshotBuilder], build_hook: str = "", delay: float = 30.0):
+        self.builder = builder
+        self.build_hook = build_hook
+        self.delay = delay
+        self._pending: Optional[asyncio.Task] = None
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.builder or self.build_hook)
+
+    def schedule_local(self) -> None:
+        if self.builder is None or self._pending is not None:
+            return
+        self._pending = asyncio.create_task(self._rebuild_at_window_end())
+
+    async def _rebuild_at_window_end(self) -> None:
+        await asyncio.sleep(self.delay - time.time() % self.delay)
+        # Writes from here on schedule the next rebuild
+        self._pending = None
+        try:
+            result = await self.builder.build()
+            logger.info("Snapshot rebuilt: %s", result)
+        except Exception:
+            logger.exception("Snapshot rebuild failed")
+
+    async def call_hook(self) -> None:
+        if self.build_hook:
+            import httpx
+
+            async with httpx.AsyncClient(timeout=10.0) as client:
+                response = await client.post(self.build_hook)
+                response.raise_for_status()
+
+    async def aclose(self) -> None:
+        if self._pending is not None:
+            self._pending.cancel()
+            await asyncio.gather(self._pending, return_exceptions=True)
+
+
+def create_snapshot_trigger(db, store) -> SnapshotTrigger:
+    """Disabled unless SNAPSHOT_DIR and/or SNAPSHOT_BUILD_HOOK is set."""
+    out_dir = os.environ.get("SNAPSHOT_DIR", "").strip()
+    builder = None
+    if out_dir:
+        builder = SnapshotBuilder(db, store, Path(out_dir), os.environ.get("SNAPSHOT_PUBLIC_PATH", "/catalog"))
+    return SnapshotTrigger(
+        builder,
+        build_hook=os.environ.get("SNAPSHOT_BUILD_HOOK", "").strip(),
+        delay=float(os.environ.get("SNAPSHOT_DELAY", "30")),
+    )
+
+
+async def main() -> None:
+    from dotenv import load_dotenv
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    from image_store import create_blob_store
+
+    root_dir = Path(__file__).parent
+    load_dotenv(root_dir / ".env")
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--out", required=True, help="directory the CDN serves as --public-path")
+    parser.add_argument("--public-path", default="/catalog")
+    parser.add_argument("--full", action="store_true", help="ignore the manifest and rewrite everything")
+    args = parser.parse_args()
+
+    client = AsyncIOMotorClient(os.environ["MONGO_URL"], tz_aware=True, tzinfo=timezone.utc)
+    db = client[os.environ["DB_NAME"]]
+    try:
+        builder = SnapshotBuilder(db, create_blob_store(db, root_dir), Path(args.out), args.public_path)
+        print(await builder.build(full=args.full))
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,242 @@
+"""
+Constant-memory handling of image uploads.
+
+Uploads are copied chunk by chunk to a spool file next to the blob store while
+being hashed, so no request ever holds the whole image in memory. Oversized
+bodies and files that don't start with a known image signature are rejected
+as early as possible: UploadGuardMiddleware turns them away while the body
+is still arriving, before the form parser writes it to a temp file.
+"""
+
+import asyncio
+import hashlib
+import json
+import os
+import tempfile
+from dataclasses import dataclass
+from pathlib import Path
+from typing import AsyncIterator, Iterable, Optional
+
+from image_store import CHUNK_SIZE, sniff_image_type
+
+MAX_UPLOAD_BYTES = int(os.environ.get("MAX_UPLOAD_BYTES", str(10 * 1024 * 1024)))
+
+# Room for multipart boundaries and part headers on top of the file itself
+_MULTIPART_OVERHEAD = 64 * 1024
+
+
+class UploadTooLarge(ValueError):
+    pass
+
+
+class UnsupportedImageType(ValueError):
+    pass
+
+
+@dataclass
+class SpooledUpload:
+    path: Path
+    digest: str
+    size: int
+    content_type: str
+
+    def discard(self) -> None:
+        self.path.unlink(missing_ok=True)
+
+
+async def spool_upload(
+    file,
+    spool_dir: Optional[Path] = None,
+    max_bytes: int = MAX_UPLOAD_BYTES,
+) -> SpooledUpload:
+    """
+    Copy an UploadFile to a temp file, hashing as we go. The caller owns the
+    returned file and must either hand it to the blob store or discard() it.
+    """
+    if spool_dir is not None:
+        spool_dir.mkdir(parents=True, exist_ok=True)
+    fd, name = tempfile.mkstemp(dir=spool_dir, suffix=".upload")
+    path = Path(name)
+    hasher = hashlib.sha256()
+    size = 0
+    content_type = None
+
+    try:
+        with os.fdopen(fd, "wb") as out:
+            while True:
+                chunk = await file.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                if content_type is None:
+                    content_type = sniff_image_type(chunk[:16])
+                    if content_type is None:
+                        raise UnsupportedImageType("File is not a supported image")
+                size += len(chunk)
+                if size > max_bytes:
+                    raise UploadTooLarge(f"Image exceeds {max_bytes} bytes")
+                hasher.update(chunk)
+                await asyncio.to_thread(out.write, chunk)
+    except BaseException:
+        path.unlink(missing_ok=True)
+        raise
+
+    if content_type is None:
+        path.unlink(missing_ok=True)
+        raise UnsupportedImageType("Empty file")
+
+    return SpooledUpload(path=path, digest=hasher.hexdigest(), size=size, content_type=content_type)
+
+
+async def spool_chunks(chunks: AsyncIterator[bytes], spool_dir: Optional[Path] = None) -> Path:
+    """Copy a stored blob to a temp file, e.g. for the variant worker process. The caller deletes it."""
+    if spool_dir is not None:
+        spool_dir.mkdir(parents=True, exist_ok=True)
+    fd, name = tempfile.mkstemp(dir=spool_dir, suffix=".blob")
+    path = Path(name)
+    try:
+        with os.fdopen(fd, "wb") as out:
+            async for chunk in chunks:
+                await asyncio.to_thread(out.write, chunk)
+    except BaseException:
+        path.unlink(missing_ok=True)
+        raise
+    return path
+
+
+def multipart_boundary(headers) -> Optional[bytes]:
+    """The boundary of a multipart/form-data request, from its raw ASGI headers."""
+    for key, value in headers:
+        if key == b"content-type":
+            media_type, _, params = value.partition(b";")
+            if media_type.strip().lower() != b"multipart/form-data":
+                return None
+            for param in params.split(b";"):
+                name, _, boundary = param.strip().partition(b"=")
+                if name.lower() == b"boundary" and boundary:
+                    return boundary.strip(b'"')
+    return None
+
+
+def sniff_file_part(head: bytes, boundary: bytes) -> Optional[bool]:
+    """
+    Whether the first file part of a multipart body starts like an image,
+    judged from the body's first bytes. None until `head` holds enough to
+    tell (or when the form has no file part, which isn't ours to reject).
+    """
+    delimiter = b"--" + boundary
+    pos = 0
+    while True:
+        start = head.find(delimiter, pos)
+        if start < 0:
+            return None
+        headers_start = start + len(delimiter)
+        if head.startswith(b"--", headers_start):
+            return None
+        headers_end = head.find(b"\r\n\r\n", headers_start)
+        if headers_end < 0:
+            return None
+        data_start = headers_end + 4
+        if b"filename=" in head[headers_start:headers_end].lower():
+            part_end = head.find(b"\r\n" + delimiter, data_start)
+            data = head[data_start:data_start + 16 if part_end < 0 else min(part_end, data_start + 16)]
+            if part_end < 0 and len(data) < 16:
+                return None
+            return sniff_image_type(data) is not None
+        pos = data_start
+
+
+class UploadGuardMiddleware:
+    """
+    Turns away upload requests before the form parser spools them to disk:
+
+    - over the size limit, with 413. A declared Content-Length is checked
+      before the body is read at all; chunked bodies are counted as they
+      arrive and cut off as soon as the running total passes the limit.
+    - whose file doesn't start with a known image signature, with 415, as
+      soon as the first bytes of the file part have arrived. The handler
+      still checks the file it gets; this only spares the temp space.
+    """
+
+    def __init__(self, app, paths: Iterable[str], max_bytes: int = MAX_UPLOAD_BYTES):
+        self.app = app
+        self.paths = frozenset(paths)
+        self.max_body = max_bytes + _MULTIPART_OVERHEAD
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] not in self.paths:
+            await self.app(scope, receive, send)
+            return
+
+        length = None
+        for key, value in scope["headers"]:
+            if key == b"content-length":
+                length = value
+                break
+        if length is not None and length.isdigit() and int(length) > self.max_body:
+            await _reject(send, 413, "Image too large")
+            return
+
+        boundary = multipart_boundary(scope["headers"])
+        head = bytearray()
+        received = 0
+        # (status, detail) once the request is turned away
+        rejected = None
+        started = False
+
+        async def guarded_receive():
+            nonlocal received, rejected, boundary
+            if rejected:
+                return {"type": "http.disconnect"}
+            message = await receive()
+            if message["type"] != "http.request":
+                return message
+            body = message.get("body", b"")
+            received += len(body)
+            if received > self.max_body:
+                rejected = (413, "Image too large")
+            elif boundary is not None:
+                head.extend(body)
+                is_image = sniff_file_part(bytes(head), boundary)
+                if is_image is False:
+                    rejected = (415, "Unsupported image type")
+                elif is_image or len(head) > _MULTIPART_OVERHEAD:
+                    # Decided, or no file part up front: stop looking
+                    boundary = None
+            if rejected:
+                # Looks like a disconnect to the app, which stops reading
+                return {"type": "http.disconnect"}
+            return message
+
+        async def guarded_send(message):
+            nonlocal started
+            if rejected:
+                # Whatever the app makes of the cut-off body, the client gets our answer
+                if not started:
+                    started = True
+                    await _reject(send, *rejected)
+                return
+            if message["type"] == "http.response.start":
+                started = True
+            await send(message)
+
+        try:
+            await self.app(scope, guarded_receive, guarded_send)
+        except Exception:
+            if not rejected:
+                raise
+        if rejected and not started:
+            await _reject(send, *rejected)
+
+
+async def _reject(send, status: int, detail: str) -> None:
+    body = json.dumps({"detail": detail}).encode()
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(body)).encode()),
+            (b"connection", b"close"),
+        ],
+    })
+    await send({"type": "http.response.body", "body": body})
@@ -111,8 +111,8 @@ class CrochetAPITester:
             session_doc = {
                 "user_id": self.test_user_id,
                 "session_token": session_token,
-                "expires_at": expires_at.isoformat(),
-                "created_at": datetime.now(timezone.utc).isoformat()
+                "expires_at": expires_at,
+                "created_at": datetime.now(timezone.utc)
             }
             self.db.user_sessions.insert_one(session_doc)
             
@@ -2,6 +2,9 @@ import { motion } from 'framer-motion';
 import { Link } from 'react-router-dom';
 
 function ProductCard({ product }) {
+  const cover = product.images[0];
+  const variants = product.image_variants?.[cover];
+
   return (
     <motion.div
       initial={{ opacity: 0, y: 20 }}
@@ -12,11 +15,23 @@ function ProductCard({ product }) {
       <Link to={`/product/${product.product_id}`}>
         <div className="product-card group">
           <div className="aspect-[3/4] overflow-hidden">
-            <img
-              src={product.images[0]}
-              alt={product.name}
-              className="w-full h-full object-cover"
-            />
+            <picture>
+              {variants?.webp && (
+                <source
+                  type="image/webp"
+                  srcSet={variants.webp}
+                  sizes="(min-width: 1024px) 33vw, (min-width: 768px) 50vw, 100vw"
+                />
+              )}
+              <img
+                src={cover}
+                srcSet={variants?.jpeg}
+                sizes="(min-width: 1024px) 33vw, (min-width: 768px) 50vw, 100vw"
+                alt={product.name}
+                loading="lazy"
+                className="w-full h-full object-cover"
+              />
+            </picture>
           </div>
           <div className="p-6 space-y-2">
             <h3
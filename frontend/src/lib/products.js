@@ -0,0 +1,48 @@
+const BACKEND_URL = process.env.REACT_APP_BACKEND_URL;
+// Static snapshot written by backend/snapshot.py, e.g. "/catalog"
+const CATALOG_URL = process.env.REACT_APP_CATALOG_URL;
+
+// Follows the X-Next-Cursor header until the last page of /api/products
+export async function fetchAllProducts(params = {}) {
+  const products = [];
+  let cursor = null;
+
+  do {
+    const query = new URLSearchParams(params);
+    if (cursor) query.set('cursor', cursor);
+
+    const response = await fetch(`${BACKEND_URL}/api/products?${query}`);
+    if (!response.ok) throw new Error('Failed to fetch products');
+    products.push(...(await response.json()));
+    cursor = response.headers.get('X-Next-Cursor');
+  } while (cursor);
+
+  return products;
+}
+
+// Snapshot file, or null when there is no snapshot (the SPA fallback
+// answers missing files with index.html, which fails to parse)
+async function fetchSnapshot(path) {
+  if (!CATALOG_URL) return null;
+  try {
+    const response = await fetch(`${CATALOG_URL}/${path}`);
+    if (!response.ok) return null;
+    return await response.json();
+  } catch {
+    return null;
+  }
+}
+
+// Public catalog: the static snapshot when available, else the API
+export async function fetchCatalogProducts(params = {}) {
+  return (await fetchSnapshot('products.json')) ?? fetchAllProducts(params);
+}
+
+export async function fetchProduct(id) {
+  const snapshot = await fetchSnapshot(`products/${encodeURIComponent(id)}.json`);
+  if (snapshot) return snapshot;
+
+  const response = await fetch(`${BACKEND_URL}/api/products/${id}`);
+  if (!response.ok) throw new Error('Product not found');
+  return response.json();
+}
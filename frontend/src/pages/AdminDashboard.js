@@ -7,6 +7,7 @@ import { Button } from '@/components/ui/button';
 import { Input } from '@/components/ui/input';
 import { Label } from '@/components/ui/label';
 import { Textarea } from '@/components/ui/textarea';
+import { fetchAllProducts } from '@/lib/products';
 
 const BACKEND_URL = process.env.REACT_APP_BACKEND_URL;
 
@@ -34,9 +35,7 @@ function AdminDashboard() {
 
   const fetchProducts = async () => {
     try {
-      const response = await fetch(`${BACKEND_URL}/api/products`);
-      if (!response.ok) throw new Error('Failed to fetch products');
-      const data = await response.json();
+      const data = await fetchAllProducts();
       setProducts(data);
     } catch (error) {
       console.error('Error fetching products:', error);
@@ -151,15 +150,26 @@ function AdminDashboard() {
         ? `${BACKEND_URL}/api/products/${editingProduct.product_id}`
         : `${BACKEND_URL}/api/products`;
 
+      const headers = {
+        'Content-Type': 'application/json'
+      };
+      // Refuse to overwrite changes made since this product was loaded
+      if (editingProduct?.version) {
+        headers['If-Match'] = `"v${editingProduct.version}"`;
+      }
+
       const response = await fetch(url, {
         method: editingProduct ? 'PUT' : 'POST',
-        headers: {
-          'Content-Type': 'application/json'
-        },
+        headers,
         credentials: 'include',
         body: JSON.stringify(productData)
       });
 
+      if (response.status === 412) {
+        toast.error('Este produto foi alterado por outra pessoa. Recarregue e tente novamente.');
+        fetchProducts();
+        return;
+      }
       if (!response.ok) throw new Error('Failed to save product');
 
       toast.success(editingProduct ? 'Produto atualizado!' : 'Produto criado!');
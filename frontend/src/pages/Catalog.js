@@ -3,8 +3,13 @@ import { motion } from 'framer-motion';
 import Navbar from '@/components/Navbar';
 import Footer from '@/components/Footer';
 import ProductCard from '@/components/ProductCard';
+import { fetchCatalogProducts } from '@/lib/products';
 
-const BACKEND_URL = process.env.REACT_APP_BACKEND_URL;
+// Only what ProductCard renders
+const GRID_FIELDS = {
+  fields: 'name,description,price,colors,images,image_variants',
+  max_images: '1',
+};
 
 function Catalog() {
   const [products, setProducts] = useState([]);
@@ -14,9 +19,7 @@ function Catalog() {
   useEffect(() => {
     const fetchProducts = async () => {
       try {
-        const response = await fetch(`${BACKEND_URL}/api/products`);
-        if (!response.ok) throw new Error('Failed to fetch products');
-        const data = await response.json();
+        const data = await fetchCatalogProducts(GRID_FIELDS);
         setProducts(data);
       } catch (err) {
         console.error('Error fetching products:', err);
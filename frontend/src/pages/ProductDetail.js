@@ -5,8 +5,8 @@ import { ChevronLeft, ChevronRight, X } from 'lucide-react';
 import Navbar from '@/components/Navbar';
 import Footer from '@/components/Footer';
 import { toast } from 'sonner';
+import { fetchProduct } from '@/lib/products';
 
-const BACKEND_URL = process.env.REACT_APP_BACKEND_URL;
 const WHATSAPP_NUMBER = '5528999205102';
 
 function ProductDetail() {
@@ -21,11 +21,9 @@ function ProductDetail() {
   const [isGalleryOpen, setIsGalleryOpen] = useState(false);
 
   useEffect(() => {
-    const fetchProduct = async () => {
+    const loadProduct = async () => {
       try {
-        const response = await fetch(`${BACKEND_URL}/api/products/${id}`);
-        if (!response.ok) throw new Error('Product not found');
-        const data = await response.json();
+        const data = await fetchProduct(id);
         setProduct(data);
         if (data.sizes.length > 0) setSelectedSize(data.sizes[0]);
         if (data.colors.length > 0) setSelectedColor(data.colors[0]);
@@ -37,7 +35,7 @@ function ProductDetail() {
       }
     };
 
-    fetchProduct();
+    loadProduct();
   }, [id]);
 
   const handleWhatsAppOrder = () => {
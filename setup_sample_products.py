@@ -74,8 +74,8 @@ def create_admin_session():
         session_doc = {
             "user_id": user_id,
             "session_token": session_token,
-            "expires_at": expires_at.isoformat(),
-            "created_at": datetime.now(timezone.utc).isoformat()
+            "expires_at": expires_at,
+            "created_at": datetime.now(timezone.utc)
         }
         db.user_sessions.insert_one(session_doc)
         
@@ -102,24 +102,27 @@ def add_sample_products():
     
     print(f"\n🛍️ Adding {len(SAMPLE_PRODUCTS)} sample products...")
     
-    for i, product in enumerate(SAMPLE_PRODUCTS, 1):
-        try:
-            response = requests.post(
-                f"{base_url}/api/products",
-                json=product,
-                headers=headers,
-                timeout=10
-            )
-            
-            if response.status_code == 200:
-                product_data = response.json()
-                print(f"✅ {i}. Added: {product['name']} (ID: {product_data.get('product_id')})")
-            else:
-                print(f"❌ {i}. Failed to add: {product['name']} - Status: {response.status_code}")
-                print(f"   Response: {response.text[:200]}")
-                
-        except Exception as e:
-            print(f"❌ {i}. Error adding {product['name']}: {e}")
+    # One NDJSON request instead of a POST per product
+    body = "\n".join(json.dumps(product) for product in SAMPLE_PRODUCTS)
+    try:
+        response = requests.post(
+            f"{base_url}/api/products/bulk",
+            data=body.encode("utf-8"),
+            headers={**headers, 'Content-Type': 'application/x-ndjson'},
+            timeout=60
+        )
+
+        if response.status_code == 200:
+            summary = response.json()
+            print(f"✅ Added {summary['created']} products, updated {summary['updated']}")
+            for error in summary["errors"]:
+                print(f"❌ Line {error['line']}: {error['error']}")
+        else:
+            print(f"❌ Bulk import failed - Status: {response.status_code}")
+            print(f"   Response: {response.text[:200]}")
+
+    except Exception as e:
+        print(f"❌ Error importing products: {e}")
     
     # Clean up admin session
     try:
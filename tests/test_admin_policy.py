@@ -0,0 +1,78 @@
+import asyncio
+
+import pytest
+
+from admin_policy import (
+    PRODUCTS_BULK,
+    PRODUCTS_WRITE,
+    STORAGE_MANAGE,
+    AdminPolicy,
+    PolicyError,
+    PolicyStore,
+    parse_rules,
+)
+
+
+def test_parse_rules():
+    assert list(parse_rules("a@x.com, *@shop.com=editor,, b@x.com=owner")) == [
+        ("a@x.com", "owner"),
+        (" *@shop.com", "editor"),
+        (" b@x.com", "owner"),
+    ]
+
+
+def test_roles_and_wildcards():
+    policy = AdminPolicy(parse_rules("Boss@X.com,*@shop.com=editor"))
+    assert policy.role("boss@x.com") == "owner"
+    assert policy.allows(" BOSS@x.com ", STORAGE_MANAGE)
+    assert policy.role("anyone@shop.com") == "editor"
+    assert policy.allows("anyone@shop.com", PRODUCTS_WRITE)
+    assert not policy.allows("anyone@shop.com", PRODUCTS_BULK)
+    assert not policy.is_admin("someone@else.com")
+    assert not policy.is_admin("anyone@sub.shop.com")
+    assert len(policy) == 2
+
+
+def test_exact_email_overrides_domain():
+    policy = AdminPolicy(parse_rules("*@shop.com=editor,boss@shop.com"))
+    assert policy.role("boss@shop.com") == "owner"
+
+
+def test_duplicate_entries_get_union():
+    policy = AdminPolicy([("a@x.com", "editor"), ("a@x.com", "owner")])
+    assert policy.role("a@x.com") == "owner"
+
+
+@pytest.mark.parametrize("rules", [
+    [("a@x.com", "superuser")],
+    [("not-an-email", "owner")],
+    [("@x.com", "owner")],
+    [("a@", "owner")],
+])
+def test_invalid_rules(rules):
+    with pytest.raises(PolicyError):
+        AdminPolicy(rules)
+
+
+def test_memo_is_bounded(monkeypatch):
+    monkeypatch.setattr("admin_policy.MEMO_LIMIT", 3)
+    policy = AdminPolicy([("a@x.com", "owner")])
+    for i in range(10):
+        policy.permissions(f"user{i}@x.com")
+    assert len(policy._memo) <= 3
+    assert policy.is_admin("a@x.com")
+
+
+def test_store_keeps_policy_on_bad_reload(monkeypatch):
+    monkeypatch.setenv("ADMIN_EMAILS", "a@x.com")
+    store = PolicyStore([])
+    assert store.policy.is_admin("a@x.com")
+
+    monkeypatch.setenv("ADMIN_EMAILS", "b@x.com=superuser")
+    assert asyncio.run(store.reload()) is False
+    assert store.policy.is_admin("a@x.com")
+
+    monkeypatch.setenv("ADMIN_EMAILS", "b@x.com=editor")
+    assert asyncio.run(store.reload()) is True
+    assert store.policy.role("b@x.com") == "editor"
+    assert not store.policy.is_admin("a@x.com")
@@ -0,0 +1,146 @@
+import asyncio
+from types import SimpleNamespace
+
+import httpx
+import pytest
+
+import auth_provider
+from auth_provider import AuthProviderClient, AuthProviderError, CircuitBreaker, CircuitOpenError
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    # Only the breaker's clock: asyncio keeps the real time.monotonic
+    monkeypatch.setattr(auth_provider, "time", SimpleNamespace(monotonic=clock))
+    return clock
+
+
+def test_breaker_opens_after_threshold(clock):
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=30)
+    breaker.record_failure()
+    assert breaker.state == "closed"
+    breaker.record_failure()
+    assert breaker.state == "open"
+    assert not breaker.allow()
+
+
+def test_breaker_half_open_allows_one_trial(clock):
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=30)
+    breaker.record_failure()
+    clock.now += 30
+    assert breaker.state == "half-open"
+    assert breaker.allow()
+    assert not breaker.allow()
+    # Trial failed: open for another reset_timeout
+    breaker.record_failure()
+    assert breaker.state == "open"
+    clock.now += 30
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.state == "closed"
+    assert breaker.allow() and breaker.allow()
+
+
+def test_breaker_release_frees_the_trial(clock):
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=30)
+    breaker.record_failure()
+    clock.now += 30
+    assert breaker.allow()
+    breaker.release()
+    assert breaker.state == "half-open"
+    assert breaker.allow()
+
+
+def make_client(handler, **kwargs) -> AuthProviderClient:
+    client = AuthProviderClient(session_url="https://auth.example/session", backoff_base=0, **kwargs)
+    client._client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    return client
+
+
+def test_fetch_session_success():
+    def handler(request):
+        assert request.headers["x-session-id"] == "sid"
+        return httpx.Response(200, json={"email": "a@x.com"})
+
+    assert asyncio.run(make_client(handler).fetch_session("sid")) == {"email": "a@x.com"}
+
+
+def test_fetch_session_retries_transient_errors():
+    calls = []
+
+    def handler(request):
+        calls.append(1)
+        if len(calls) < 3:
+            return httpx.Response(503)
+        return httpx.Response(200, json={"ok": True})
+
+    client = make_client(handler, max_retries=2)
+    assert asyncio.run(client.fetch_session("sid")) == {"ok": True}
+    assert (len(calls), client.breaker.failures) == (3, 0)
+
+
+def test_fetch_session_gives_up_and_counts_a_failure():
+    def handler(request):
+        raise httpx.ConnectError("refused")
+
+    client = make_client(handler, max_retries=1)
+    with pytest.raises(AuthProviderError, match="ConnectError"):
+        asyncio.run(client.fetch_session("sid"))
+    assert client.breaker.failures == 1
+
+
+@pytest.mark.parametrize("response", [httpx.Response(401), httpx.Response(200, content=b"not json")])
+def test_bad_session_is_not_a_provider_failure(response):
+    client = make_client(lambda request: response)
+    client.breaker.failures = 3
+    with pytest.raises(AuthProviderError):
+        asyncio.run(client.fetch_session("sid"))
+    assert client.breaker.failures == 0
+
+
+def test_open_circuit_fails_fast(clock):
+    calls = []
+
+    def handler(request):
+        calls.append(1)
+        return httpx.Response(500)
+
+    client = make_client(handler, max_retries=0, breaker=CircuitBreaker(failure_threshold=1))
+    with pytest.raises(AuthProviderError):
+        asyncio.run(client.fetch_session("sid"))
+    with pytest.raises(CircuitOpenError):
+        asyncio.run(client.fetch_session("sid"))
+    assert len(calls) == 1
+
+
+def test_cancelled_trial_is_released(clock):
+    async def handler(request):
+        await asyncio.sleep(3600)
+
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=30)
+    breaker.record_failure()
+    clock.now += 30
+    client = make_client(handler, breaker=breaker)
+
+    async def scenario():
+        task = asyncio.create_task(client.fetch_session("sid"))
+        await asyncio.sleep(0.01)
+        # The trial is in flight: nobody else gets through
+        assert not breaker.allow()
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(scenario())
+    # No verdict recorded, and the next login may try again
+    assert breaker.state == "half-open"
+    assert breaker.allow()
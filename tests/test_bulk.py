@@ -0,0 +1,49 @@
+import asyncio
+
+import pytest
+
+from bulk import LineTooLong, iter_ndjson_lines
+
+
+async def _chunks(*chunks):
+    for chunk in chunks:
+        yield chunk
+
+
+def split(*chunks, max_line_bytes=1024):
+    async def collect():
+        return [item async for item in iter_ndjson_lines(_chunks(*chunks), max_line_bytes)]
+    return asyncio.run(collect())
+
+
+def test_lines_across_chunks():
+    assert split(b'{"a":', b'1}\n{"b"', b":2}\n", b'{"c":3}') == [
+        (1, b'{"a":1}'),
+        (2, b'{"b":2}'),
+        (3, b'{"c":3}'),
+    ]
+
+
+def test_blank_lines_are_skipped_but_counted():
+    assert split(b"x\n\n  \ny\n") == [(1, b"x"), (4, b"y")]
+
+
+def test_many_lines_in_one_chunk():
+    lines = [b"%d" % i for i in range(1000)]
+    assert split(b"\n".join(lines) + b"\n") == list(enumerate(lines, 1))
+
+
+def test_byte_at_a_time():
+    data = b"ab\ncd\n"
+    assert split(*(data[i:i + 1] for i in range(len(data)))) == [(1, b"ab"), (2, b"cd")]
+
+
+def test_line_too_long():
+    with pytest.raises(LineTooLong) as exc:
+        split(b"ok\n", b"x" * 10, b"x" * 10, max_line_bytes=16)
+    assert exc.value.line_no == 2
+
+
+def test_long_line_within_limit():
+    line = b"x" * 5000
+    assert split(*([line[i:i + 100] for i in range(0, 5000, 100)] + [b"\n"]), max_line_bytes=5000) == [(1, line)]
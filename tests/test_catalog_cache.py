@@ -0,0 +1,91 @@
+import pytest
+
+import catalog_cache
+from catalog_cache import CachedBody, CatalogCache, etag_matches, make_etag
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(catalog_cache.time, "monotonic", clock)
+    return clock
+
+
+def test_lru_by_count(clock):
+    cache = CatalogCache(max_entries=2)
+    cache.put("a", CachedBody(b"a"))
+    cache.put("b", CachedBody(b"b"))
+    assert cache.get("a") is not None
+    cache.put("c", CachedBody(b"c"))
+    assert cache.get("b") is None
+    assert (cache.get("a").body, cache.get("c").body) == (b"a", b"c")
+
+
+def test_lru_by_bytes(clock):
+    cache = CatalogCache(max_bytes=10)
+    cache.put("a", CachedBody(b"x" * 6))
+    cache.put("b", CachedBody(b"x" * 6))
+    assert (cache.get("a"), len(cache)) == (None, 1)
+    # Bigger than the whole cache: not stored at all
+    cache.put("huge", CachedBody(b"x" * 11))
+    assert cache.get("huge") is None
+    assert cache.get("b") is not None
+
+
+def test_replacing_a_key_keeps_byte_count(clock):
+    cache = CatalogCache(max_bytes=10)
+    cache.put("a", CachedBody(b"x" * 6))
+    cache.put("a", CachedBody(b"x" * 6))
+    cache.put("b", CachedBody(b"x" * 4))
+    assert len(cache) == 2
+
+
+def test_ttl(clock):
+    cache = CatalogCache(ttl=60)
+    cache.put("a", CachedBody(b"a"))
+    clock.now += 59
+    assert cache.get("a") is not None
+    clock.now += 1
+    assert cache.get("a") is None
+    assert len(cache) == 0
+
+
+def test_version_guard(clock):
+    cache = CatalogCache()
+    version = cache.version
+    cache.put("a", CachedBody(b"old"))
+    cache.invalidate()
+    assert cache.get("a") is None
+    # Read before the write that invalidated: not cached
+    cache.put("b", CachedBody(b"stale"), version)
+    assert cache.get("b") is None
+    cache.put("b", CachedBody(b"fresh"), cache.version)
+    assert cache.get("b").body == b"fresh"
+
+
+def test_etag():
+    entry = CachedBody(b"body")
+    assert entry.etag == make_etag(b"body")
+    assert entry.etag != make_etag(b"other")
+    assert entry.encoded("gzip") is entry.encoded("gzip")
+
+
+@pytest.mark.parametrize("header, expected", [
+    (None, False),
+    ("", False),
+    ("*", True),
+    ('"abc"', True),
+    ('W/"abc"', True),
+    ('"x", "abc"', True),
+    ('"abcd"', False),
+])
+def test_etag_matches(header, expected):
+    assert etag_matches(header, '"abc"') is expected
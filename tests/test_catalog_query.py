@@ -0,0 +1,36 @@
+import base64
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from catalog_query import decode_cursor, encode_cursor
+
+
+def test_cursor_round_trip():
+    created_at = datetime(2024, 5, 1, 12, 30, 15, 123000, tzinfo=timezone.utc)
+    cursor = encode_cursor({"created_at": created_at, "product_id": "prod_abc"})
+    assert "=" not in cursor
+    assert decode_cursor(cursor) == (created_at, "prod_abc")
+
+
+def test_cursor_keeps_offset():
+    created_at = datetime(2024, 5, 1, 12, 0, tzinfo=timezone(timedelta(hours=2)))
+    decoded, _ = decode_cursor(encode_cursor({"created_at": created_at, "product_id": "p"}))
+    assert decoded == created_at
+
+
+def test_naive_cursor_is_utc():
+    raw = base64.urlsafe_b64encode(b'["2024-05-01T12:00:00","p"]').decode()
+    assert decode_cursor(raw)[0] == datetime(2024, 5, 1, 12, 0, tzinfo=timezone.utc)
+
+
+@pytest.mark.parametrize("cursor", [
+    "",
+    "not a cursor",
+    base64.urlsafe_b64encode(b'["2024-05-01T12:00:00"]').decode(),
+    base64.urlsafe_b64encode(b'["yesterday","p"]').decode(),
+    base64.urlsafe_b64encode(b'["2024-05-01T12:00:00",42]').decode(),
+])
+def test_invalid_cursor(cursor):
+    with pytest.raises(ValueError):
+        decode_cursor(cursor)
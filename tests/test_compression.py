@@ -0,0 +1,130 @@
+import gzip
+
+import brotli
+import pytest
+from starlette.applications import Starlette
+from starlette.responses import Response, StreamingResponse
+from starlette.routing import Route
+from starlette.testclient import TestClient
+
+import compression
+from compression import CompressionMiddleware, choose_encoding, coded_etag, compress
+
+
+@pytest.mark.parametrize("header, expected", [
+    (None, None),
+    ("", None),
+    ("identity", None),
+    ("gzip", "gzip"),
+    ("gzip, deflate, br", "br"),
+    ("br;q=0.5, gzip", "gzip"),
+    ("br;q=0, gzip;q=0", None),
+    ("GZIP", "gzip"),
+    ("*", "br"),
+    ("*;q=0.1, gzip;q=0.5", "gzip"),
+    ("br;q=oops, gzip;q=0.1", "gzip"),
+])
+def test_choose_encoding(header, expected):
+    assert choose_encoding(header) == expected
+
+
+def test_choose_encoding_without_brotli(monkeypatch):
+    monkeypatch.setattr(compression, "brotli", None)
+    assert choose_encoding("br, gzip") == "gzip"
+    assert choose_encoding("br") is None
+
+
+@pytest.mark.parametrize("etag, encoding, expected", [
+    ('"abc"', "gzip", '"abc-gzip"'),
+    ('"abc"', "br", '"abc-br"'),
+    ('"abc"', None, '"abc"'),
+    ('W/"abc"', "gzip", 'W/"abc"'),
+    ("abc", "gzip", "abc"),
+])
+def test_coded_etag(etag, encoding, expected):
+    assert coded_etag(etag, encoding) == expected
+
+
+def test_compress_is_deterministic():
+    body = b'{"products": []}' * 100
+    assert compress(body, "gzip") == compress(body, "gzip")
+    assert gzip.decompress(compress(body, "gzip")) == body
+    assert brotli.decompress(compress(body, "br")) == body
+
+
+BIG = b'{"name": "Bolsa"}' * 200
+
+
+async def json_route(request):
+    return Response(BIG, media_type="application/json", headers={"ETag": '"v1"'})
+
+
+async def small_route(request):
+    return Response(b"{}", media_type="application/json")
+
+
+async def image_route(request):
+    return Response(BIG, media_type="image/png")
+
+
+async def encoded_route(request):
+    return Response(compress(BIG, "gzip"), media_type="application/json", headers={"Content-Encoding": "gzip"})
+
+
+async def stream_route(request):
+    async def lines():
+        for i in range(3):
+            yield b'{"line": %d}\n' % i
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+
+@pytest.fixture
+def api():
+    app = Starlette(routes=[
+        Route("/json", json_route),
+        Route("/small", small_route),
+        Route("/image", image_route),
+        Route("/encoded", encoded_route),
+        Route("/stream", stream_route),
+    ])
+    return TestClient(CompressionMiddleware(app, minimum_size=1024))
+
+
+def test_middleware_compresses_json(api):
+    response = api.get("/json", headers={"Accept-Encoding": "gzip"})
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.headers["etag"] == '"v1-gzip"'
+    assert "Accept-Encoding" in response.headers["vary"]
+    assert response.content == BIG
+
+
+def test_middleware_brotli(api):
+    response = api.get("/json", headers={"Accept-Encoding": "br"})
+    assert response.headers["content-encoding"] == "br"
+    assert response.headers["etag"] == '"v1-br"'
+
+
+def test_middleware_streams(api):
+    response = api.get("/stream", headers={"Accept-Encoding": "gzip"})
+    assert response.headers["content-encoding"] == "gzip"
+    assert "content-length" not in response.headers
+    assert response.content == b'{"line": 0}\n{"line": 1}\n{"line": 2}\n'
+
+
+@pytest.mark.parametrize("path, encoding, body", [
+    ("/small", None, b"{}"),
+    ("/image", None, BIG),
+    # Already encoded by the app: not compressed again
+    ("/encoded", "gzip", BIG),
+])
+def test_middleware_passes_through(api, path, encoding, body):
+    response = api.get(path, headers={"Accept-Encoding": "br"})
+    assert response.headers.get("content-encoding") == encoding
+    assert response.content == body
+
+
+def test_middleware_without_accept_encoding(api):
+    response = api.get("/json", headers={"Accept-Encoding": "identity"})
+    assert "content-encoding" not in response.headers
+    assert response.headers["etag"] == '"v1"'
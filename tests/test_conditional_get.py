@@ -0,0 +1,90 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime
+
+import pytest
+from fastapi.testclient import TestClient
+from mongomock_motor import AsyncMongoMockClient
+
+import server
+
+CREATED = datetime(2024, 1, 1, tzinfo=timezone.utc)
+
+
+def product(n, updated_at):
+    return {
+        "product_id": f"prod_{n:03d}",
+        "name": f"Product {n}",
+        "description": "Crochet",
+        "price": 10.0 + n,
+        "sizes": ["M"],
+        "colors": ["red"],
+        "images": [],
+        "created_at": CREATED + timedelta(minutes=n),
+        "updated_at": updated_at,
+        "version": 1,
+    }
+
+
+@pytest.fixture
+def api(monkeypatch):
+    monkeypatch.setattr(server, "db", AsyncMongoMockClient(tz_aware=True).test)
+    server.catalog_cache.invalidate()
+    return TestClient(server.app)
+
+
+def seed(*products):
+    asyncio.run(server.db.products.insert_many(list(products)))
+
+
+def http_date(value):
+    return format_datetime(value, usegmt=True)
+
+
+def test_list_sends_newest_updated_at(api):
+    newest = datetime(2024, 3, 5, 12, 0, 0, tzinfo=timezone.utc)
+    seed(product(1, newest - timedelta(days=1)), product(2, newest), product(3, newest - timedelta(days=2)))
+    response = api.get("/api/products")
+    assert response.status_code == 200
+    assert response.headers["last-modified"] == http_date(newest)
+    assert response.headers["etag"]
+
+
+def test_list_last_modified_with_fields(api):
+    updated = datetime(2024, 3, 5, tzinfo=timezone.utc)
+    seed(product(1, updated))
+    response = api.get("/api/products", params={"fields": "name"})
+    assert response.headers["last-modified"] == http_date(updated)
+    # Fetched for the header, not sent
+    assert response.json() == [{"product_id": "prod_001", "created_at": "2024-01-01T00:01:00Z", "name": "Product 1"}]
+
+
+def test_list_if_none_match(api):
+    seed(product(1, CREATED))
+    etag = api.get("/api/products").headers["etag"]
+    response = api.get("/api/products", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.headers["etag"] == etag
+    assert response.content == b""
+    assert api.get("/api/products", headers={"If-None-Match": '"other"'}).status_code == 200
+
+
+def test_list_if_modified_since(api):
+    updated = datetime(2024, 3, 5, tzinfo=timezone.utc)
+    seed(product(1, updated))
+    assert api.get("/api/products", headers={"If-Modified-Since": http_date(updated)}).status_code == 304
+    earlier = http_date(updated - timedelta(seconds=1))
+    assert api.get("/api/products", headers={"If-Modified-Since": earlier}).status_code == 200
+    # If-None-Match wins when both are sent
+    both = {"If-None-Match": '"other"', "If-Modified-Since": http_date(updated)}
+    assert api.get("/api/products", headers=both).status_code == 200
+
+
+def test_detail_conditional_get(api):
+    updated = datetime(2024, 3, 5, tzinfo=timezone.utc)
+    seed(product(1, updated))
+    response = api.get("/api/products/prod_001")
+    assert response.headers["last-modified"] == http_date(updated)
+    assert response.headers["etag"].startswith('"v1.')
+    assert api.get("/api/products/prod_001", headers={"If-None-Match": response.headers["etag"]}).status_code == 304
+    assert api.get("/api/products/prod_001", headers={"If-Modified-Since": http_date(updated)}).status_code == 304
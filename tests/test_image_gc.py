@@ -0,0 +1,189 @@
+import asyncio
+import os
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from mongomock_motor import AsyncMongoMockClient, enabled_gridfs_integration
+
+import image_gc
+from image_gc import mark, storage_report, sweep
+from image_store import GridFSBlobStore, LocalBlobStore
+
+GRACE = 3600
+OLD = datetime.now(timezone.utc) - timedelta(days=2)
+
+
+class Setup:
+    def __init__(self, loop, db, store, age):
+        self.loop = loop
+        self.db = db
+        self.store = store
+        # Make a blob look stored two days ago
+        self.age = age
+
+    def run(self, coro):
+        return self.loop.run_until_complete(coro)
+
+    async def blob(self, data: bytes, old: bool = True) -> str:
+        digest = await self.store.put(data)
+        if old:
+            await self.age(digest)
+        return digest
+
+    async def product(self, product_id, *digests):
+        await self.db.products.insert_one({"product_id": product_id, "images": [f"/api/images/{d}" for d in digests]})
+
+    async def stored(self):
+        return {blob.digest async for blob in self.store.iter_blobs()}
+
+
+@pytest.fixture(params=["local", "gridfs"])
+def setup(request, tmp_path):
+    # Motor's GridFS bucket wants a current loop when it is created
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    db = AsyncMongoMockClient(tz_aware=True).test
+    if request.param == "local":
+        store = LocalBlobStore(tmp_path)
+
+        async def age(digest):
+            os.utime(store._path(digest), (OLD.timestamp(), OLD.timestamp()))
+
+        yield Setup(loop, db, store, age)
+    else:
+        with enabled_gridfs_integration():
+            store = GridFSBlobStore(db)
+
+            async def age(digest):
+                await store.files.update_many({"filename": digest}, {"$set": {"uploadDate": OLD}})
+
+            yield Setup(loop, db, store, age)
+    asyncio.set_event_loop(None)
+    loop.close()
+
+
+def test_mark(setup):
+    async def scenario():
+        await setup.product("p1", "a" * 64, "b" * 64)
+        await setup.db.products.insert_one({"product_id": "p2", "images": ["https://example.com/x.jpg"]})
+        await setup.db.image_variants.insert_one({"hash": "a" * 64, "variants": [{"hash": "c" * 64}]})
+        return await mark(setup.db)
+
+    live = setup.run(scenario())
+    assert live.products == {"p1": {"a" * 64, "b" * 64}, "p2": set()}
+    assert live.derivatives == {"a" * 64: ["c" * 64]}
+    assert live.digests == {"a" * 64, "b" * 64, "c" * 64}
+
+
+def test_sweep(setup):
+    async def scenario():
+        used = await setup.blob(b"used")
+        variant = await setup.blob(b"variant")
+        orphan = await setup.blob(b"orphan")
+        fresh = await setup.blob(b"fresh", old=False)
+        await setup.product("p1", used)
+        await setup.db.image_variants.insert_many([
+            {"hash": used, "variants": [{"hash": variant}]},
+            {"hash": orphan, "variants": []},
+        ])
+        result = await sweep(setup.db, setup.store, grace=GRACE, batch_size=2)
+        manifests = [m["hash"] async for m in setup.db.image_variants.find()]
+        return result, await setup.stored(), manifests, (used, variant, orphan, fresh)
+
+    result, stored, manifests, (used, variant, orphan, fresh) = setup.run(scenario())
+    assert result.as_dict() == {"scanned": 4, "deleted": 1, "reclaimed_bytes": len(b"orphan"), "manifests_deleted": 1}
+    assert stored == {used, variant, fresh}
+    assert manifests == [used]
+
+
+def test_dry_run_deletes_nothing(setup):
+    async def scenario():
+        orphan = await setup.blob(b"orphan")
+        result = await sweep(setup.db, setup.store, grace=GRACE, dry_run=True)
+        return result, await setup.stored(), orphan
+
+    result, stored, orphan = setup.run(scenario())
+    assert (result.deleted, result.reclaimed_bytes) == (1, len(b"orphan"))
+    assert stored == {orphan}
+
+
+def test_referenced_during_sweep(setup, monkeypatch):
+    marks = []
+
+    async def marking(db, batch_size=image_gc.BATCH_SIZE):
+        marks.append(1)
+        if len(marks) == 2:
+            await setup.product("p1", orphan)
+        return await mark(db, batch_size)
+
+    monkeypatch.setattr(image_gc, "mark", marking)
+
+    async def scenario():
+        nonlocal orphan
+        orphan = await setup.blob(b"orphan")
+        return await sweep(setup.db, setup.store, grace=GRACE), await setup.stored()
+
+    orphan = None
+    result, stored = setup.run(scenario())
+    assert result.deleted == 0
+    assert stored == {orphan}
+
+
+def test_uploaded_again_during_sweep(setup, monkeypatch):
+    marks = []
+
+    async def marking(db, batch_size=image_gc.BATCH_SIZE):
+        # After the scan picked it as a candidate: uploaded again, and the
+        # product referencing it only saved after the re-mark
+        marks.append(1)
+        if len(marks) == 2:
+            await setup.store.put(b"orphan")
+        return await mark(db, batch_size)
+
+    monkeypatch.setattr(image_gc, "mark", marking)
+
+    async def scenario():
+        orphan = await setup.blob(b"orphan")
+        await setup.db.image_variants.insert_one({"hash": orphan, "variants": []})
+        result = await sweep(setup.db, setup.store, grace=GRACE)
+        return result, await setup.stored(), await setup.db.image_variants.count_documents({}), orphan
+
+    result, stored, manifests, orphan = setup.run(scenario())
+    assert (result.deleted, result.reclaimed_bytes, result.manifests_deleted) == (0, 0, 0)
+    assert stored == {orphan}
+    assert manifests == 1
+
+
+def test_conditional_delete(setup):
+    async def scenario():
+        digest = await setup.blob(b"blob")
+        cutoff = datetime.now(timezone.utc) - timedelta(seconds=GRACE)
+        await setup.store.put(b"blob")
+        kept = await setup.store.delete(digest, older_than=cutoff)
+        exists = await setup.store.exists(digest)
+        await setup.age(digest)
+        deleted = await setup.store.delete(digest, older_than=cutoff)
+        return kept, exists, deleted, await setup.store.exists(digest), await setup.store.delete(digest)
+
+    assert setup.run(scenario()) == (False, True, True, False, False)
+
+
+def test_storage_report(setup):
+    async def scenario():
+        used = await setup.blob(b"used")
+        variant = await setup.blob(b"variant!")
+        await setup.blob(b"orphan")
+        await setup.blob(b"new", old=False)
+        await setup.product("p1", used, "d" * 64)
+        await setup.db.image_variants.insert_one({"hash": used, "variants": [{"hash": variant}]})
+        return await storage_report(setup.db, setup.store, grace=GRACE)
+
+    report = setup.run(scenario())
+    assert {k: report[k] for k in ("blobs", "bytes", "referenced_bytes", "reclaimable_bytes", "in_grace_bytes")} == {
+        "blobs": 4,
+        "bytes": 4 + 8 + 6 + 3,
+        "referenced_bytes": 12,
+        "reclaimable_bytes": 6,
+        "in_grace_bytes": 3,
+    }
+    assert report["products"] == [{"product_id": "p1", "images": 2, "bytes": 12, "missing": ["d" * 64]}]
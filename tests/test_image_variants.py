@@ -0,0 +1,98 @@
+import asyncio
+import io
+
+import pytest
+from PIL import Image
+
+import image_variants
+from image_variants import build_srcsets, generate_variants, render_variants, shutdown_pool
+
+
+def encode(image, fmt="JPEG", **options):
+    buf = io.BytesIO()
+    image.save(buf, fmt, **options)
+    return buf.getvalue()
+
+
+def sizes(result):
+    return [(v["width"], v["format"], Image.open(io.BytesIO(v["data"])).size) for v in result["variants"]]
+
+
+def test_every_width_and_format():
+    result = render_variants(encode(Image.new("RGB", (2000, 1000), "red")))
+    assert (result["width"], result["height"]) == (2000, 1000)
+    assert sizes(result) == [
+        (320, "webp", (320, 160)),
+        (320, "jpeg", (320, 160)),
+        (640, "webp", (640, 320)),
+        (640, "jpeg", (640, 320)),
+        (1280, "webp", (1280, 640)),
+        (1280, "jpeg", (1280, 640)),
+    ]
+    assert [Image.open(io.BytesIO(v["data"])).format for v in result["variants"][:2]] == ["WEBP", "JPEG"]
+
+
+def test_small_image_is_not_upscaled():
+    result = render_variants(encode(Image.new("RGB", (200, 100), "red"), "PNG"))
+    assert sizes(result) == [(200, "webp", (200, 100)), (200, "jpeg", (200, 100))]
+
+
+def test_exif_rotation():
+    image = Image.new("RGB", (1600, 1200), "blue")
+    exif = image.getexif()
+    exif[0x0112] = 6  # rotate 90 degrees
+    result = render_variants(encode(image, exif=exif))
+    assert (result["width"], result["height"]) == (1200, 1600)
+    # Decoded in draft mode, still rendered from enough pixels
+    assert sizes(result)[-1] == (640, "jpeg", (640, 853))
+
+
+def test_alpha_kept_in_webp_and_flattened_in_jpeg():
+    result = render_variants(encode(Image.new("RGBA", (400, 400), (0, 0, 0, 0)), "PNG"))
+    webp, jpeg = (Image.open(io.BytesIO(v["data"])) for v in result["variants"][:2])
+    assert webp.mode == "RGBA"
+    assert jpeg.mode == "RGB"
+    assert jpeg.getpixel((10, 10)) == pytest.approx((255, 255, 255), abs=2)
+
+
+def test_path_source(tmp_path):
+    path = tmp_path / "photo.jpg"
+    path.write_bytes(encode(Image.new("RGB", (700, 700), "green")))
+    assert [v["width"] for v in render_variants(str(path))["variants"]] == [320, 320, 640, 640]
+
+
+@pytest.mark.filterwarnings("ignore::PIL.Image.DecompressionBombWarning")
+def test_pixel_cap(monkeypatch):
+    monkeypatch.setattr(image_variants, "MAX_SOURCE_PIXELS", 100 * 100)
+    with pytest.raises(ValueError, match="exceeds"):
+        render_variants(encode(Image.new("RGB", (101, 100))))
+    assert render_variants(encode(Image.new("RGB", (100, 100))))["width"] == 100
+
+
+@pytest.mark.parametrize("data", [b"", b"not an image", encode(Image.new("RGB", (50, 50)))[:40]])
+def test_invalid_image(data):
+    with pytest.raises(ValueError):
+        render_variants(data)
+
+
+def test_generate_in_pool():
+    async def scenario():
+        try:
+            return await generate_variants(encode(Image.new("RGB", (400, 300), "red")))
+        finally:
+            shutdown_pool()
+
+    result = asyncio.run(scenario())
+    assert [(v["width"], v["format"]) for v in result["variants"]] == [(320, "webp"), (320, "jpeg")]
+
+
+def test_srcsets():
+    variants = [
+        {"width": 640, "format": "webp", "hash": "b"},
+        {"width": 320, "format": "webp", "hash": "a"},
+        {"width": 320, "format": "jpeg", "hash": "c"},
+    ]
+    assert build_srcsets(variants, lambda digest: f"/api/images/{digest}") == {
+        "webp": "/api/images/a 320w, /api/images/b 640w",
+        "jpeg": "/api/images/c 320w",
+    }
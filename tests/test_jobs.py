@@ -0,0 +1,195 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from mongomock_motor import AsyncMongoMockClient
+
+from jobs import FAILED, JOBS_COLLECTION, QUEUED, RUNNING, SUCCEEDED, Job, JobFailed, JobQueue, UnknownJobKind
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+@pytest.fixture
+def queue():
+    queue = JobQueue(AsyncMongoMockClient().test, lease=60, max_attempts=2, backoff_base=0)
+
+    async def echo(job):
+        return {"echo": job.params.get("value")}
+
+    queue.register("echo", echo)
+    return queue
+
+
+async def _stored(queue, job_id):
+    return await queue.db[JOBS_COLLECTION].find_one({"job_id": job_id})
+
+
+async def _expire_lease(queue, job_id):
+    past = datetime.now(timezone.utc) - timedelta(seconds=1)
+    await queue.db[JOBS_COLLECTION].update_one({"job_id": job_id}, {"$set": {"lease_until": past}})
+
+
+def test_unknown_kind(queue):
+    with pytest.raises(UnknownJobKind):
+        run(queue.enqueue("nope"))
+
+
+def test_claim_and_run(queue):
+    async def scenario():
+        job = await queue.enqueue("echo", {"value": 3})
+        assert job["status"] == QUEUED
+        doc = await queue._claim()
+        assert (doc["job_id"], doc["status"], doc["attempts"]) == (job["job_id"], RUNNING, 1)
+        # Leased: nobody else gets it
+        assert await queue._claim() is None
+        await queue._run(Job(queue, doc), doc)
+        return await queue.get(job["job_id"])
+
+    done = run(scenario())
+    assert done["status"] == SUCCEEDED
+    assert done["result"] == {"echo": 3}
+
+
+def test_run_at_is_respected(queue):
+    async def scenario():
+        later = datetime.now(timezone.utc) + timedelta(hours=1)
+        await queue.enqueue("echo", run_at=later)
+        return await queue._claim()
+
+    assert run(scenario()) is None
+
+
+def test_idempotency_key(queue):
+    async def scenario():
+        first = await queue.enqueue("echo", idempotency_key="k")
+        second = await queue.enqueue("echo", {"value": 2}, idempotency_key="k")
+        count = await queue.db[JOBS_COLLECTION].count_documents({})
+        return first, second, count
+
+    first, second, count = run(scenario())
+    assert first["job_id"] == second["job_id"]
+    assert count == 1
+
+
+def test_retry_then_fail(queue):
+    async def flaky(job):
+        raise RuntimeError("boom")
+
+    queue.register("flaky", flaky)
+
+    async def scenario():
+        job = await queue.enqueue("flaky")
+        statuses = []
+        for _ in range(2):
+            doc = await queue._claim()
+            await queue._run(Job(queue, doc), doc)
+            stored = await _stored(queue, job["job_id"])
+            statuses.append((stored["status"], stored["attempts"], stored["error"]))
+        return statuses, await queue._claim()
+
+    statuses, leftover = run(scenario())
+    assert statuses == [(QUEUED, 1, "boom"), (FAILED, 2, "boom")]
+    assert leftover is None
+
+
+def test_job_failed_is_permanent(queue):
+    async def broken(job):
+        raise JobFailed("bad input")
+
+    queue.register("broken", broken)
+
+    async def scenario():
+        job = await queue.enqueue("broken")
+        doc = await queue._claim()
+        await queue._run(Job(queue, doc), doc)
+        return await _stored(queue, job["job_id"])
+
+    stored = run(scenario())
+    assert (stored["status"], stored["attempts"], stored["error"]) == (FAILED, 1, "bad input")
+
+
+def test_expired_lease_is_reclaimed(queue):
+    async def scenario():
+        job = await queue.enqueue("echo")
+        await queue._claim()
+        await _expire_lease(queue, job["job_id"])
+        return await queue._claim()
+
+    doc = run(scenario())
+    assert (doc["status"], doc["attempts"]) == (RUNNING, 2)
+
+
+def test_progress_renews_lease(queue):
+    async def scenario():
+        job = await queue.enqueue("echo")
+        doc = await queue._claim()
+        await _expire_lease(queue, job["job_id"])
+        await Job(queue, doc).progress(1, 10)
+        stored = await _stored(queue, job["job_id"])
+        return stored, await queue._claim()
+
+    stored, reclaimed = run(scenario())
+    assert stored["progress"] == {"done": 1, "total": 10}
+    assert reclaimed is None
+
+
+def test_last_attempt_lease_expiry_is_reaped(queue):
+    async def scenario():
+        job = await queue.enqueue("echo")
+        for _ in range(2):
+            await queue._claim()
+            await _expire_lease(queue, job["job_id"])
+        # Out of attempts: not claimed a third time, failed by the reaper
+        assert await queue._claim() is None
+        await queue._reap()
+        return await _stored(queue, job["job_id"])
+
+    stored = run(scenario())
+    assert (stored["status"], stored["attempts"]) == (FAILED, 2)
+    assert "Lease expired" in stored["error"]
+
+
+def test_failed_job_releases_idempotency_key(queue):
+    async def broken(job):
+        raise JobFailed("bad input")
+
+    queue.register("broken", broken)
+
+    async def scenario():
+        first = await queue.enqueue("broken", idempotency_key="variants:abc")
+        doc = await queue._claim()
+        await queue._run(Job(queue, doc), doc)
+        again = await queue.enqueue("broken", idempotency_key="variants:abc")
+        return first, again, await queue.get(first["job_id"])
+
+    first, again, failed = run(scenario())
+    assert again["job_id"] != first["job_id"]
+    assert again["status"] == QUEUED
+    assert failed["status"] == FAILED
+
+
+def test_reaped_job_releases_idempotency_key(queue):
+    async def scenario():
+        job = await queue.enqueue("echo", idempotency_key="k")
+        for _ in range(2):
+            await queue._claim()
+            await _expire_lease(queue, job["job_id"])
+        await queue._reap()
+        return job, await queue.enqueue("echo", idempotency_key="k")
+
+    job, again = run(scenario())
+    assert again["job_id"] != job["job_id"]
+
+
+def test_kind_without_handler_is_only_enqueued(queue):
+    queue.register("elsewhere")
+
+    async def scenario():
+        job = await queue.enqueue("elsewhere", {"value": 1})
+        return job, await queue._claim()
+
+    job, claimed = run(scenario())
+    assert job["status"] == QUEUED
+    assert claimed is None
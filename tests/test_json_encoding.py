@@ -0,0 +1,34 @@
+from datetime import datetime, timezone
+
+import orjson
+from bson.tz_util import utc
+
+from server import encode_products
+
+
+def product(created_at):
+    return {
+        "product_id": "prod_001",
+        "name": "Bolsa",
+        "description": "Crochê",
+        "price": 45.9,
+        "sizes": ["M"],
+        "colors": ["#FFFFFF"],
+        "images": ["https://example.com/i.jpg"],
+        "image_variants": {},
+        "created_at": created_at,
+        "updated_at": created_at,
+        "version": 2,
+    }
+
+
+def test_projected_and_full_paths_agree():
+    # Motor decodes BSON dates with bson's own utc tzinfo
+    products = [
+        product(datetime(2024, 1, 1, tzinfo=utc)),
+        product(datetime(2024, 1, 1, 0, 0, 0, 123000, tzinfo=timezone.utc)),
+    ]
+    full = encode_products(products)
+    projected = encode_products(products, validate=False)
+    assert full == projected
+    assert [p["created_at"] for p in orjson.loads(projected)] == ["2024-01-01T00:00:00Z", "2024-01-01T00:00:00.123000Z"]
@@ -0,0 +1,31 @@
+from fastapi.testclient import TestClient
+from mongomock_motor import AsyncMongoMockClient
+
+import server
+
+
+class RecordingClient:
+    """Stands in for the Motor client; notes what is still running when it is closed."""
+
+    def __init__(self):
+        self.running_at_close = None
+
+    def close(self):
+        self.running_at_close = {
+            "job_workers": [task for task in server.job_queue._tasks if not task.done()],
+            "cache_sync": server.cache_sync._task is not None and not server.cache_sync._task.done(),
+            "admin_policy": server.admin_policy._task is not None and not server.admin_policy._task.done(),
+        }
+
+
+def test_mongo_client_closes_after_background_tasks(monkeypatch, tmp_path):
+    monkeypatch.setenv("IMAGE_STORE_DIR", str(tmp_path))
+    monkeypatch.setattr(server, "db", AsyncMongoMockClient(tz_aware=True).test)
+    recording = RecordingClient()
+    monkeypatch.setattr(server, "client", recording)
+
+    with TestClient(server.app) as api:
+        assert api.get("/api/products").status_code == 200
+        assert server.job_queue._tasks
+
+    assert recording.running_at_close == {"job_workers": [], "cache_sync": False, "admin_policy": False}
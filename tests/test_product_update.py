@@ -0,0 +1,70 @@
+import pytest
+
+from product_update import ArrayOpError, apply_array_ops, parse_if_match, version_etag
+
+PRODUCT = {"images": ["a", "b", "c"], "sizes": ["S", "M"], "colors": None}
+
+
+def test_add_appends_or_inserts():
+    result = apply_array_ops(PRODUCT, [
+        {"field": "images", "op": "add", "value": "d"},
+        {"field": "images", "op": "add", "value": "z", "index": 0},
+    ])
+    assert result == {"images": ["z", "a", "b", "c", "d"]}
+
+
+def test_add_existing_is_noop():
+    assert apply_array_ops(PRODUCT, [{"field": "sizes", "op": "add", "value": "S"}]) == {"sizes": ["S", "M"]}
+
+
+def test_remove():
+    result = apply_array_ops(PRODUCT, [
+        {"field": "images", "op": "remove", "value": "b"},
+        {"field": "images", "op": "remove", "value": "missing"},
+    ])
+    assert result == {"images": ["a", "c"]}
+
+
+def test_move():
+    result = apply_array_ops(PRODUCT, [{"field": "images", "op": "move", "value": "c", "index": 0}])
+    assert result == {"images": ["c", "a", "b"]}
+
+
+def test_ops_on_missing_field():
+    assert apply_array_ops(PRODUCT, [{"field": "colors", "op": "add", "value": "red"}]) == {"colors": ["red"]}
+
+
+def test_current_is_not_modified():
+    apply_array_ops(PRODUCT, [{"field": "images", "op": "remove", "value": "a"}])
+    assert PRODUCT["images"] == ["a", "b", "c"]
+
+
+@pytest.mark.parametrize("op", [
+    {"field": "images", "op": "move", "value": "missing"},
+    {"field": "images", "op": "replace", "value": "a"},
+])
+def test_invalid_ops(op):
+    with pytest.raises(ArrayOpError):
+        apply_array_ops(PRODUCT, [op])
+
+
+@pytest.mark.parametrize("header", [None, "*", " * "])
+def test_if_match_any(header):
+    assert parse_if_match(header) is None
+
+
+def test_if_match_versions():
+    etag = version_etag(7, b"{}")
+    assert parse_if_match(etag) == {7}
+    assert parse_if_match(f'W/{etag}, "v3"') == {3, 7}
+
+
+def test_if_match_coded_etag():
+    # What a client echoes after a compressed response
+    etag = version_etag(4, b"{}")
+    assert parse_if_match(etag[:-1] + '-gzip"') == {4}
+    assert parse_if_match(etag[:-1] + '-br"') == {4}
+
+
+def test_if_match_foreign_tags():
+    assert parse_if_match('"abc", v3, "v3x"') == set()
@@ -0,0 +1,87 @@
+import pytest
+
+import rate_limit
+from rate_limit import RateLimiter, TokenBucket, client_key, create_rule, parse_rate
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(rate_limit.time, "monotonic", clock)
+    return clock
+
+
+def test_bucket_burst_then_refill(clock):
+    bucket = TokenBucket(rate=2.0, burst=3)
+    assert [bucket.take() for _ in range(3)] == [0.0, 0.0, 0.0]
+    assert bucket.take() == pytest.approx(0.5)
+    clock.now += 0.5
+    assert bucket.take() == 0.0
+
+
+def test_bucket_never_exceeds_burst(clock):
+    bucket = TokenBucket(rate=10.0, burst=2)
+    clock.now += 3600
+    assert [bucket.take() for _ in range(3)][-1] > 0
+
+
+def test_limiter_keys_are_independent(clock):
+    limiter = RateLimiter(1, 60)
+    assert limiter.check("a") == 0.0
+    assert limiter.check("a") > 0
+    assert limiter.check("b") == 0.0
+
+
+def test_limiter_forgets_oldest_key(clock):
+    limiter = RateLimiter(1, 60, max_keys=2)
+    limiter.check("a")
+    limiter.check("b")
+    limiter.check("a")
+    limiter.check("c")
+    assert list(limiter._buckets) == ["a", "c"]
+
+
+def test_parse_rate():
+    assert parse_rate("") is None
+    assert parse_rate("0") is None
+    limiter = parse_rate("120/60")
+    assert (limiter.burst, limiter.rate) == (120, 2.0)
+    assert parse_rate("10").rate == 10.0
+
+
+def test_rate_split_across_workers(monkeypatch):
+    assert parse_rate("10/60", workers=4).burst == 3
+    monkeypatch.setenv("WEB_CONCURRENCY", "4")
+    rule = create_rule("uploads", ["POST"], ["/api/upload"], rate="10/60", concurrency=6)
+    assert rule.limiter.burst == 3
+    assert rule.concurrency._value == 2
+
+
+def _scope(headers=(), client=("10.0.0.1", 1234)):
+    return {
+        "type": "http",
+        "headers": [(k.encode(), v.encode()) for k, v in headers],
+        "client": client,
+    }
+
+
+def test_client_key():
+    assert client_key(_scope()) == "ip:10.0.0.1"
+    assert client_key(_scope([("authorization", "Bearer t1")])) == "token:t1"
+    assert client_key(_scope([("cookie", "session_token=t2")])) == "token:t2"
+    assert client_key(_scope([("cookie", "session_token=t2")]), by_ip=True) == "ip:10.0.0.1"
+    assert client_key(_scope(client=None)) == "ip:unknown"
+
+
+def test_client_key_unknown_token_shares_ip_bucket():
+    known = {"good"}.__contains__
+    assert client_key(_scope([("authorization", "Bearer good")]), is_known_token=known) == "token:good"
+    assert client_key(_scope([("authorization", "Bearer made-up")]), is_known_token=known) == "ip:10.0.0.1"
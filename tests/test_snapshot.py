@@ -0,0 +1,82 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import orjson
+from mongomock_motor import AsyncMongoMockClient
+
+from image_store import LocalBlobStore
+from snapshot import SnapshotBuilder, SnapshotTrigger
+
+UPDATED = datetime(2024, 1, 1, tzinfo=timezone.utc)
+
+
+def product(product_id, images=(), updated_at=UPDATED):
+    return {
+        "product_id": product_id,
+        "name": product_id,
+        "images": list(images),
+        "created_at": UPDATED,
+        "updated_at": updated_at,
+    }
+
+
+def test_incremental_build(tmp_path):
+    async def scenario():
+        db = AsyncMongoMockClient(tz_aware=True).test
+        store = LocalBlobStore(tmp_path / "blobs")
+        digest = await store.put(b"\x89PNG\r\n\x1a\nimage")
+        await db.products.insert_many([
+            product("p1", [f"https://api.example/api/images/{digest}"]),
+            product("p2"),
+        ])
+        builder = SnapshotBuilder(db, store, tmp_path / "out", "/catalog")
+        first = await builder.build()
+        again = await builder.build()
+        await db.products.update_one({"product_id": "p2"}, {"$set": {"updated_at": UPDATED + timedelta(days=1)}})
+        await db.products.delete_one({"product_id": "p1"})
+        changed = await builder.build()
+        return digest, first, again, changed
+
+    digest, first, again, changed = asyncio.run(scenario())
+    assert first == {"products": 2, "written": 2, "removed": 0, "images_copied": 1}
+    assert again == {"products": 2, "written": 0, "removed": 0, "images_copied": 0}
+    assert changed == {"products": 1, "written": 1, "removed": 1, "images_copied": 0}
+    out = tmp_path / "out"
+    assert (out / "images" / f"{digest}.png").read_bytes() == b"\x89PNG\r\n\x1a\nimage"
+    assert [p["product_id"] for p in orjson.loads((out / "products.json").read_bytes())] == ["p2"]
+    assert not (out / "products" / "p1.json").exists()
+
+
+class CountingBuilder:
+    def __init__(self):
+        self.builds = 0
+
+    async def build(self):
+        self.builds += 1
+        return {}
+
+
+def test_local_rebuild_once_per_window():
+    async def scenario():
+        builder = CountingBuilder()
+        trigger = SnapshotTrigger(builder, delay=0.05)
+        for _ in range(5):
+            trigger.schedule_local()
+        await asyncio.sleep(0.12)
+        after_burst = builder.builds
+        # A write after that window's rebuild started gets a rebuild of its own
+        trigger.schedule_local()
+        await asyncio.sleep(0.12)
+        await trigger.aclose()
+        return after_burst, builder.builds
+
+    assert asyncio.run(scenario()) == (1, 2)
+
+
+def test_hook_only_trigger_has_no_local_rebuild():
+    async def scenario():
+        trigger = SnapshotTrigger(None, build_hook="https://hooks.example/build")
+        trigger.schedule_local()
+        return trigger._pending, trigger.enabled
+
+    assert asyncio.run(scenario()) == (None, True)
@@ -0,0 +1,142 @@
+import asyncio
+import io
+
+import pytest
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse
+from starlette.routing import Route
+
+from uploads import (
+    UnsupportedImageType,
+    UploadGuardMiddleware,
+    UploadTooLarge,
+    multipart_boundary,
+    sniff_file_part,
+    spool_upload,
+)
+
+PNG = b"\x89PNG\r\n\x1a\n" + b"\0" * 100
+BOUNDARY = b"xyz123"
+LIMIT = 100 * 1024
+CHUNK = 16 * 1024
+
+
+def form(data: bytes, fields=()) -> bytes:
+    parts = [
+        b'--%s\r\nContent-Disposition: form-data; name="%s"\r\n\r\n%s\r\n' % (BOUNDARY, name, value)
+        for name, value in fields
+    ]
+    parts.append(
+        b'--%s\r\nContent-Disposition: form-data; name="file"; filename="a.png"\r\n'
+        b"Content-Type: image/png\r\n\r\n%s\r\n--%s--\r\n" % (BOUNDARY, data, BOUNDARY)
+    )
+    return b"".join(parts)
+
+
+async def upload(request):
+    parsed = await request.form()
+    return JSONResponse({"size": len(await parsed["file"].read())})
+
+
+def call(body: bytes, content_length: bool = True):
+    """Send body in CHUNK-sized messages; returns (status, messages the app read)."""
+    app = UploadGuardMiddleware(Starlette(routes=[Route("/upload", upload, methods=["POST"])]), ["/upload"], LIMIT)
+    headers = [(b"content-type", b"multipart/form-data; boundary=" + BOUNDARY)]
+    if content_length:
+        headers.append((b"content-length", str(len(body)).encode()))
+    scope = {"type": "http", "method": "POST", "path": "/upload", "headers": headers, "query_string": b""}
+    chunks = [body[i:i + CHUNK] for i in range(0, len(body), CHUNK)] or [b""]
+    read = 0
+    sent = []
+
+    async def receive():
+        nonlocal read
+        if read == len(chunks):
+            await asyncio.sleep(3600)
+        read += 1
+        return {"type": "http.request", "body": chunks[read - 1], "more_body": read < len(chunks)}
+
+    async def send(message):
+        sent.append(message)
+
+    asyncio.run(app(scope, receive, send))
+    return sent[0]["status"], read
+
+
+def test_image_passes():
+    assert call(form(PNG)) == (200, 1)
+
+
+def test_content_length_over_limit():
+    # Rejected on the header alone
+    assert call(form(PNG + b"\0" * LIMIT * 2)) == (413, 0)
+
+
+def test_chunked_over_limit_is_cut_off():
+    status, read = call(form(PNG + b"\0" * LIMIT * 2), content_length=False)
+    assert status == 413
+    assert read == (LIMIT + 64 * 1024) // CHUNK + 1
+
+
+def test_disguised_file_is_rejected_on_first_bytes():
+    status, read = call(form(b"MZ\x90\0" + b"\0" * 50 * 1024), content_length=False)
+    assert (status, read) == (415, 1)
+
+
+def test_disguised_file_after_other_fields():
+    body = form(b"<?php" + b"\0" * 50 * 1024, fields=[(b"note", b"x" * 20000)])
+    assert call(body)[0] == 415
+
+
+def test_image_after_other_fields():
+    assert call(form(PNG, fields=[(b"note", b"x" * 20000)])) == (200, 2)
+
+
+def test_multipart_boundary():
+    assert multipart_boundary([(b"content-type", b"multipart/form-data; boundary=abc")]) == b"abc"
+    assert multipart_boundary([(b"content-type", b'Multipart/Form-Data; charset=utf-8; Boundary="a b"')]) == b"a b"
+    assert multipart_boundary([(b"content-type", b"application/json")]) is None
+    assert multipart_boundary([]) is None
+
+
+@pytest.mark.parametrize("head, expected", [
+    (form(PNG), True),
+    (form(b"GIF89a"), True),
+    (form(b"not an image at all"), False),
+    (form(b""), False),
+    # Not enough of the file yet
+    (form(PNG)[:form(PNG).index(b"\x89PNG") + 4], None),
+    (form(PNG)[:20], None),
+    # No file part at all
+    (b'--%s\r\nContent-Disposition: form-data; name="a"\r\n\r\n1\r\n--%s--\r\n' % (BOUNDARY, BOUNDARY), None),
+])
+def test_sniff_file_part(head, expected):
+    assert sniff_file_part(head, BOUNDARY) is expected
+
+
+class FakeUpload:
+    def __init__(self, data: bytes):
+        self.file = io.BytesIO(data)
+
+    async def read(self, size: int = -1) -> bytes:
+        return self.file.read(size)
+
+
+def test_spool_upload(tmp_path):
+    spooled = asyncio.run(spool_upload(FakeUpload(PNG), tmp_path, max_bytes=len(PNG)))
+    assert (spooled.size, spooled.content_type) == (len(PNG), "image/png")
+    assert spooled.path.read_bytes() == PNG
+    spooled.discard()
+    assert list(tmp_path.iterdir()) == []
+
+
+@pytest.mark.parametrize("data, error", [
+    (PNG + b"\0", UploadTooLarge),
+    (b"plain text", UnsupportedImageType),
+    (b"", UnsupportedImageType),
+])
+def test_spool_upload_rejects(tmp_path, data, error):
+    with pytest.raises(error):
+        asyncio.run(spool_upload(FakeUpload(data), tmp_path, max_bytes=len(PNG)))
+    # Nothing left behind
+    assert list(tmp_path.iterdir()) == []